@@ -0,0 +1,114 @@
+"""Compare the reduced-resolution preview decoder against the previous full decode path.
+
+Every measurement runs in a fresh process so peak memory is not shared between
+variants. Peak memory is the growth of the process maximum resident set size
+while decoding, which includes Pillow's native buffers.
+
+Usage:
+    python benchmarks/bench_decode.py [--runs N] [--corpus DIR]
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from PIL import Image
+
+from engine import DEFAULT_PREVIEW_BOX, fit_size, load_preview
+
+
+# name -> (format, size): a 45 MP camera JPEG, a large PNG and a large TIFF
+SAMPLES = {
+    "camera.jpg": ("JPEG", (8192, 5464)),
+    "scan.png": ("PNG", (6000, 4000)),
+    "poster.tiff": ("TIFF", (6000, 4000)),
+}
+
+
+def legacy_load_preview(image_path, box, rotation=0):
+    """The decode path used before the reduced-resolution decoder: full decode, then LANCZOS"""
+    image = Image.open(image_path)
+    if rotation != 0:
+        image = image.rotate(-rotation, expand=True)
+    new_size = fit_size(image.width, image.height, *box)
+    return image.resize(new_size, Image.Resampling.LANCZOS)
+
+
+VARIANTS = {
+    "legacy": legacy_load_preview,
+    "reduced": load_preview,
+}
+
+
+def make_sample(path, image_format, size):
+    """Write a deterministic photo-like test image"""
+    if os.path.exists(path):
+        return
+    # A smooth gradient with noise compresses like a photograph rather than a flat fill
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    image.save(path, image_format, **({"quality": 92} if image_format == "JPEG" else {}))
+
+
+def peak_rss_bytes():
+    """Maximum resident set size of this process so far, or None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(variant, image_path, runs, results):
+    """Run in a child process: time the variant and report its peak memory growth"""
+    decode = VARIANTS[variant]
+    baseline = peak_rss_bytes()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        decode(image_path, DEFAULT_PREVIEW_BOX)
+        timings.append(time.perf_counter() - start)
+    peak = peak_rss_bytes()
+    results.put((timings, None if baseline is None else peak - baseline))
+
+
+def run_isolated(variant, image_path, runs):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(variant, image_path, runs, results))
+    process.start()
+    timings, peak = results.get()
+    process.join()
+    return timings, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Decodes per variant and file (default: %(default)s)")
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".corpus", "decode"),
+                        help="Directory holding the sample images (created if missing)")
+    args = parser.parse_args()
+    
+    os.makedirs(args.corpus, exist_ok=True)
+    print(f"Preview box {DEFAULT_PREVIEW_BOX[0]}x{DEFAULT_PREVIEW_BOX[1]}, {args.runs} runs each\n")
+    print(f"{'file':<14}{'variant':<10}{'median ms':>12}{'min ms':>10}{'peak MB':>10}")
+    
+    for name, (image_format, size) in SAMPLES.items():
+        image_path = os.path.join(args.corpus, name)
+        make_sample(image_path, image_format, size)
+        for variant in VARIANTS:
+            timings, peak = run_isolated(variant, image_path, args.runs)
+            peak_text = "n/a" if peak is None else f"{peak / (1024 * 1024):.1f}"
+            print(f"{name:<14}{variant:<10}{statistics.median(timings) * 1000:>12.1f}"
+                  f"{min(timings) * 1000:>10.1f}{peak_text:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare the indexed image list against a plain Python list on the per-keypress operations.
+
+Each operation runs at random positions of a list of synthetic paths: looking up
+a path's position (display_file), reading the image at a position, deleting the
+current image and putting it back (undo), and reading the preload window.
+
+Usage:
+    python benchmarks/bench_index.py [--size N] [--ops N]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from engine.sequence import ImageSequence
+
+
+def window(images, index, before=19, after=30):
+    """The preload window around index, as NavigationCursor.window reads it"""
+    start_index = max(0, index - before)
+    if isinstance(images, list):
+        return images[start_index:index + after + 1]
+    return list(images.iter_from(start_index, index + after + 1 - start_index))
+
+
+def delete_and_undo(images, index):
+    image_path = images.pop(index)
+    images.insert(index, image_path)
+
+
+# name -> operation(images, index, path of the image at index)
+OPERATIONS = {
+    "index(path)": lambda images, index, image_path: images.index(image_path),
+    "images[i]": lambda images, index, image_path: images[index],
+    "delete+undo": lambda images, index, image_path: delete_and_undo(images, index),
+    "window": lambda images, index, image_path: window(images, index),
+}
+
+
+def time_operation(operation, images, positions, paths):
+    timings = []
+    for index, image_path in zip(positions, paths):
+        start = time.perf_counter()
+        operation(images, index, image_path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000_000, help="Number of paths (default: %(default)s)")
+    parser.add_argument("--ops", type=int, default=200, help="Operations per measurement (default: %(default)s)")
+    args = parser.parse_args()
+    
+    image_paths = [f"/photos/{index // 1000:04d}/IMG_{index:07d}.jpg" for index in range(args.size)]
+    rng = random.Random(0)
+    positions = [rng.randrange(args.size) for _ in range(args.ops)]
+    paths = [image_paths[index] for index in positions]
+    
+    print(f"{args.size} paths, {args.ops} operations at random positions\n")
+    print(f"{'operation':<14}{'variant':<10}{'median us':>12}{'max us':>12}")
+    
+    for variant, build in (("list", list), ("indexed", ImageSequence)):
+        start = time.perf_counter()
+        images = build(image_paths)
+        print(f"{'build':<14}{variant:<10}{(time.perf_counter() - start) * 1e6:>12.0f}{'':>12}")
+        for name, operation in OPERATIONS.items():
+            timings = time_operation(operation, images, positions, paths)
+            print(f"{name:<14}{variant:<10}{statistics.median(timings) * 1e6:>12.1f}{max(timings) * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Benchmark the engine's hot paths on a synthetic corpus and flag regressions run over run.
+
+Cases:
+    scan     list_images and the streaming DirectoryScanner over the whole corpus tree
+    decode   load_preview and load_quick_preview per format and resolution
+    cache    PreviewCache hits and misses, PreviewStore hits
+    details  header reads (read_metadata, get_file_details) and MetadataIndex lookups
+
+Every metric is a median time per operation, so lower is better. Results are
+appended to a JSON-lines history; each run is compared with the latest earlier run
+of the same scale on the same host, and metrics slower by more than the threshold
+are reported as regressions. The listing is timed with a warm filesystem cache.
+
+Usage:
+    python benchmarks/bench_suite.py [--scale 1k|100k|1m] [--case NAME ...] [--runs N]
+                                     [--threshold 0.2] [--label TEXT] [--fail-on-regression]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "src"))
+
+from PIL import Image
+
+from corpus import SCALES, default_root, generate_corpus, write_sample
+from engine import (DEFAULT_PREVIEW_BOX, DirectoryScanner, MetadataIndex, PreviewCache, PreviewStore,
+                    get_file_details, list_images, load_preview, load_quick_preview, read_metadata)
+
+
+DEFAULT_HISTORY = os.path.join(BENCHMARKS_DIR, ".results", "history.jsonl")
+
+# Decode latency is measured on these, independently of the corpus mix
+DECODE_FORMATS = (".jpg", ".png", ".webp", ".gif", ".tiff")
+DECODE_SIZES = ((640, 480), (1920, 1080), (4000, 3000))
+
+# Files sampled from the corpus for the per-file cases
+SAMPLE_FILES = 500
+
+
+def time_calls(function, arguments):
+    """Return the time of function(argument) for each argument"""
+    timings = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def scan_streaming(root):
+    scanner = DirectoryScanner(root, recursive=True, record=False).start()
+    for _ in scanner:
+        pass
+    scanner.raise_for_error()
+
+
+def bench_scan(context):
+    root = context.root
+    list_images(root, recursive=True)  # Warm the filesystem cache
+    yield "scan.list_images", time_calls(lambda _: list_images(root, recursive=True), range(context.runs))
+    yield "scan.streaming", time_calls(lambda _: scan_streaming(root), range(context.runs))
+
+
+def bench_decode(context):
+    for extension in DECODE_FORMATS:
+        for width, height in DECODE_SIZES:
+            image_path = write_sample(
+                os.path.join(context.samples, f"sample_{width}x{height}{extension}"), extension, (width, height)
+            )
+            label = f"{extension.lstrip('.')}.{width}x{height}"
+            load_preview(image_path, DEFAULT_PREVIEW_BOX)
+            yield f"decode.preview.{label}", time_calls(
+                lambda _: load_preview(image_path, DEFAULT_PREVIEW_BOX), range(context.runs)
+            )
+            yield f"decode.quick.{label}", time_calls(
+                lambda _: load_quick_preview(image_path, DEFAULT_PREVIEW_BOX), range(context.runs)
+            )
+
+
+def bench_cache(context):
+    preview = Image.new("RGB", DEFAULT_PREVIEW_BOX)
+    paths = [os.path.join(context.root, f"virtual_{index}.jpg") for index in range(1000)]
+    cache = PreviewCache(budget_bytes=len(paths) * preview.width * preview.height * 3)
+    for image_path in paths:
+        cache.put(image_path, DEFAULT_PREVIEW_BOX, preview)
+    lookups = [random.Random(index).choice(paths) for index in range(10000)]
+    yield "cache.memory_hit", time_calls(lambda image_path: cache.get(image_path, DEFAULT_PREVIEW_BOX), lookups)
+    yield "cache.memory_miss", time_calls(lambda image_path: cache.get(image_path + "x", DEFAULT_PREVIEW_BOX), lookups)
+    
+    store = PreviewStore(os.path.join(context.workdir, "previews.sqlite3"))
+    try:
+        stored = []
+        for image_path in context.sample_paths[:100]:
+            image = load_preview(image_path, DEFAULT_PREVIEW_BOX)
+            if image is not None:
+                store.put(image_path, DEFAULT_PREVIEW_BOX, image)
+                stored.append(image_path)
+        yield "cache.store_hit", time_calls(lambda image_path: store.get(image_path, DEFAULT_PREVIEW_BOX), stored)
+    finally:
+        store.close()
+
+
+def bench_details(context):
+    paths = context.sample_paths
+    yield "details.read_metadata", time_calls(read_metadata, paths)
+    yield "details.get_file_details", time_calls(get_file_details, paths)
+    
+    index = MetadataIndex(os.path.join(context.workdir, "metadata.sqlite3"))
+    try:
+        index.put_many([metadata for metadata in map(read_metadata, paths) if metadata is not None])
+        yield "details.index_get", time_calls(index.get, paths)
+    finally:
+        index.close()
+
+
+CASES = {
+    "scan": bench_scan,
+    "decode": bench_decode,
+    "cache": bench_cache,
+    "details": bench_details,
+}
+
+
+class Context:
+    """What the cases run on"""
+    def __init__(self, root, samples, workdir, runs, sample_paths):
+        self.root = root
+        self.samples = samples
+        self.workdir = workdir
+        self.runs = runs
+        self.sample_paths = sample_paths
+
+
+def git_revision():
+    """Short hash of the checked out commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except OSError:
+        return []
+
+
+def previous_run(history, record):
+    """The latest earlier run comparable with record: same scale, same host"""
+    for candidate in reversed(history):
+        if (candidate.get("scale"), candidate.get("host")) == (record["scale"], record["host"]):
+            return candidate
+    return None
+
+
+def compare(record, previous, threshold):
+    """Print every metric against the previous run and return the names of the regressed ones"""
+    regressions = []
+    baseline = previous["metrics"] if previous else {}
+    if previous:
+        print(f"\nCompared with {previous.get('revision') or 'unknown revision'} at {previous['timestamp']}")
+    print(f"\n{'metric':<36}{'median':>12}{'previous':>12}{'change':>10}")
+    for name, seconds in record["metrics"].items():
+        before = baseline.get(name)
+        if before:
+            change = seconds / before - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            if flag:
+                regressions.append(name)
+            print(f"{name:<36}{format_seconds(seconds):>12}{format_seconds(before):>12}{change:>+10.1%}{flag}")
+        else:
+            print(f"{name:<36}{format_seconds(seconds):>12}{'-':>12}{'':>10}")
+    return regressions
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=list(SCALES), default="1k", help="Corpus size (default: %(default)s)")
+    parser.add_argument("--case", choices=list(CASES), action="append", help="Run only this case (repeatable)")
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions of whole-tree and decode timings (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed (default: %(default)s)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="Results file (default: benchmarks/.results/history.jsonl)")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="Slowdown reported as a regression, as a fraction (default: %(default)s)")
+    parser.add_argument("--label", help="Free-form note stored with the results")
+    parser.add_argument("--no-save", action="store_true", help="Compare without appending the results to the history")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if any metric regressed")
+    args = parser.parse_args()
+    
+    root = default_root(args.scale, args.seed)
+    samples = os.path.join(BENCHMARKS_DIR, ".corpus", "decode-samples")
+    os.makedirs(samples, exist_ok=True)
+    
+    def report(written, total):
+        print(f"\rGenerating corpus: {written}/{total} files", end="", flush=True)
+    
+    manifest = generate_corpus(root, args.scale, args.seed, progress=report)
+    print(f"\rCorpus {root}: {manifest['images']} images, {manifest['corrupt']} corrupt")
+    
+    # Files for the per-file cases, corrupt ones included as in a real folder
+    image_paths = list_images(root, recursive=True)
+    sample_paths = random.Random(args.seed).sample(image_paths, min(SAMPLE_FILES, len(image_paths)))
+    
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "label": args.label,
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "metrics": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="gallerycleaner-bench-") as workdir:
+        context = Context(root, samples, workdir, args.runs, sample_paths)
+        for name in args.case or CASES:
+            print(f"Running {name}...", flush=True)
+            for metric, timings in CASES[name](context):
+                if timings:
+                    record["metrics"][metric] = statistics.median(timings)
+    
+    history = load_history(args.history)
+    regressions = compare(record, previous_run(history, record), args.threshold)
+    
+    if not args.no_save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+    
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1 if args.fail_on_regression else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Generate deterministic synthetic image corpora for the benchmarks.
+
+A corpus is a nested directory tree of JPEG, PNG, GIF, TIFF and WebP files at
+assorted resolutions, with a share of corrupt files (truncated, garbage or empty)
+and a few non-image files in every directory. The same scale and seed always give
+the same tree: files are copied from a small pool of encoded templates, so even the
+1M preset is bound by disk writes rather than encoding. Generation is resumable,
+and a manifest at the root lets callers skip trees that are already complete.
+
+Usage:
+    python benchmarks/corpus.py [--scale 1k|100k|1m] [--seed N] [--root DIR]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import zlib
+
+from PIL import Image
+
+
+MANIFEST = "corpus.json"
+
+# Bump when the layout or the templates change, so stale corpora are regenerated
+VERSION = 1
+
+FILES_PER_DIRECTORY = 200
+FANOUT = 16
+CORRUPT_SHARE = 0.01
+TEMPLATE_VARIANTS = 4
+
+# extension -> (Pillow format, mode, save options, weight)
+FORMATS = {
+    ".jpg": ("JPEG", "RGB", {"quality": 90}, 60),
+    ".png": ("PNG", "RGB", {}, 15),
+    ".webp": ("WEBP", "RGB", {"quality": 80}, 15),
+    ".gif": ("GIF", "P", {}, 5),
+    ".tiff": ("TIFF", "RGB", {"compression": "tiff_deflate"}, 5),
+}
+
+# name -> (number of images, {(width, height): weight}); larger trees use smaller images to stay within disk space
+SCALES = {
+    "1k": (1_000, {(160, 120): 40, (640, 480): 35, (1920, 1080): 22, (4000, 3000): 3}),
+    "100k": (100_000, {(160, 120): 70, (640, 480): 25, (1920, 1080): 5}),
+    "1m": (1_000_000, {(64, 48): 80, (160, 120): 20}),
+}
+
+CORRUPTIONS = ("truncated", "garbage", "empty")
+
+
+def render_image(size, seed, mode="RGB"):
+    """Return a deterministic photo-like image: gradients with a seeded noise layer"""
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient("L").resize(size)
+    if rng.random() < 0.5:
+        gradient = gradient.transpose(Image.Transpose.ROTATE_90).resize(size)
+    # Noise at a quarter of the resolution, scaled up: grain like a photo, and fast to render at 12 MP
+    small = (max(1, size[0] // 4), max(1, size[1] // 4))
+    noise = Image.frombytes("L", small, rng.randbytes(small[0] * small[1])).resize(size, Image.Resampling.BILINEAR)
+    noise = noise.point(lambda value: value // 8 + 112)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    return image.convert(mode) if mode != "RGB" else image
+
+
+def encode_image(extension, size, seed):
+    """Return the bytes of a deterministic image in the format of extension"""
+    image_format, mode, options, _ = FORMATS[extension]
+    output = io.BytesIO()
+    render_image(size, seed, mode).save(output, image_format, **options)
+    return output.getvalue()
+
+
+def write_sample(path, extension, size, seed=0):
+    """Write one deterministic image unless it already exists"""
+    if not os.path.exists(path):
+        with open(path, "wb") as file:
+            file.write(encode_image(extension, size, seed))
+    return path
+
+
+class TemplatePool:
+    """Encoded templates shared by all the files of a corpus, created on first use"""
+    def __init__(self, seed):
+        self.seed = seed
+        self._templates = {}
+    
+    def get(self, extension, size, variant):
+        key = (extension, size, variant)
+        data = self._templates.get(key)
+        if data is None:
+            # str hashes are salted per process; crc32 keeps the contents stable across runs
+            data = encode_image(extension, size, zlib.crc32(repr((self.seed, *key)).encode()))
+            self._templates[key] = data
+        return data
+
+
+def directory_of(index, directory_count):
+    """Relative directory holding the index-th directory's files, FANOUT entries per level"""
+    depth = 1
+    while FANOUT ** depth < directory_count:
+        depth += 1
+    parts = []
+    for _ in range(depth):
+        index, digit = divmod(index, FANOUT)
+        parts.append(f"d{digit:02d}")
+    return os.path.join(*reversed(parts))
+
+
+def plan_corpus(count, resolutions, seed=0):
+    """Yield (relative path, extension, size, variant, corruption or None) for every image of a corpus"""
+    rng = random.Random(seed)
+    extensions = list(FORMATS)
+    extension_weights = [FORMATS[extension][3] for extension in extensions]
+    sizes = list(resolutions)
+    size_weights = [resolutions[size] for size in sizes]
+    directory_count = max(1, -(-count // FILES_PER_DIRECTORY))
+    
+    for index in range(count):
+        extension = rng.choices(extensions, extension_weights)[0]
+        size = rng.choices(sizes, size_weights)[0]
+        variant = rng.randrange(TEMPLATE_VARIANTS)
+        corruption = rng.choice(CORRUPTIONS) if rng.random() < CORRUPT_SHARE else None
+        directory = directory_of(index // FILES_PER_DIRECTORY, directory_count)
+        yield os.path.join(directory, f"img_{index:07d}{extension}"), extension, size, variant, corruption
+
+
+def read_manifest(root):
+    """Return the manifest of a completed corpus, or None"""
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def generate_corpus(root, scale="1k", seed=0, progress=None):
+    """Build the corpus of a scale under root, unless an identical one is already there.
+    
+    Args:
+        root (str): Directory to fill (created if missing)
+        scale (str): Key of SCALES
+        seed (int): Seed of the layout and the image contents
+        progress (callable): Called as progress(written, total) while files are written
+    
+    Returns:
+        dict: The manifest: version, scale, seed, images, corrupt, directories
+    """
+    count, resolutions = SCALES[scale]
+    manifest = read_manifest(root)
+    if manifest and (manifest.get("version"), manifest.get("scale"), manifest.get("seed")) == (VERSION, scale, seed):
+        return manifest
+    
+    templates = TemplatePool(seed)
+    garbage = random.Random(seed ^ 0x5EED)
+    directories = set()
+    corrupt = 0
+    for index, (relative_path, extension, size, variant, corruption) in enumerate(plan_corpus(count, resolutions, seed)):
+        path = os.path.join(root, relative_path)
+        directory = os.path.dirname(path)
+        if directory not in directories:
+            os.makedirs(directory, exist_ok=True)
+            # Every directory also holds files the scanner must skip
+            for name in ("notes.txt", "desktop.ini"):
+                with open(os.path.join(directory, name), "w") as file:
+                    file.write("not an image\n")
+            directories.add(directory)
+        
+        data = templates.get(extension, size, variant)
+        if corruption == "truncated":
+            data = data[:len(data) // 2]
+        elif corruption == "garbage":
+            data = garbage.randbytes(len(data) // 4 or 64)
+        elif corruption == "empty":
+            data = b""
+        corrupt += corruption is not None
+        
+        if not os.path.exists(path):
+            with open(path, "wb") as file:
+                file.write(data)
+        if progress and index % 1000 == 0:
+            progress(index, count)
+    
+    if progress:
+        progress(count, count)
+    manifest = {
+        "version": VERSION, "scale": scale, "seed": seed,
+        "images": count, "corrupt": corrupt, "directories": len(directories),
+    }
+    with open(os.path.join(root, MANIFEST), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def default_root(scale, seed=0):
+    """Default location of a corpus, ignored by git"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), ".corpus", f"tree-{scale}-{seed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=list(SCALES), default="1k", help="Corpus size (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Layout and content seed (default: %(default)s)")
+    parser.add_argument("--root", help="Directory to fill (default: benchmarks/.corpus/tree-SCALE-SEED)")
+    args = parser.parse_args()
+    
+    root = args.root or default_root(args.scale, args.seed)
+    
+    def report(written, total):
+        print(f"\r{written}/{total} files", end="", flush=True)
+    
+    manifest = generate_corpus(root, args.scale, args.seed, progress=report)
+    print(f"\n{root}: {manifest['images']} images ({manifest['corrupt']} corrupt) "
+          f"in {manifest['directories']} directories")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
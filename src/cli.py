@@ -0,0 +1,148 @@
+import argparse
+import re
+import sys
+
+from engine import DEFAULT_PREVIEW_BOX, REPORT_FORMATS, CleanupRules, PreviewStore, prewarm, run_cleanup
+
+
+def parse_box(value):
+    """Parse a WIDTHxHEIGHT argument"""
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    return width, height
+
+
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2, "G": 1024 ** 3, "GB": 1024 ** 3}
+
+
+def parse_size(value):
+    """Parse a file size such as 500KB or 20MB"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", value)
+    if match is None or match.group(2).upper() not in SIZE_UNITS:
+        raise argparse.ArgumentTypeError(f"expected a size such as 500KB or 20MB, got {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_extension(value):
+    """Normalize an extension argument to the form .jpg"""
+    return "." + value.lower().lstrip(".")
+
+
+def run_prewarm(args):
+    """Fill the persistent preview cache for a directory tree"""
+    store = PreviewStore(capacity=args.capacity_mb * 1024 * 1024)
+    
+    def report(stored, skipped, failed):
+        print(f"\r{stored} cached, {skipped} already cached, {failed} failed", end="", flush=True)
+    
+    try:
+        stored, skipped, failed = prewarm(
+            store, args.directory, recursive=args.recursive, box=args.box,
+            workers=args.workers, progress=report
+        )
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to resume.")
+        return 130
+    except OSError as e:
+        print(f"Error accessing directory: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    
+    report(stored, skipped, failed)
+    print()
+    return 0
+
+
+def run_cleanup_command(args):
+    """Report, and with --trash remove, the files of a tree matching the cleanup rules"""
+    rules = CleanupRules(
+        min_resolution=args.min_resolution, max_size=args.max_size, extensions=args.extension,
+        older_than=args.older_than, exact_duplicates=args.exact_duplicates, near_duplicates=args.near_duplicates
+    )
+    if not rules:
+        print("No cleanup rule given; see gallerycleaner cleanup --help", file=sys.stderr)
+        return 2
+    
+    output = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    report = REPORT_FORMATS[args.format](output)
+    
+    def progress(scanned, matched):
+        print(f"\r{scanned} scanned, {matched} matched", end="", file=sys.stderr, flush=True)
+    
+    def on_error(path, error):
+        print(f"\nCould not move {path} to the trash: {error}", file=sys.stderr)
+    
+    try:
+        summary = run_cleanup(
+            args.directory, rules, report, recursive=args.recursive, trash=args.trash,
+            workers=args.workers, progress=progress, on_error=on_error
+        )
+    except KeyboardInterrupt:
+        print("\nInterrupted.", file=sys.stderr)
+        return 130
+    except OSError as e:
+        print(f"\nError accessing directory: {e}", file=sys.stderr)
+        return 1
+    finally:
+        report.close()
+        if args.output:
+            output.close()
+    
+    print(file=sys.stderr)
+    if args.trash:
+        print(f"{summary.trashed} moved to the trash, {summary.failed} failed", file=sys.stderr)
+    else:
+        print("Dry run; pass --trash to move the matches to the trash", file=sys.stderr)
+    return 1 if summary.failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="gallerycleaner", description="GalleryCleaner headless tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    prewarm_parser = commands.add_parser("prewarm", help="Fill the persistent preview cache for a directory tree")
+    prewarm_parser.add_argument("directory", help="Directory to prewarm")
+    prewarm_parser.add_argument("-r", "--recursive", action="store_true", help="Include subdirectories")
+    prewarm_parser.add_argument("--box", type=parse_box, default=DEFAULT_PREVIEW_BOX,
+                                help="Preview box as WIDTHxHEIGHT (default: %(default)s)")
+    prewarm_parser.add_argument("--workers", type=int, default=None, help="Decoding processes (default: one per core)")
+    prewarm_parser.add_argument("--capacity-mb", type=int, default=PreviewStore.DEFAULT_CAPACITY // (1024 * 1024),
+                                help="Maximum size of the preview cache in MB (default: %(default)s)")
+    prewarm_parser.set_defaults(handler=run_prewarm)
+    
+    cleanup_parser = commands.add_parser("cleanup", help="Select files by rules and report or trash them")
+    cleanup_parser.add_argument("directory", help="Directory to clean up")
+    cleanup_parser.add_argument("-r", "--recursive", action="store_true", help="Include subdirectories")
+    cleanup_parser.add_argument("--min-resolution", type=parse_box, metavar="WIDTHxHEIGHT",
+                                help="Select images smaller than this in either orientation")
+    cleanup_parser.add_argument("--max-size", type=parse_size, metavar="SIZE",
+                                help="Select files larger than this, e.g. 20MB")
+    cleanup_parser.add_argument("--extension", type=parse_extension, action="append", default=[],
+                                help="Select files with this extension (repeatable)")
+    cleanup_parser.add_argument("--older-than", type=float, metavar="DAYS",
+                                help="Select files last modified more than DAYS ago")
+    cleanup_parser.add_argument("--exact-duplicates", action="store_true",
+                                help="Select byte-identical copies, keeping the oldest")
+    cleanup_parser.add_argument("--near-duplicates", type=int, nargs="?", const=8, metavar="DISTANCE",
+                                help="Select near-duplicates up to this pHash distance (default: 8), keeping the oldest")
+    cleanup_parser.add_argument("--format", choices=sorted(REPORT_FORMATS), default="json",
+                                help="Report format (default: %(default)s)")
+    cleanup_parser.add_argument("-o", "--output", help="Write the report to this file instead of stdout")
+    cleanup_parser.add_argument("--trash", action="store_true",
+                                help="Move the matches to the trash (default: dry run, report only)")
+    cleanup_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    cleanup_parser.set_defaults(handler=run_cleanup_command)
+    
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Headless culling engine behind the GalleryCleaner viewer.
+
+Nothing in this package imports Tk, so scanning, decoding and caching can be
+benchmarked and profiled on a machine without a display.
+
+Submodules are imported on first access to one of their names, so importing
+the package stays cheap: numpy, for one, is only loaded once duplicates,
+quality scores or a cleanup are actually used.
+"""
+import importlib
+
+# Submodule -> the public names it defines
+_SUBMODULES = {
+    "animation": ("ANIMATED_EXTENSIONS", "AnimationStream"),
+    "batch": ("FileResultStore", "process_files"),
+    "cache": ("CacheStats", "PreviewCache", "TileCache"),
+    "cleanup": ("REPORT_FORMATS", "CleanupMatch", "CleanupRules", "CleanupSummary", "CsvReport", "JsonReport", "run_cleanup"),
+    "core": ("Engine",),
+    "cursor": ("NavigationCursor",),
+    "decoder": ("DEFAULT_PREVIEW_BOX", "PREVIEW_LEVELS", "fit_preview", "fit_size", "level_box", "load_preview",
+                "load_quick_preview", "placeholder_preview", "preview_box", "register_decoder", "rotate_preview"),
+    "details": ("format_details", "format_size", "get_file_details"),
+    "dispatch": ("CallQueue",),
+    "duplicates": ("HashStore", "ImageHashes", "compute_hashes", "find_duplicates", "hash_images", "iter_similar_pairs",
+                   "similar_pairs"),
+    "formats": ("FORMAT_EXTENSIONS", "FormatCache", "format_cache", "sniff_format"),
+    "metadata": ("ImageMetadata", "MetadataIndex", "read_metadata"),
+    "paths": ("user_cache_dir", "user_state_dir"),
+    "prewarm": ("prewarm",),
+    "quality": ("QualityScores", "QualityStore", "badness", "compute_scores", "score_images", "worst_first"),
+    "scanner": ("IMAGE_EXTENSIONS", "DirectoryScanner", "is_image_file", "list_images"),
+    "scheduler": ("DecodeScheduler",),
+    "sequence": ("ImageSequence",),
+    "session": ("SessionState", "SessionStore"),
+    "snapshot": ("DirectoryState", "TreeChanges", "TreeSnapshot"),
+    "store": ("PreviewStore",),
+    "tiles": ("TILE_SIZE", "RegionReader", "TiledImage"),
+    "tracing": ("Tracer", "tracer"),
+    "trash": ("RestoreError", "TrashJournal", "TrashOperation", "TrashQueue", "move_to_trash", "restore_from_trash"),
+    "watcher": ("TreeWatcher",),
+}
+
+_EXPORTS = {name: module for module, names in _SUBMODULES.items() for name in names}
+
+__all__ = [
+    "ANIMATED_EXTENSIONS",
+    "AnimationStream",
+    "CacheStats",
+    "CallQueue",
+    "CleanupMatch",
+    "CleanupRules",
+    "CleanupSummary",
+    "CsvReport",
+    "DEFAULT_PREVIEW_BOX",
+    "DecodeScheduler",
+    "DirectoryScanner",
+    "DirectoryState",
+    "Engine",
+    "FORMAT_EXTENSIONS",
+    "FileResultStore",
+    "FormatCache",
+    "HashStore",
+    "IMAGE_EXTENSIONS",
+    "ImageHashes",
+    "ImageMetadata",
+    "ImageSequence",
+    "JsonReport",
+    "MetadataIndex",
+    "NavigationCursor",
+    "PREVIEW_LEVELS",
+    "PreviewCache",
+    "PreviewStore",
+    "QualityScores",
+    "QualityStore",
+    "REPORT_FORMATS",
+    "RegionReader",
+    "RestoreError",
+    "SessionState",
+    "SessionStore",
+    "TILE_SIZE",
+    "TileCache",
+    "TiledImage",
+    "Tracer",
+    "TrashJournal",
+    "TrashOperation",
+    "TrashQueue",
+    "TreeChanges",
+    "TreeSnapshot",
+    "TreeWatcher",
+    "badness",
+    "compute_hashes",
+    "compute_scores",
+    "find_duplicates",
+    "fit_preview",
+    "fit_size",
+    "format_cache",
+    "format_details",
+    "format_size",
+    "get_file_details",
+    "hash_images",
+    "is_image_file",
+    "iter_similar_pairs",
+    "level_box",
+    "list_images",
+    "load_preview",
+    "load_quick_preview",
+    "move_to_trash",
+    "placeholder_preview",
+    "preview_box",
+    "prewarm",
+    "process_files",
+    "read_metadata",
+    "register_decoder",
+    "restore_from_trash",
+    "rotate_preview",
+    "run_cleanup",
+    "score_images",
+    "similar_pairs",
+    "sniff_format",
+    "tracer",
+    "user_cache_dir",
+    "user_state_dir",
+    "worst_first",
+]
+
+
+def __getattr__(name):
+    """Import the submodule defining name on first access"""
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    # Bound after the import, which sets the submodule itself as an attribute (engine.prewarm is both)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the public names, imported or not"""
+    return sorted(set(globals()) | set(__all__))
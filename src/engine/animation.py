@@ -0,0 +1,173 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from PIL import Image
+
+from .decoder import ROTATIONS, rotated_target_size
+from .tracing import tracer
+
+
+# Extensions of the formats that can hold an animation
+ANIMATED_EXTENSIONS = (".gif", ".webp")
+
+# Frames shown for at most this many milliseconds get DEFAULT_FRAME_DURATION instead, as in browsers
+MIN_FRAME_DURATION = 10
+DEFAULT_FRAME_DURATION = 100
+
+
+def may_be_animated(image_path):
+    """Return True if the file's extension is one of a format that can hold an animation"""
+    return os.path.splitext(image_path)[1].lower() in ANIMATED_EXTENSIONS
+
+
+def frame_duration(image):
+    """Return how long the current frame of an opened animation is shown, in milliseconds"""
+    duration = image.info.get("duration") or 0
+    return duration if duration > MIN_FRAME_DURATION else DEFAULT_FRAME_DURATION
+
+
+class AnimationStream:
+    """Frames of an animated image, decoded ahead of playback on a worker thread.
+    
+    The worker decodes the frames in order, fits each one to the preview box and
+    keeps at most capacity of them in a ring buffer, waiting while it is full, so a
+    full-size frame is never held past its own conversion. Playback follows a clock
+    started when the first frame is taken: next_frame() returns the latest frame that
+    is due and drops the ones before it, and frames already late when the worker
+    reaches them are skipped without being converted. A slow decoder makes the
+    animation skip frames instead of slowing down. The animation loops until stop().
+    
+    Args:
+        image_path (str): Path of the image file
+        box (tuple): (max_width, max_height) the frames must fit in
+        rotation (int): Clockwise rotation in degrees (0, 90, 180, 270)
+        capacity (int): Number of decoded frames kept ahead of playback
+    """
+    DEFAULT_CAPACITY = 8
+    
+    # Milliseconds before asking again while the next frame is not decoded yet
+    WAIT_INTERVAL = 10
+    
+    # Milliseconds of playback the worker may skip in a row, so a decoder that can't keep up still shows frames
+    MAX_SKIP_INTERVAL = 50
+    
+    def __init__(self, image_path, box, rotation=0, capacity=DEFAULT_CAPACITY):
+        self.path = image_path
+        self.box = tuple(box)
+        self.rotation = rotation % 360
+        self.capacity = capacity
+        
+        # None until the worker has opened the file, then whether it has more than one frame
+        self.animated = None
+        self.dropped = 0
+        self.finished = False
+        
+        self._frames = deque()
+        self._condition = threading.Condition()
+        self._started = None
+        self._stopped = False
+        self._thread = None
+    
+    @property
+    def playing(self):
+        """Whether a frame has been taken, starting the clock"""
+        return self._started is not None
+    
+    def start(self):
+        """Start decoding on the worker thread. Returns the stream"""
+        self._thread = threading.Thread(target=self._run, name="animation", daemon=True)
+        self._thread.start()
+        return self
+    
+    def next_frame(self):
+        """Return (frame, delay): the latest frame due now or None, and the milliseconds to wait before asking again.
+        
+        delay is None once the worker has stopped and every frame has been taken.
+        """
+        with self._condition:
+            if self._started is None:
+                if not self._frames:
+                    return None, (None if self.finished else self.WAIT_INTERVAL)
+                self._started = time.perf_counter_ns()
+            
+            now = self._elapsed()
+            frame = None
+            while self._frames and self._frames[0][0] <= now:
+                if frame is not None:
+                    self.dropped += 1
+                frame = self._frames.popleft()[1]
+            self._condition.notify()
+            
+            if self._frames:
+                delay = max(1, round(self._frames[0][0] - now))
+            else:
+                delay = None if self.finished else self.WAIT_INTERVAL
+            return frame, delay
+    
+    def stop(self):
+        """Stop the worker and drop the buffered frames"""
+        with self._condition:
+            self._stopped = True
+            self._frames.clear()
+            self._condition.notify_all()
+    
+    def _elapsed(self):
+        """Milliseconds of playback so far"""
+        return 0 if self._started is None else (time.perf_counter_ns() - self._started) / 1e6
+    
+    def _run(self):
+        try:
+            with Image.open(self.path) as image:
+                self.animated = getattr(image, "is_animated", False)
+                if not self.animated:
+                    return
+                target_size = rotated_target_size(image.size, self.box, self.rotation)
+                
+                timeline = 0
+                delivered = 0
+                while not self._stopped:
+                    loop_start = timeline
+                    for index in itertools.count():
+                        try:
+                            image.seek(index)
+                        except EOFError:
+                            break
+                        start, timeline = timeline, timeline + frame_duration(image)
+                        
+                        # Over before it could be shown: frames build on each other, so it was
+                        # decoded by seek(), but it is not converted
+                        elapsed = self._elapsed()
+                        if self._started is not None and timeline <= elapsed and elapsed - delivered < self.MAX_SKIP_INTERVAL:
+                            self.dropped += 1
+                            continue
+                        
+                        with tracer.span("animation frame", "decode", index=index):
+                            # Palette frames can only be resized with NEAREST: convert those first
+                            frame = image.convert("RGBA") if image.mode in ("P", "PA", "1") else image
+                            frame = frame.resize(target_size, Image.Resampling.BILINEAR)
+                            if frame.mode != "RGBA":
+                                frame = frame.convert("RGBA")
+                            if self.rotation in ROTATIONS:
+                                frame = frame.transpose(ROTATIONS[self.rotation])
+                        
+                        with self._condition:
+                            while len(self._frames) >= self.capacity and not self._stopped:
+                                self._condition.wait()
+                            if self._stopped:
+                                return
+                            self._frames.append((start, frame))
+                        delivered = self._elapsed()
+                    
+                    # Playback ran whole loops ahead, after a stall: skip them rather than seeking through them
+                    loop_duration = timeline - loop_start
+                    behind = self._elapsed() - timeline
+                    if behind > loop_duration > 0:
+                        timeline += behind // loop_duration * loop_duration
+        except Exception:
+            if self.animated is None:
+                self.animated = False
+        finally:
+            with self._condition:
+                self.finished = True
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .paths import user_cache_dir
+from .store import file_key
+
+
+class FileResultStore:
+    """Persistent per-file results in a SQLite table, valid while the file is unchanged.
+    
+    Rows are keyed by absolute path and hold the file size and mtime they were computed
+    at; get_many() only returns results whose file still matches. Subclasses name the
+    table and its result columns, and may convert results to and from rows.
+    
+    Args:
+        path (str): Database file, by default DEFAULT_FILENAME in the user cache directory
+    """
+    TABLE = None
+    COLUMNS = ()
+    DEFAULT_FILENAME = None
+    
+    def __init__(self, path=None):
+        self.path = path or os.path.join(user_cache_dir(), self.DEFAULT_FILENAME)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            f"{', '.join(self.COLUMNS)})"
+        )
+        self._connection.commit()
+    
+    def encode(self, result):
+        """Return the column values of a result"""
+        return tuple(result)
+    
+    def decode(self, values):
+        """Return the result stored as column values"""
+        return values
+    
+    def get_many(self, keys):
+        """Return {path: result} for the file keys whose results are stored and current"""
+        keys = {key[0]: key for key in keys}
+        found = {}
+        paths = list(keys)
+        with self._lock:
+            # Stay under SQLite's default limit of bound parameters
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT * FROM {self.TABLE} WHERE path IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for path, size, mtime_ns, *values in rows:
+                    if keys[path][1:] == (size, mtime_ns):
+                        found[path] = self.decode(values)
+        return found
+    
+    def put_many(self, entries):
+        """Store (file key, result) pairs in one transaction"""
+        placeholders = ", ".join("?" * (3 + len(self.COLUMNS)))
+        with self._lock:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self.TABLE} VALUES ({placeholders})",
+                [(*key, *self.encode(result)) for key, result in entries]
+            )
+            self._connection.commit()
+    
+    def close(self):
+        """Close the database"""
+        with self._lock:
+            self._connection.close()
+
+
+def process_files(image_paths, process_chunk, store=None, workers=None, progress=None, chunk_size=32):
+    """Compute a result per file on a process pool, reusing the results already stored.
+    
+    Files are sent to the workers in chunks to amortize the round trip, with a bounded
+    number of chunks in flight. New results are written to the store as they arrive,
+    so an interrupted run resumes.
+    
+    Args:
+        image_paths (iterable): Files to process
+        process_chunk (callable): Top-level function run in the workers as process_chunk(paths);
+            returns, for each path, (file key, result) or None if the file can't be processed
+        store (FileResultStore): Optional persistent store of results
+        workers (int): Number of processes (default: one per core)
+        progress (callable): Called as progress(done, total) as results arrive
+        chunk_size (int): Files per task
+    
+    Returns:
+        dict: {absolute path: result} for every file that could be processed
+    """
+    image_paths = [os.path.abspath(image_path) for image_path in image_paths]
+    total = len(image_paths)
+    results = {}
+    
+    if store is not None:
+        keys = [key for key in map(file_key, image_paths) if key is not None]
+        results.update(store.get_many(keys))
+        pending = [image_path for image_path in image_paths if image_path not in results]
+    else:
+        pending = image_paths
+    
+    done_count = total - len(pending)
+    if progress:
+        progress(done_count, total)
+    if not pending:
+        return results
+    
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    in_flight = {}
+    
+    def collect(done):
+        nonlocal done_count
+        rows = []
+        for future in done:
+            try:
+                chunk_results = future.result()
+            except Exception:
+                chunk_results = []
+            done_count += in_flight.pop(future)
+            rows.extend(row for row in chunk_results if row is not None)
+        for key, result in rows:
+            results[key[0]] = result
+        if store is not None and rows:
+            store.put_many(rows)
+        if progress:
+            progress(done_count, total)
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(pending), chunk_size):
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            chunk = pending[start:start + chunk_size]
+            in_flight[executor.submit(process_chunk, chunk)] = len(chunk)
+        
+        done, _ = wait(in_flight)
+        collect(done)
+    
+    return results
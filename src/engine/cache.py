@@ -0,0 +1,197 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+
+CacheStats = namedtuple("CacheStats", ["hits", "misses", "evictions", "entries", "resident_bytes", "budget_bytes"])
+
+
+def image_nbytes(image):
+    """Approximate memory held by a decoded PIL image"""
+    return image.width * image.height * len(image.getbands())
+
+
+class PreviewCache:
+    """Thread-safe in-memory LRU store of decoded previews with a budget in bytes.
+    
+    Every preview is keyed by key(image_path, box, rotation), both when it is stored
+    (display or preload) and when it is looked up. The engine stores previews for
+    pyramid levels, so one image may be cached at several boxes; nearest() finds the
+    best of them for another box. When the resident size goes over the budget the
+    least recently used previews are evicted.
+    
+    Args:
+        budget_bytes (int): Maximum memory held by the cached previews
+    """
+    DEFAULT_BUDGET = 256 * 1024 * 1024
+    
+    def __init__(self, budget_bytes=DEFAULT_BUDGET):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._keys_by_path = {}
+        self._identities = {}
+        self._lock = threading.Lock()
+        self._resident_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+    
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    
+    @staticmethod
+    def key(image_path, box, rotation=0):
+        """Return the canonical cache key of a preview"""
+        return (image_path, tuple(box), rotation % 360)
+    
+    def get(self, image_path, box, rotation=0):
+        """Return the cached preview or None, counting a hit or a miss"""
+        key = self.key(image_path, box, rotation)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+    
+    def nearest(self, image_path, box, rotation=0, smaller=False):
+        """Return (box, preview) for the smallest cached box of an image covering box, or None.
+        
+        With smaller set, the largest cached box is returned when none covers box.
+        Not counted as a hit or a miss.
+        """
+        width, height = box
+        rotation %= 360
+        with self._lock:
+            keys = [key for key in self._keys_by_path.get(image_path, ()) if key[2] == rotation]
+            covering = [key for key in keys if key[1][0] >= width and key[1][1] >= height]
+            if covering:
+                key = min(covering, key=lambda key: key[1][0] * key[1][1])
+            elif smaller and keys:
+                key = max(keys, key=lambda key: key[1][0] * key[1][1])
+            else:
+                return None
+            self._entries.move_to_end(key)
+            return key[1], self._entries[key][0]
+    
+    def put(self, image_path, box, image, rotation=0, identity=None):
+        """Store a preview, evicting the least recently used ones if over budget.
+        
+        identity is the (size, mtime_ns) of the file the preview was decoded from,
+        used by identities() to find previews of files modified since.
+        """
+        key = self.key(image_path, box, rotation)
+        nbytes = image_nbytes(image)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (image, nbytes)
+            self._keys_by_path.setdefault(image_path, set()).add(key)
+            if identity is not None:
+                self._identities[image_path] = identity
+            self._resident_bytes += nbytes
+            
+            while self._resident_bytes > self.budget_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+    
+    def discard(self, image_path):
+        """Drop every preview of an image"""
+        with self._lock:
+            for key in list(self._keys_by_path.get(image_path, ())):
+                self._remove(key)
+    
+    def clear(self):
+        """Drop every preview"""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_path.clear()
+            self._identities.clear()
+            self._resident_bytes = 0
+    
+    def identities(self):
+        """Return {image_path: (size, mtime_ns)} for the cached images whose identity is known"""
+        with self._lock:
+            return dict(self._identities)
+    
+    def stats(self):
+        """Return the hit, miss and eviction counters and the resident size"""
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries),
+                              self._resident_bytes, self.budget_bytes)
+    
+    def _remove(self, key):
+        _, nbytes = self._entries.pop(key)
+        self._resident_bytes -= nbytes
+        keys = self._keys_by_path[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_path[key[0]]
+            self._identities.pop(key[0], None)
+
+
+class TileCache:
+    """Thread-safe in-memory LRU store of zoom tiles with a budget in bytes.
+    
+    Tiles are keyed by the identity of their file, the rotation, the zoom factor and
+    their position, so memory stays within the budget however far an image is panned.
+    
+    Args:
+        budget_bytes (int): Maximum memory held by the cached tiles
+    """
+    DEFAULT_BUDGET = 64 * 1024 * 1024
+    
+    def __init__(self, budget_bytes=DEFAULT_BUDGET):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._resident_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    
+    def get(self, key):
+        """Return the cached tile or None, counting a hit or a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+    
+    def put(self, key, image):
+        """Store a tile, evicting the least recently used ones if over budget"""
+        nbytes = image_nbytes(image)
+        with self._lock:
+            if key in self._entries:
+                self._resident_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (image, nbytes)
+            self._resident_bytes += nbytes
+            
+            while self._resident_bytes > self.budget_bytes and len(self._entries) > 1:
+                self._resident_bytes -= self._entries.popitem(last=False)[1][1]
+                self._evictions += 1
+    
+    def clear(self):
+        """Drop every tile"""
+        with self._lock:
+            self._entries.clear()
+            self._resident_bytes = 0
+    
+    def stats(self):
+        """Return the hit, miss and eviction counters and the resident size"""
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries),
+                              self._resident_bytes, self.budget_bytes)
@@ -0,0 +1,445 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+from .duplicates import compute_hashes, iter_similar_pairs
+from .metadata import ImageMetadata, read_metadata
+from .scanner import DirectoryScanner
+from .trash import move_many_to_trash, move_to_trash
+
+
+# A file selected by the rules; duplicate_of is the file kept in its place, if any
+CleanupMatch = namedtuple("CleanupMatch", ["path", "size", "width", "height", "mtime", "reasons", "duplicate_of"])
+
+# Totals of a cleanup run
+CleanupSummary = namedtuple("CleanupSummary", ["scanned", "matched", "trashed", "failed"])
+
+
+class CleanupRules:
+    """Rules selecting the files of a cleanup run. A file is selected when any rule matches.
+    
+    Of a set of duplicates the oldest file (by mtime, then path) is kept and the others
+    are selected; files already selected by another rule are never the one kept.
+    
+    Args:
+        min_resolution (tuple): (width, height) below which an image is selected, in either orientation
+        max_size (int): File size in bytes above which a file is selected
+        extensions (iterable): Extensions (".bmp") whose files are selected
+        older_than (float): Days since the last modification above which a file is selected
+        exact_duplicates (bool): Select byte-identical copies
+        near_duplicates (int): Select near-duplicates up to this pHash distance, or None
+    """
+    def __init__(self, min_resolution=None, max_size=None, extensions=(), older_than=None,
+                 exact_duplicates=False, near_duplicates=None):
+        self.min_resolution = min_resolution
+        self.max_size = max_size
+        self.extensions = frozenset(extension.lower() for extension in extensions)
+        self.older_than = older_than
+        self.exact_duplicates = exact_duplicates
+        self.near_duplicates = near_duplicates
+    
+    def __bool__(self):
+        return any((
+            self.min_resolution is not None, self.max_size is not None, self.extensions,
+            self.older_than is not None, self.exact_duplicates, self.near_duplicates is not None
+        ))
+    
+    @property
+    def needs_duplicates(self):
+        return self.exact_duplicates or self.near_duplicates is not None
+    
+    def match(self, metadata, now):
+        """Return the reasons the per-file rules select a file for, empty if none"""
+        reasons = []
+        if self.min_resolution is not None and metadata.width is not None:
+            short_side, long_side = sorted((metadata.width, metadata.height))
+            min_short, min_long = sorted(self.min_resolution)
+            if short_side < min_short or long_side < min_long:
+                reasons.append("resolution")
+        if self.max_size is not None and metadata.size > self.max_size:
+            reasons.append("size")
+        if self.extensions and os.path.splitext(metadata.path)[1].lower() in self.extensions:
+            reasons.append("extension")
+        if self.older_than is not None and now - metadata.mtime_ns / 1e9 > self.older_than * 86400:
+            reasons.append("age")
+        return reasons
+
+
+def inspect_files(image_paths, read_headers, with_hashes):
+    """Gather what the rules need about a batch of files. Runs in worker processes.
+    
+    Returns:
+        list: (ImageMetadata, pHash or None) for every file that still exists
+    """
+    results = []
+    for image_path in image_paths:
+        try:
+            stats = os.stat(image_path)
+        except OSError:
+            continue
+        
+        metadata = read_metadata(image_path, stats) if read_headers else None
+        if metadata is None:
+            # Unreadable headers leave the resolution unknown; the other rules still apply
+            metadata = ImageMetadata(image_path, stats.st_size, stats.st_mtime_ns, stats.st_ctime, None, None, None, None)
+        
+        phash = None
+        if with_hashes:
+            try:
+                with Image.open(image_path) as image:
+                    phash = compute_hashes(image).phash
+            except Exception:
+                phash = None
+        results.append((metadata, phash))
+    return results
+
+
+def digest_files(image_paths):
+    """Return the SHA-256 digest of each file, or None for unreadable ones. Runs in worker processes"""
+    digests = []
+    for image_path in image_paths:
+        try:
+            digest = hashlib.sha256()
+            with open(image_path, "rb") as file:
+                for block in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(block)
+            digests.append(digest.digest())
+        except OSError:
+            digests.append(None)
+    return digests
+
+
+class JsonReport:
+    """Write matches as a JSON array, one object per line, as they are found"""
+    def __init__(self, stream):
+        self.stream = stream
+        self._count = 0
+        self.stream.write("[\n")
+    
+    def write(self, match):
+        row = match._asdict()
+        row["mtime"] = datetime.fromtimestamp(match.mtime).isoformat(timespec="seconds")
+        self.stream.write(("" if self._count == 0 else ",\n") + json.dumps(row))
+        self._count += 1
+        self.stream.flush()
+    
+    def close(self):
+        self.stream.write(("\n" if self._count else "") + "]\n")
+        self.stream.flush()
+
+
+class CsvReport:
+    """Write matches as CSV rows, reasons separated by semicolons, as they are found"""
+    def __init__(self, stream):
+        self.stream = stream
+        self._writer = csv.writer(stream)
+        self._writer.writerow(CleanupMatch._fields)
+    
+    def write(self, match):
+        mtime = datetime.fromtimestamp(match.mtime).isoformat(timespec="seconds")
+        self._writer.writerow((
+            match.path, match.size, match.width, match.height, mtime,
+            ";".join(match.reasons), match.duplicate_of or ""
+        ))
+        self.stream.flush()
+    
+    def close(self):
+        self.stream.flush()
+
+
+REPORT_FORMATS = {
+    "json": JsonReport,
+    "csv": CsvReport,
+}
+
+
+class _TrashBatches:
+    """Moves selected files to the trash in batches, one file at a time when a batch fails"""
+    def __init__(self, batch_size, on_error=None):
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.trashed = 0
+        self.failed = 0
+        self._batch = []
+    
+    def add(self, image_path):
+        self._batch.append(image_path)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        try:
+            move_many_to_trash(batch)
+            self.trashed += len(batch)
+            return
+        except Exception:
+            pass
+        
+        for image_path in batch:
+            if not os.path.lexists(image_path):
+                # Already moved before the batch failed
+                self.trashed += 1
+                continue
+            try:
+                move_to_trash(image_path)
+                self.trashed += 1
+            except Exception as e:
+                self.failed += 1
+                if self.on_error:
+                    self.on_error(image_path, e)
+
+
+def run_cleanup(root, rules, report, recursive=True, trash=False, workers=None, trash_batch_size=500,
+                progress=None, on_error=None):
+    """Select the files under root matching the rules, report them and optionally trash them.
+    
+    The tree is streamed: batches of files are inspected on a process pool with a
+    bounded number in flight, matches of the per-file rules are reported (and trashed)
+    as soon as they are known, and the files that might be duplicates wait in a
+    temporary SQLite database rather than in memory. Duplicate rules run once the scan
+    is over: exact duplicates by size, then SHA-256, and near duplicates by multi-index
+    pHash search over NumPy arrays of 24 bytes per file, comparing and grouping the
+    hashes a bounded slice at a time.
+    
+    Args:
+        root (str): Directory to clean up
+        rules (CleanupRules): Selection rules
+        report (JsonReport or CsvReport): Receives every match
+        recursive (bool): Whether to descend into subdirectories
+        trash (bool): Move the matches to the trash; otherwise only report them (dry run)
+        workers (int): Number of worker processes (default: one per core)
+        trash_batch_size (int): Files moved to the trash per call
+        progress (callable): Called as progress(scanned, matched)
+        on_error (callable): Called as on_error(path, error) for files that could not be trashed
+    
+    Returns:
+        CleanupSummary: The totals of the run
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    now = time.time()
+    trasher = _TrashBatches(trash_batch_size, on_error) if trash else None
+    scanned = matched = 0
+    
+    def select(match):
+        nonlocal matched
+        report.write(match)
+        matched += 1
+        if trasher is not None:
+            trasher.add(match.path)
+    
+    handle, database_path = tempfile.mkstemp(prefix="gallerycleaner-", suffix=".sqlite3")
+    os.close(handle)
+    connection = sqlite3.connect(database_path)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.execute(
+        "CREATE TABLE files (seq INTEGER PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, "
+        "mtime REAL NOT NULL, width INTEGER, height INTEGER, phash INTEGER, digest BLOB, "
+        "matched INTEGER NOT NULL DEFAULT 0)"
+    )
+    
+    def collect(done):
+        nonlocal scanned
+        candidates = []
+        for future in done:
+            try:
+                results = future.result()
+            except Exception:
+                results = []
+            for metadata, phash in results:
+                scanned += 1
+                mtime = metadata.mtime_ns / 1e9
+                reasons = rules.match(metadata, now)
+                if reasons:
+                    select(CleanupMatch(metadata.path, metadata.size, metadata.width, metadata.height, mtime, reasons, None))
+                elif rules.needs_duplicates:
+                    # SQLite integers are signed 64-bit
+                    signed = phash - (1 << 64) if phash is not None and phash >= 1 << 63 else phash
+                    candidates.append((metadata.path, metadata.size, mtime, metadata.width, metadata.height, signed))
+        if candidates:
+            connection.executemany(
+                "INSERT INTO files (path, size, mtime, width, height, phash) VALUES (?, ?, ?, ?, ?, ?)", candidates
+            )
+        if progress:
+            progress(scanned, matched)
+    
+    scanner = DirectoryScanner(root, recursive, record=False, max_batches=max_in_flight * 2).start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = set()
+            for batch in scanner:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(
+                    inspect_files, batch, rules.min_resolution is not None, rules.near_duplicates is not None
+                ))
+            done, in_flight = wait(in_flight)
+            collect(done)
+            if scanner.error is not None:
+                raise scanner.error
+            
+            if rules.exact_duplicates:
+                _select_exact_duplicates(connection, executor, select, max_in_flight)
+            if rules.near_duplicates is not None:
+                _select_near_duplicates(connection, rules.near_duplicates, select)
+    finally:
+        scanner.cancel()
+        connection.close()
+        os.remove(database_path)
+        if trasher is not None:
+            trasher.flush()
+    
+    if progress:
+        progress(scanned, matched)
+    return CleanupSummary(
+        scanned, matched, trasher.trashed if trasher else 0, trasher.failed if trasher else 0
+    )
+
+
+def _select_exact_duplicates(connection, executor, select, max_in_flight, chunk_size=64, page_size=4096):
+    """Digest the files sharing their size with another one and select all but the oldest of each copy set.
+    
+    Candidates and copies are read a page at a time, keyed on the last row seen, so
+    neither the digests in flight nor the selected files are ever held all at once.
+    """
+    connection.execute("CREATE INDEX files_size ON files (size)")
+    connection.execute("CREATE TABLE duplicate_sizes (size INTEGER PRIMARY KEY)")
+    connection.execute("INSERT INTO duplicate_sizes SELECT size FROM files GROUP BY size HAVING COUNT(*) > 1")
+    
+    in_flight = {}
+    
+    def collect(done):
+        for future in done:
+            seqs = in_flight.pop(future)
+            try:
+                digests = future.result()
+            except Exception:
+                continue
+            connection.executemany(
+                "UPDATE files SET digest=? WHERE seq=?",
+                [(digest, seq) for seq, digest in zip(seqs, digests) if digest is not None]
+            )
+    
+    # Each page is read in full before the updates run: they must not run under an open SELECT.
+    # +size keeps SQLite walking the rows by seq, rather than sorting every remaining candidate per page
+    last_seq = 0
+    while True:
+        page = connection.execute(
+            "SELECT seq, path FROM files WHERE seq > ? AND +size IN (SELECT size FROM duplicate_sizes) "
+            "ORDER BY seq LIMIT ?", (last_seq, page_size)
+        ).fetchall()
+        if not page:
+            break
+        last_seq = page[-1][0]
+        for start in range(0, len(page), chunk_size):
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            seqs, paths = zip(*page[start:start + chunk_size])
+            in_flight[executor.submit(digest_files, paths)] = seqs
+    done, _ = wait(in_flight)
+    collect(done)
+    
+    connection.execute("CREATE INDEX files_copies ON files (size, digest, mtime, path) WHERE digest IS NOT NULL")
+    kept_key = kept_path = None
+    position = None
+    while True:
+        if position is None:
+            page = connection.execute(
+                "SELECT seq, path, size, mtime, width, height, digest FROM files "
+                "WHERE digest IS NOT NULL ORDER BY size, digest, mtime, path LIMIT ?", (page_size,)
+            ).fetchall()
+        else:
+            page = connection.execute(
+                "SELECT seq, path, size, mtime, width, height, digest FROM files "
+                "WHERE digest IS NOT NULL AND (size, digest, mtime, path) > (?, ?, ?, ?) "
+                "ORDER BY size, digest, mtime, path LIMIT ?", (*position, page_size)
+            ).fetchall()
+        if not page:
+            break
+        _, path, size, mtime, _, _, digest = page[-1]
+        position = (size, digest, mtime, path)
+        
+        selected = []
+        for seq, path, size, mtime, width, height, digest in page:
+            if (size, digest) != kept_key:
+                kept_key, kept_path = (size, digest), path
+                continue
+            select(CleanupMatch(path, size, width, height, mtime, ["exact duplicate"], kept_path))
+            selected.append((seq,))
+        connection.executemany("UPDATE files SET matched=1 WHERE seq=?", selected)
+
+
+def _select_near_duplicates(connection, threshold, select, chunk_size=4096):
+    """Group files by pHash distance and select all but the oldest of each group"""
+    query = "FROM files WHERE matched=0 AND phash IS NOT NULL"
+    count, = connection.execute(f"SELECT COUNT(*) {query}").fetchone()
+    if not count:
+        return
+    
+    # Filled a chunk of rows at a time, so no Python object per file is held
+    seqs = np.empty(count, dtype=np.int64)
+    hashes = np.empty(count, dtype=np.int64)
+    rows = connection.execute(f"SELECT seq, phash {query} ORDER BY mtime, path")
+    filled = 0
+    while filled < count:
+        chunk = rows.fetchmany(chunk_size)
+        if not chunk:
+            break
+        seqs[filled:filled + len(chunk)], hashes[filled:filled + len(chunk)] = zip(*chunk)
+        filled += len(chunk)
+    rows.close()
+    seqs, hashes = seqs[:filled], hashes[:filled].view(np.uint64)
+    
+    # Vectorized union-find over each batch of pairs as it is found; rows are sorted oldest first,
+    # and a group is always labelled by its smallest index, the file to keep
+    labels = np.arange(filled)
+    
+    def roots(indices):
+        found = labels[indices]
+        while True:
+            parents = labels[found]
+            if np.array_equal(parents, found):
+                return found
+            found = parents
+    
+    for left, right in iter_similar_pairs(hashes, threshold):
+        while len(left):
+            left_roots, right_roots = roots(left), roots(right)
+            apart = left_roots != right_roots
+            left, right = left[apart], right[apart]
+            # Several pairs may relabel one root in a pass; the loop joins the lows they leave behind
+            np.minimum.at(labels, np.maximum(left_roots[apart], right_roots[apart]),
+                          np.minimum(left_roots[apart], right_roots[apart]))
+    labels = roots(labels)
+    
+    connection.execute("CREATE TEMP TABLE near_matches (position INTEGER PRIMARY KEY, seq INTEGER, kept INTEGER)")
+    selected = np.flatnonzero(labels != np.arange(filled))
+    for start in range(0, len(selected), chunk_size):
+        positions = selected[start:start + chunk_size]
+        connection.executemany(
+            "INSERT INTO near_matches VALUES (?, ?, ?)",
+            zip(positions.tolist(), seqs[positions].tolist(), seqs[labels[positions]].tolist())
+        )
+        for path, size, mtime, width, height, kept_path in connection.execute(
+            "SELECT file.path, file.size, file.mtime, file.width, file.height, kept.path FROM near_matches "
+            "JOIN files AS file ON file.seq = near_matches.seq JOIN files AS kept ON kept.seq = near_matches.kept "
+            "ORDER BY position"
+        ).fetchall():
+            select(CleanupMatch(path, size, width, height, mtime, ["near duplicate"], kept_path))
+        connection.execute("DELETE FROM near_matches")
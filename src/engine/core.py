@@ -0,0 +1,893 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .animation import AnimationStream, may_be_animated
+from .cache import PreviewCache, TileCache
+from .cursor import NavigationCursor
+from .decoder import fit_preview, level_box, load_preview, load_quick_preview, placeholder_preview, rotate_preview
+from .details import format_details, get_file_details
+from .metadata import read_metadata
+from .scanner import DirectoryScanner
+from .scheduler import DecodeScheduler
+from .session import SessionState
+from .snapshot import TreeChanges
+from .store import file_key
+from .tiles import TiledImage
+from .tracing import tracer
+from .trash import TrashQueue
+from .watcher import TreeWatcher
+
+
+class Engine:
+    """Headless culling session: the image list, the cursor over it and the preview cache.
+    
+    The viewer is a thin client of this class; everything here runs without a display.
+    
+    Args:
+        store (PreviewStore): Optional persistent store consulted before decoding an image
+        cache_budget (int): Memory budget of the in-memory preview cache in bytes
+        trash (TrashQueue): Queue that performs deletions, by default one without a journal
+        metadata (MetadataIndex): Optional index that answers details() and is filled in the background
+        hashes (HashStore): Optional persistent store of the perceptual hashes used to find duplicates
+        quality (QualityStore): Optional persistent store of the quality scores used to order worst first
+        sessions (SessionStore): Optional store of per-root sessions, saved by save_session() and reopened by resume()
+    """
+    # Number of images kept around the cursor by preload()
+    PRELOAD_BEHIND = 19
+    PRELOAD_AHEAD = 30
+    
+    # Maximum pHash distance between two images reviewed as duplicates
+    DUPLICATE_THRESHOLD = 8
+    
+    # Threads decoding the tiles of a zoomed image
+    TILE_WORKERS = 2
+    
+    def __init__(self, store=None, cache_budget=PreviewCache.DEFAULT_BUDGET, trash=None, metadata=None, hashes=None, quality=None,
+                 sessions=None):
+        self.store = store
+        self.trash = trash if trash is not None else TrashQueue()
+        self.metadata = metadata
+        self.hashes = hashes
+        self.quality = quality
+        self.sessions = sessions
+        self.directory = None
+        self.recursive = False
+        self.cursor = NavigationCursor()
+        self.cache = PreviewCache(cache_budget)
+        self.scanner = None
+        self.scheduler = None
+        
+        # Snapshot of the last complete scan, diffed by refresh(), and the live watcher of the tree
+        self.snapshot = None
+        self.watcher = None
+        
+        # Background re-listing of a resumed session, and the snapshot last written to the session store
+        self.validation = None
+        self._saved_snapshot = None
+        
+        # Rotations the user applied, by path, kept across navigation and sessions
+        self.rotations = {}
+        
+        # (done, total) files of the running duplicate search or quality scoring
+        self.task_progress = (0, 0)
+        
+        # Duplicate review: the groups under review and the full list to return to
+        self.duplicate_groups = []
+        self._group_of = {}
+        self._browse_cursor = None
+        
+        # Order of the list: "scan" as found on disk, or "worst" first by quality score
+        self.order = "scan"
+        self._scan_order = None
+        
+        # Preview the viewer is waiting for, decoded ahead of every preload
+        self._requested = None
+        self._requests = {}
+        self._requests_lock = threading.Lock()
+        
+        # (future, box, rotation) of each thumbnail the grid is waiting for, by cache key of the level decoded for it
+        self._thumbnail_requests = {}
+        
+        # Image zoomed in by the viewer, the cache of its tiles and the threads decoding them
+        self.zoomed = None
+        self.tiles = TileCache()
+        self._tile_pool = None
+        
+        # Animated image being played by the viewer
+        self.animation = None
+    
+    @property
+    def reviewing(self):
+        """Whether the cursor is going through duplicate groups instead of the whole list"""
+        return self._browse_cursor is not None
+    
+    @property
+    def scanning(self):
+        """Whether a streaming scan is still adding images to the list"""
+        return self.scanner is not None and not self.scanner.done
+    
+    def open(self, directory, recursive=False):
+        """Scan a directory and start a new session on it. Returns the list of images"""
+        self._reset(directory, recursive)
+        scanner = DirectoryScanner(self.directory, recursive).start()
+        images = [image_path for batch in scanner for image_path in batch]
+        scanner.raise_for_error()
+        
+        self.cursor = NavigationCursor(images)
+        self._index_metadata(images)
+        self._scan_finished(scanner)
+        return images
+    
+    def open_streaming(self, directory, recursive=False):
+        """Start a new session on a directory whose list grows while it is scanned.
+        
+        The list starts empty; call poll_scan() periodically to move the images found
+        so far into it. Returns the scanner.
+        """
+        self._reset(directory, recursive)
+        self.scanner = DirectoryScanner(self.directory, recursive).start()
+        return self.scanner
+    
+    def poll_scan(self):
+        """Append the images found since the last call to the list. Returns how many were added"""
+        if self.scanner is None:
+            return 0
+        
+        image_paths = self.scanner.poll()
+        self.cursor.images.extend(image_paths)
+        self._index_metadata(image_paths)
+        if self.scanner.done and self.scanner.error is None and self.snapshot is not self.scanner.snapshot:
+            self._scan_finished(self.scanner)
+        return len(image_paths)
+    
+    def cancel_scan(self):
+        """Stop a streaming scan in progress"""
+        if self.scanner is not None:
+            self.scanner.cancel()
+            self.scanner = None
+    
+    def refresh(self, changed_directories=None, changed_files=None):
+        """Bring the list up to date with the directory tree and return the TreeChanges.
+        
+        The tree is diffed against the snapshot of the last scan: only directories whose
+        mtime changed (or, when given, the changed_directories reported by a watcher)
+        are listed again, and only added and removed images change the list. Cached
+        previews are kept except those of files modified since they were decoded. The
+        cursor stays on the same image, or the one after it if it was removed.
+        """
+        if self.snapshot is None:
+            self.cancel_scan()
+        return self._apply_rescan(self._rescan(self.snapshot, changed_directories), changed_files)
+    
+    def poll_changes(self):
+        """Apply the changes reported by the filesystem watcher since the last call.
+        
+        Returns the TreeChanges, or None when there is no watcher or nothing changed.
+        """
+        if self.watcher is None or self.snapshot is None:
+            return None
+        
+        changed_directories, changed_files = self.watcher.take_changes()
+        if not changed_directories and not changed_files:
+            return None
+        return self.refresh(changed_directories, changed_files)
+    
+    def resume(self, directory, recursive=False):
+        """Reopen the saved session of a directory from its snapshot instead of scanning it.
+        
+        The list is rebuilt from the snapshot of the last scan and the cursor goes back
+        to the image shown last, so a large tree reopens at once. The tree is then listed
+        again on a background thread, only the directories whose mtime changed, and
+        poll_validation() applies what changed meanwhile. Returns False, leaving the
+        current session as it is, when nothing is saved for the directory and flag.
+        """
+        if self.sessions is None:
+            return False
+        directory = os.path.abspath(directory)
+        state = self.sessions.load(directory)
+        snapshot = self.sessions.load_snapshot(directory, recursive)
+        if state is None or snapshot is None:
+            return False
+        images = list(snapshot.image_paths())
+        if not images:
+            return False
+        
+        self._reset(directory, recursive)
+        self.snapshot = self._saved_snapshot = snapshot
+        self.rotations = dict(state.rotations)
+        self.cursor = NavigationCursor(images)
+        if state.current_path in self.cursor.images:
+            self.cursor.seek(state.current_path)
+        else:
+            # The image shown last is gone: land where it was
+            self.cursor.index = min(max(state.index, 0), len(self.cursor) - 1)
+        self.validation = self._in_background(self._rescan, snapshot)
+        return True
+    
+    @property
+    def validating(self):
+        """Whether a resumed session is still being checked against the tree"""
+        return self.validation is not None
+    
+    def poll_validation(self):
+        """Apply what the background validation of a resumed session found.
+        
+        Returns the TreeChanges once the validation is done, and None while it runs or
+        when there is none. Re-raises the error that stopped it, such as a root that
+        no longer exists.
+        """
+        future = self.validation
+        if future is None or not future.done():
+            return None
+        self.validation = None
+        scanner = future.result()
+        
+        changes = None
+        # A refresh since resume() already brought the list up to date
+        if scanner.previous is self.snapshot:
+            changes = self._apply_rescan(scanner)
+        self._start_watching()
+        return changes
+    
+    def rotation(self, image_path):
+        """Return the rotation the user applied to an image, in degrees clockwise"""
+        return self.rotations.get(image_path, 0)
+    
+    def set_rotation(self, image_path, rotation):
+        """Remember the rotation of an image for the rest of the session and the next ones"""
+        rotation %= 360
+        if rotation:
+            self.rotations[image_path] = rotation
+        else:
+            self.rotations.pop(image_path, None)
+    
+    def save_session(self, wait=False):
+        """Store the position in the list for resume(), with the scan snapshot if it changed.
+        
+        The position is written at once; a new snapshot is written on a background
+        thread unless wait is set.
+        """
+        if self.sessions is None or self.directory is None:
+            return
+        full = self._browse_cursor if self.reviewing else self.cursor
+        current_image_path = self.cursor.current
+        index = full.images.index(current_image_path) if current_image_path in full.images else full.index
+        state = SessionState(self.directory, self.recursive, current_image_path, index, dict(self.rotations))
+        
+        if self.snapshot is None or self.snapshot is self._saved_snapshot:
+            self.sessions.save(state)
+            return
+        self._saved_snapshot = self.snapshot
+        order = list(self._scan_order if self._scan_order is not None else full.images)
+        if wait:
+            self.sessions.save(state, self.snapshot, order)
+        else:
+            self._in_background(self.sessions.save, state, self.snapshot, order)
+    
+    def find_duplicates(self, image_paths=None, threshold=DUPLICATE_THRESHOLD):
+        """Hash images on all cores and return the groups of near-duplicates among them.
+        
+        Blocking; task_progress holds (hashed, total) while it runs. Hashes are
+        kept in the hash store, so only new or modified images are hashed again.
+        
+        Args:
+            image_paths (iterable): Images to compare, by default the whole list
+            threshold (int): Maximum pHash distance between two images of a group
+        """
+        # Imported on first use: they bring in numpy, which the viewer does not need to start
+        from .duplicates import find_duplicates, hash_images
+        
+        if image_paths is None:
+            image_paths = list(self.cursor.images)
+        
+        hashes = hash_images(image_paths, self.hashes, progress=self._set_task_progress)
+        # Groups list their images in list order
+        hashes = {image_path: hashes[image_path] for image_path in map(os.path.abspath, image_paths) if image_path in hashes}
+        return find_duplicates(hashes, threshold)
+    
+    def search_duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        """Run find_duplicates() on the current list in a background thread. Returns a Future of the groups"""
+        image_paths = list(self.cursor.images)
+        self.task_progress = (0, len(image_paths))
+        return self._in_background(self.find_duplicates, image_paths, threshold)
+    
+    def score_images(self, image_paths=None):
+        """Score the quality of images on all cores. Returns {path: QualityScores}
+        
+        Blocking; task_progress holds (scored, total) while it runs. Scores are kept in
+        the quality store, so only new or modified images are scored again.
+        """
+        from .quality import score_images
+        
+        if image_paths is None:
+            image_paths = list(self.cursor.images)
+        return score_images(image_paths, self.quality, progress=self._set_task_progress)
+    
+    def search_scores(self):
+        """Run score_images() on the current list in a background thread. Returns a Future of the scores"""
+        image_paths = list(self.cursor.images)
+        self.task_progress = (0, len(image_paths))
+        return self._in_background(self.score_images, image_paths)
+    
+    def order_worst_first(self, scores):
+        """Reorder the list from the likeliest reject to the best image and go to the first one"""
+        from .quality import worst_first
+        
+        if self.order == "scan":
+            self._scan_order = list(self.cursor.images)
+        self.order = "worst"
+        self.cursor = NavigationCursor(worst_first(list(self.cursor.images), scores))
+    
+    def order_by_scan(self):
+        """Put the list back in scan order, staying on the current image"""
+        if self.order == "scan":
+            return
+        
+        current_image_path = self.cursor.current
+        images = self.cursor.images
+        ordered = [image_path for image_path in self._scan_order if image_path in images]
+        # Images added by a refresh since the list was reordered
+        kept = set(ordered)
+        ordered.extend(image_path for image_path in images if image_path not in kept)
+        
+        self.order = "scan"
+        self._scan_order = None
+        self.cursor = NavigationCursor(ordered)
+        if current_image_path is not None:
+            self.cursor.seek(current_image_path)
+    
+    def review_duplicates(self, groups):
+        """Point the cursor at the images of the duplicate groups, one group after another.
+        
+        Deletions and undos made while reviewing also apply to the full list, which
+        end_review() brings back.
+        """
+        if not self.reviewing:
+            self._browse_cursor = self.cursor
+        self.duplicate_groups = groups
+        self._group_of = {image_path: number for number, group in enumerate(groups) for image_path in group}
+        self.cursor = NavigationCursor([image_path for group in groups for image_path in group])
+    
+    def end_review(self):
+        """Go back to the full list, on the image that was being reviewed when it still exists"""
+        if not self.reviewing:
+            return
+        
+        current_image_path = self.cursor.current
+        self.cursor, self._browse_cursor = self._browse_cursor, None
+        self.duplicate_groups = []
+        self._group_of = {}
+        if current_image_path in self.cursor.images:
+            self.cursor.seek(current_image_path)
+    
+    def duplicate_group(self, image_path):
+        """Return (group number, group count) of an image under review, or None"""
+        number = self._group_of.get(image_path)
+        if number is None:
+            return None
+        return number, len(self.duplicate_groups)
+    
+    def preview(self, image_path, box, rotation=0):
+        """Return the preview of an image fitted to box, decoding it on a cache miss"""
+        image = self.cached_preview(image_path, box, rotation)
+        if image is None:
+            level = level_box(box)
+            with tracer.span("decode preview"):
+                key = file_key(image_path)
+                image = self.load(image_path, level, rotation)
+            if image is not None:
+                self.cache.put(image_path, level, image, rotation, key[1:] if key else None)
+                image = fit_preview(image, box)
+        return image
+    
+    def cached_preview(self, image_path, box, rotation=0):
+        """Return the preview from the in-memory cache without decoding, or None.
+        
+        Previews are cached for the pyramid level of the box and scaled down to the
+        box here; a larger level left by a bigger window is used the same way. A
+        rotated preview missing from the cache is derived from the unrotated one
+        when that is cached, so rotating never goes back to the file.
+        """
+        with tracer.span("cached preview"):
+            level = level_box(box)
+            image = self.cache.get(image_path, level, rotation)
+            if image is None and rotation % 360 != 0:
+                upright = self.cache.get(image_path, level)
+                if upright is not None:
+                    image = rotate_preview(upright, level, rotation)
+                    self.cache.put(image_path, level, image, rotation)
+            if image is None:
+                image = self._nearest_level(image_path, level, rotation)
+            return None if image is None else fit_preview(image, box)
+    
+    def rerender_preview(self, image_path, box, rotation=0):
+        """Return the preview refitted to box from whichever level is in memory, or None.
+        
+        Meant for a resized window: the file is never read. When only smaller levels
+        are cached the largest is scaled up, softer until the image is decoded again.
+        """
+        with tracer.span("rerender preview"):
+            image = self._nearest_level(image_path, level_box(box), rotation, smaller=True)
+            return None if image is None else fit_preview(image, box)
+    
+    def quick_preview(self, image_path, box, rotation=0):
+        """Return a fast low-quality preview (EXIF thumbnail or bilinear draft), or None"""
+        with tracer.span("quick preview"):
+            return load_quick_preview(image_path, box, rotation)
+    
+    def placeholder(self, image_path, box):
+        """Return a card naming the file's format, to show in place of a preview that can't be decoded"""
+        return placeholder_preview(image_path, box)
+    
+    def request_preview(self, image_path, box, rotation=0):
+        """Queue a preview ahead of every preload and return a Future resolved with it.
+        
+        The Future's result is None if the image can't be decoded. Requesting another
+        preview cancels the Futures of earlier requests and demotes them to ordinary
+        preloads. The request is scheduled by the next preload() call, which the
+        caller makes once it knows the box to preload around.
+        """
+        future = Future()
+        image = self.cached_preview(image_path, box, rotation)
+        if image is not None:
+            future.set_result(image)
+            return future
+        
+        level = level_box(box)
+        key = self.cache.key(image_path, level, rotation)
+        with self._requests_lock:
+            for earlier_key in [earlier_key for earlier_key in self._requests if earlier_key != key]:
+                for earlier, _ in self._requests.pop(earlier_key):
+                    earlier.cancel()
+            # Each request is resolved with the level fitted to its own box
+            self._requests.setdefault(key, []).append((future, tuple(box)))
+        self._requested = (image_path, level, rotation)
+        return future
+    
+    def request_thumbnails(self, image_paths, box):
+        """Queue the thumbnails of images not in memory, in the given order, and return {image_path: Future}.
+        
+        Thumbnails are decoded for the pyramid level of box, in the original
+        orientation, on the same worker pool as the preloads; the call replaces the
+        decode queue like preload() does. Images already cached at that level or a
+        larger one are left out, cached_preview() returns them. Each Future is
+        resolved with the thumbnail fitted to box in the image's rotation, or None if
+        it can't be decoded; Futures of earlier requests for images left out are
+        cancelled.
+        """
+        self._ensure_scheduler()
+        level = level_box(box)
+        futures = {}
+        jobs = []
+        with self._requests_lock:
+            if self._requested is not None and self.cache.key(*self._requested) in self._requests:
+                jobs.append((-1, *self._requested))
+            
+            earlier_requests, self._thumbnail_requests = self._thumbnail_requests, {}
+            for priority, image_path in enumerate(image_paths):
+                if self.cache.nearest(image_path, level) is not None:
+                    continue
+                key = self.cache.key(image_path, level)
+                request = (Future(), tuple(box), self.rotation(image_path))
+                earlier = earlier_requests.pop(key, None)
+                if earlier is not None and earlier[1:] == request[1:]:
+                    request = earlier
+                elif earlier is not None:
+                    earlier[0].cancel()
+                self._thumbnail_requests[key] = request
+                futures[image_path] = request[0]
+                jobs.append((priority, image_path, level, 0))
+            for earlier, _, _ in earlier_requests.values():
+                earlier.cancel()
+        
+        with tracer.span("schedule thumbnails", jobs=len(jobs)):
+            self.scheduler.schedule(jobs)
+        return futures
+    
+    def open_zoom(self, image_path, rotation=0):
+        """Open an image to zoom and pan through and return its TiledImage, or None if it can't be read.
+        
+        The image zoomed before is closed; its tiles stay cached until evicted.
+        """
+        self.close_zoom()
+        try:
+            self.zoomed = TiledImage(image_path, rotation, self.tiles)
+        except Exception:
+            return None
+        return self.zoomed
+    
+    def request_tile(self, factor, column, row):
+        """Decode a tile of the zoomed image on the tile threads and return a Future resolved with it.
+        
+        A cached tile resolves the Future at once. The result is None when the tile
+        can't be decoded or the image was closed meanwhile. Cancelling the Future of a
+        tile scrolled out of view before it starts drops it.
+        """
+        zoomed = self.zoomed
+        future = Future()
+        image = zoomed.cached_tile(factor, column, row) if zoomed is not None else None
+        if image is not None or zoomed is None:
+            future.set_result(image)
+            return future
+        
+        if self._tile_pool is None:
+            self._tile_pool = ThreadPoolExecutor(max_workers=self.TILE_WORKERS, thread_name_prefix="tiles")
+        return self._tile_pool.submit(self._decode_tile, zoomed, factor, column, row)
+    
+    def close_zoom(self):
+        """Release the zoomed image"""
+        zoomed, self.zoomed = self.zoomed, None
+        if zoomed is not None:
+            zoomed.close()
+    
+    def play(self, image_path, box, rotation=0):
+        """Start decoding the frames of an animated image fitted to box and return its AnimationStream.
+        
+        Returns None for files whose format can't hold an animation. Whether the file
+        is actually animated is found by the stream's worker; the animation played
+        before is stopped.
+        """
+        self.stop_playback()
+        if not may_be_animated(image_path):
+            return None
+        self.animation = AnimationStream(image_path, box, rotation).start()
+        return self.animation
+    
+    def stop_playback(self):
+        """Stop the animation being played, if any"""
+        animation, self.animation = self.animation, None
+        if animation is not None:
+            animation.stop()
+    
+    def load(self, image_path, box, rotation=0):
+        """Load a preview from the persistent store, decoding and storing it on a miss"""
+        if self.store is None or rotation != 0:
+            return load_preview(image_path, box, rotation)
+        
+        image = self.store.get(image_path, box)
+        if image is None:
+            image = load_preview(image_path, box)
+            if image is not None:
+                self.store.put(image_path, box, image)
+        return image
+    
+    def details(self, image_path):
+        """Return the one-line description of an image.
+        
+        With a metadata index this is a lookup; the file is only read when the
+        background indexing has not reached it yet.
+        """
+        with tracer.span("details"):
+            if self.metadata is None:
+                return get_file_details(image_path)
+            
+            metadata = self.metadata.get(image_path)
+            if metadata is None:
+                metadata = read_metadata(image_path)
+                if metadata is None:
+                    return "Error retrieving file details"
+                self.metadata.put(metadata)
+            return format_details(metadata)
+    
+    def delete_current(self):
+        """Remove the current image from the list and queue it for the trash. Returns its path
+        
+        The move itself happens on the trash queue's worker; failures are reported
+        by take_trash_failures().
+        """
+        image_path = self.cursor.current
+        if image_path is None:
+            return None
+        
+        self.trash.enqueue(image_path, self.cursor.index)
+        self.cursor.remove_current()
+        if self.reviewing:
+            self._browse_cursor.images.discard(image_path)
+        self.cache.discard(image_path)
+        if self.store is not None:
+            self.store.discard(image_path)
+        return image_path
+    
+    def delete_images(self, image_paths):
+        """Remove images from the list and queue them all for the trash at once. Returns the paths removed.
+        
+        The trash queue moves them in one batch per directory. Each of them is
+        brought back on its own by undo_delete(), the last one first. The cursor
+        stays on its image, or lands on the one that followed it if it was removed.
+        """
+        current_image_path = self.cursor.current
+        removed = []
+        for image_path in image_paths:
+            if image_path not in self.cursor.images:
+                continue
+            # Queued with its index once the ones before it are gone, so undoing in reverse puts each back in place
+            self.trash.enqueue(image_path, self.cursor.images.index(image_path))
+            self.cursor.images.discard(image_path)
+            if self.reviewing:
+                self._browse_cursor.images.discard(image_path)
+            self.cache.discard(image_path)
+            if self.store is not None:
+                self.store.discard(image_path)
+            removed.append(image_path)
+        
+        if current_image_path in removed:
+            self.cursor.move_to(self.cursor.images.position(current_image_path))
+        elif current_image_path is not None:
+            self.cursor.seek(current_image_path)
+        return removed
+    
+    def undo_delete(self):
+        """Undo the latest deletion without waiting for it. Returns its TrashOperation, or None when there is nothing to undo.
+        
+        A file already in the trash is moved back on the trash queue's worker. Once the
+        operation's restore Future is done, finish_undo() puts the image back in the list.
+        """
+        return self.trash.undo()
+    
+    def finish_undo(self, operation):
+        """Put the image of an undone deletion back at its original position. Returns its path.
+        
+        Raises RestoreError if the file couldn't be brought back from the trash.
+        """
+        operation.restore.result()
+        self._reinsert(operation)
+        return operation.path
+    
+    def take_trash_failures(self):
+        """Put back in the list the images the trash queue failed to move. Returns the failed operations"""
+        failures = self.trash.take_failures()
+        current_image_path = self.cursor.current
+        for operation in failures:
+            self._reinsert(operation)
+        if current_image_path is not None and failures:
+            self.cursor.seek(current_image_path)
+        return failures
+    
+    def _reinsert(self, operation):
+        if self.reviewing:
+            # Back at its place in the full list (its slot there is still known)
+            self._browse_cursor.images.append(operation.path)
+            if operation.path not in self._group_of:
+                return
+        if operation.path in self.cursor.images:
+            self.cursor.seek(operation.path)
+        else:
+            index = operation.index if operation.index is not None else len(self.cursor)
+            self.cursor.insert(index, operation.path)
+    
+    def preload(self, box):
+        """Queue the images around the cursor for decoding on the worker pool.
+        
+        Previews are decoded for the pyramid level of the box; images already cached
+        at that level or a larger one are skipped. Jobs are ordered by distance from
+        the cursor, the next image first and then alternating behind and ahead. Each
+        call replaces the previous queue, so images the user has already moved away
+        from are never decoded. Previews far from the cursor are not dropped here; the
+        cache evicts the least recently used ones once its memory budget is reached.
+        """
+        self._ensure_scheduler()
+        level = level_box(box)
+        jobs = []
+        with self._requests_lock:
+            if self._requested is not None and self.cache.key(*self._requested) in self._requests:
+                jobs.append((-1, *self._requested))
+        
+        start_index = max(0, self.cursor.index - self.PRELOAD_BEHIND)
+        image_paths = self.cursor.window(self.PRELOAD_BEHIND, self.PRELOAD_AHEAD)
+        for index, image_path in enumerate(image_paths, start_index):
+            # Only preload original orientation to avoid excessive memory usage
+            if self.cache.nearest(image_path, level) is not None:
+                continue
+            distance = index - self.cursor.index
+            priority = 2 * distance - 1 if distance > 0 else -2 * distance
+            jobs.append((priority, image_path, level, 0))
+        
+        with tracer.span("schedule preload", jobs=len(jobs)):
+            self.scheduler.schedule(jobs)
+    
+    def _ensure_scheduler(self):
+        if self.scheduler is None:
+            self.scheduler = DecodeScheduler(
+                self._preloaded,
+                store_path=self.store.path if self.store is not None else None
+            )
+    
+    def close(self):
+        """Save the session, stop background work, finish pending deletions and release the persistent stores"""
+        try:
+            self.save_session(wait=True)
+        except Exception:
+            pass
+        self.cancel_scan()
+        self._stop_watching()
+        self.trash.close()
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+            self.scheduler = None
+        if self._tile_pool is not None:
+            self._tile_pool.shutdown(wait=False, cancel_futures=True)
+            self._tile_pool = None
+        self.close_zoom()
+        self.stop_playback()
+        if self.store is not None:
+            self.store.close()
+        if self.metadata is not None:
+            self.metadata.close()
+        if self.hashes is not None:
+            self.hashes.close()
+        if self.quality is not None:
+            self.quality.close()
+        if self.sessions is not None:
+            self.sessions.close()
+    
+    def _reset(self, directory, recursive):
+        """Drop the current session before opening a new one"""
+        self.cancel_scan()
+        self._stop_watching()
+        self.directory = os.path.abspath(directory)
+        self.recursive = recursive
+        self.cursor = NavigationCursor()
+        self._browse_cursor = None
+        self.duplicate_groups = []
+        self._group_of = {}
+        self.order = "scan"
+        self._scan_order = None
+        self.snapshot = None
+        self.validation = None
+        self._saved_snapshot = None
+        self.rotations = {}
+        with self._requests_lock:
+            self._thumbnail_requests = {}
+        self.cache.clear()
+        self.close_zoom()
+        self.tiles.clear()
+        self.stop_playback()
+        if self.metadata is not None:
+            self.metadata.cancel()
+    
+    def _scan_finished(self, scanner):
+        """Keep the snapshot of a complete scan and start watching the tree for changes"""
+        self.snapshot = scanner.snapshot
+        self._start_watching()
+    
+    def _start_watching(self):
+        self._stop_watching()
+        self.watcher = TreeWatcher(self.directory, self.recursive)
+        if not self.watcher.start():
+            self.watcher = None
+    
+    def _rescan(self, snapshot, changed_directories=None):
+        """List the tree again, only the directories changed since snapshot if there is one.
+        
+        Blocking, and touches no session state, so it may run on a background thread.
+        Returns the finished scanner.
+        """
+        scanner = DirectoryScanner(self.directory, self.recursive, previous=snapshot, changed=changed_directories).start()
+        for _ in scanner:
+            pass
+        scanner.raise_for_error()
+        return scanner
+    
+    def _apply_rescan(self, scanner, changed_files=None):
+        """Bring the list up to date with a finished _rescan() and return the TreeChanges"""
+        if scanner.previous is None:
+            # No complete scan to diff against: compare the full rescan with the list
+            images = list(scanner.snapshot.image_paths())
+            known = set(self.cursor.images)
+            found = set(images)
+            added = [image_path for image_path in images if image_path not in known]
+            removed = [image_path for image_path in self.cursor.images if image_path not in found]
+        else:
+            added, removed = scanner.previous.diff(scanner.snapshot)
+        
+        self.snapshot = scanner.snapshot
+        if self.reviewing:
+            # New images belong to the full list; removed ones leave both
+            self._browse_cursor.apply_changes(added, removed)
+            self.cursor.apply_changes([], removed)
+        else:
+            self.cursor.apply_changes(added, removed)
+        for image_path in removed:
+            self.cache.discard(image_path)
+        modified = self._evict_modified(changed_files)
+        
+        # Without a watcher any file may have changed; the index only re-reads those whose mtime did
+        images = self._browse_cursor.images if self.reviewing else self.cursor.images
+        if changed_files is None:
+            self._index_metadata(images)
+        else:
+            self._index_metadata([*added, *removed, *(path for path in changed_files if path in images)])
+        return TreeChanges(added, removed, modified)
+    
+    def _set_task_progress(self, done, total):
+        self.task_progress = (done, total)
+    
+    def _in_background(self, function, *args):
+        """Run function(*args) on a new daemon thread. Returns a Future of its result"""
+        future = Future()
+        
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=run, name=function.__name__, daemon=True).start()
+        return future
+    
+    def _index_metadata(self, image_paths):
+        if self.metadata is not None:
+            self.metadata.submit(image_paths)
+    
+    def _stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+    
+    def _evict_modified(self, changed_files=None):
+        """Drop the cached previews of files changed since they were decoded. Returns their paths
+        
+        Only cached images are checked, and only those among changed_files when given.
+        """
+        modified = []
+        for image_path, identity in self.cache.identities().items():
+            if changed_files is not None and image_path not in changed_files:
+                continue
+            key = file_key(image_path)
+            if key is None or key[1:] != identity:
+                self.cache.discard(image_path)
+                modified.append(image_path)
+        return modified
+    
+    def _nearest_level(self, image_path, level, rotation, smaller=False):
+        """Return the cached preview of the level nearest to level, rotated if needed but not refitted, or None"""
+        found = self.cache.nearest(image_path, level, rotation, smaller)
+        if found is not None:
+            return found[1]
+        if rotation % 360 != 0:
+            found = self.cache.nearest(image_path, level, 0, smaller)
+            if found is not None:
+                found_level, upright = found
+                return rotate_preview(upright, found_level, rotation)
+        return None
+    
+    @staticmethod
+    def _decode_tile(zoomed, factor, column, row):
+        """Decode one tile on a tile thread. Returns None on failure"""
+        with tracer.span("tile", "decode", factor=factor, column=column, row=row):
+            try:
+                return zoomed.decode_tile(factor, column, row)
+            except Exception:
+                return None
+    
+    def _preloaded(self, image_path, box, rotation, image, key, encoded):
+        """Store a preview decoded by the worker pool and resolve the requests waiting for it"""
+        with self._requests_lock:
+            futures = self._requests.pop(self.cache.key(image_path, box, rotation), [])
+            thumbnail = self._thumbnail_requests.pop(self.cache.key(image_path, box, rotation), None)
+        # Futures may be cancelled by a newer request or the viewer at any time: claiming one first
+        # makes it uncancellable, and a cancelled one is skipped instead of raising InvalidStateError
+        for future, requested_box in futures:
+            if future.set_running_or_notify_cancel():
+                future.set_result(None if image is None else fit_preview(image, requested_box))
+        if thumbnail is not None and not thumbnail[0].set_running_or_notify_cancel():
+            thumbnail = None
+        
+        if image is None:
+            if thumbnail is not None:
+                thumbnail[0].set_result(None)
+            return
+        
+        with tracer.span("store preview", "decode"):
+            self.cache.put(image_path, box, image, rotation, key[1:])
+            if self.store is not None:
+                if encoded is not None:
+                    self.store.put_many([(key, box, encoded)])
+                else:
+                    self.store.touch(key, box)
+        if thumbnail is not None:
+            future, requested_box, requested_rotation = thumbnail
+            future.set_result(self.cached_preview(image_path, requested_box, requested_rotation))
@@ -0,0 +1,103 @@
+from .sequence import ImageSequence
+
+
+class NavigationCursor:
+    """Current position within an ordered list of image paths.
+    
+    The list is an ImageSequence, so looking up, removing and reinserting a path
+    take O(log n) however long the list is.
+    """
+    def __init__(self, images=None, index=0):
+        self.images = ImageSequence(images or ())
+        self.index = index if self.images else 0
+    
+    def __len__(self):
+        return len(self.images)
+    
+    def __bool__(self):
+        return bool(self.images)
+    
+    @property
+    def current(self):
+        """Path of the current image, or None when the list is empty"""
+        if not self.images:
+            return None
+        return self.images[self.index]
+    
+    @property
+    def has_previous(self):
+        return bool(self.images) and self.index > 0
+    
+    @property
+    def has_next(self):
+        return bool(self.images) and self.index < len(self.images) - 1
+    
+    def move_previous(self):
+        """Step back one image and return its path, or None at the start of the list"""
+        if not self.has_previous:
+            return None
+        self.index -= 1
+        return self.current
+    
+    def move_next(self):
+        """Step forward one image and return its path, or None at the end of the list"""
+        if not self.has_next:
+            return None
+        self.index += 1
+        return self.current
+    
+    def move_to(self, index):
+        """Move to the image at index (clamped to the list) and return its path, or None when the list is empty"""
+        self.index = min(max(index, 0), max(len(self.images) - 1, 0))
+        return self.current
+    
+    def seek(self, image_path):
+        """Move to image_path and return its index. Raises ValueError if it is not in the list"""
+        self.index = self.images.index(image_path)
+        return self.index
+    
+    def remove_current(self):
+        """Remove the current image from the list and return its path"""
+        if not self.images:
+            return None
+        
+        removed = self.images.pop(self.index)
+        if self.index >= len(self.images):
+            self.index = max(len(self.images) - 1, 0)
+        return removed
+    
+    def insert(self, index, image_path):
+        """Insert an image at index (clamped to the list) and move the cursor onto it.
+        
+        An image removed earlier comes back at its original place in the list.
+        """
+        self.index = self.images.insert(index, image_path)
+        return self.index
+    
+    def apply_changes(self, added, removed):
+        """Drop removed paths and append added ones, keeping the cursor on the same image.
+        
+        If the current image was removed the cursor lands on the image that followed it.
+        """
+        current_image_path = self.current
+        for image_path in removed:
+            self.images.discard(image_path)
+        # Images put back by an undo are already in the list
+        self.images.extend(added)
+        
+        if current_image_path is None:
+            self.index = 0
+        elif current_image_path in self.images:
+            self.index = self.images.index(current_image_path)
+        else:
+            try:
+                self.index = self.images.position(current_image_path)
+            except ValueError:
+                # Forgotten when the list was compacted
+                self.index = min(self.index, len(self.images))
+            self.index = min(self.index, max(len(self.images) - 1, 0))
+    
+    def window(self, before, after):
+        """Return the paths from `before` images behind the cursor to `after` images ahead of it"""
+        start_index = max(0, self.index - before)
+        return list(self.images.iter_from(start_index, self.index + after + 1 - start_index))
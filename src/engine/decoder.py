@@ -0,0 +1,274 @@
+import io
+import os
+import re
+from xml.etree import ElementTree
+from PIL import ExifTags, Image, ImageDraw, ImageFont
+
+from .formats import format_cache
+
+
+def preview_box(area_width, area_height):
+    """Return the (max_width, max_height) box available for a preview in a display area"""
+    return max(area_width - 40, 300), max(area_height - 130, 200)
+
+
+# Preview box of the viewer at its minimum window size (800x500 display area)
+DEFAULT_PREVIEW_BOX = preview_box(800, 500)
+
+
+def fit_size(width, height, max_width, max_height):
+    """Return the size that fits width x height into the box while keeping the aspect ratio"""
+    aspect_ratio = width / height
+    
+    if aspect_ratio > max_width / max_height:
+        new_width = max_width
+        new_height = int(max_width / aspect_ratio)
+    else:
+        new_height = max_height
+        new_width = int(max_height * aspect_ratio)
+    
+    return max(new_width, 100), max(new_height, 100)
+
+
+# Edges of the preview pyramid levels, a quarter octave apart from 256 to 4096 pixels
+PREVIEW_LEVELS = tuple(round(256 * 2 ** (step / 4)) for step in range(17))
+
+
+def level_box(box):
+    """Return the pyramid level of a preview box: each side rounded up to the next level edge.
+    
+    Previews are decoded and cached for the level rather than the exact box, so a
+    window resized within a quarter octave reuses them, and a larger level only needs
+    to be scaled down by fit_preview() at display time.
+    """
+    return tuple(next((edge for edge in PREVIEW_LEVELS if edge >= side), side) for side in box)
+
+
+def fit_preview(preview, box):
+    """Resample a preview made for a pyramid level to the size it has in box"""
+    target_size = fit_size(preview.width, preview.height, *box)
+    if target_size == preview.size:
+        return preview
+    return preview.resize(target_size, Image.Resampling.BILINEAR)
+
+
+# Quarter turns applied with a lossless transpose after the preview has been resized
+ROTATIONS = {
+    90: Image.Transpose.ROTATE_270,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_90,
+}
+
+
+# Files of formats without a reduced decode path are only used for a quick preview up to this size
+QUICK_PREVIEW_MAX_BYTES = 4 * 1024 * 1024
+
+
+def rotated_target_size(size, box, rotation):
+    """Return the size to resize an image to so that, once rotated, it fits the box"""
+    quarter_turn = rotation % 180 == 90
+    width, height = (size[1], size[0]) if quarter_turn else size
+    new_width, new_height = fit_size(width, height, *box)
+    return (new_height, new_width) if quarter_turn else (new_width, new_height)
+
+
+def rotate_preview(preview, box, rotation):
+    """Rotate an already resized preview and refit it into the box, without touching the file.
+    
+    A quarter turn swaps the axes, so the turned bitmap is resized again to fit the box;
+    this works on display-sized data only.
+    """
+    rotation %= 360
+    if rotation not in ROTATIONS:
+        return preview
+    
+    rotated = preview.transpose(ROTATIONS[rotation])
+    target_size = fit_size(rotated.width, rotated.height, *box)
+    if target_size != rotated.size:
+        rotated = rotated.resize(target_size, Image.Resampling.LANCZOS)
+    return rotated
+
+
+def load_embedded_thumbnail(image):
+    """Return the thumbnail stored in the EXIF data of an opened image, or None"""
+    exif_data = image.info.get("exif")
+    if not exif_data:
+        return None
+    
+    # IFD1 points at a JPEG thumbnail, with offsets relative to the TIFF header
+    thumbnail_ifd = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+    offset = thumbnail_ifd.get(0x0201)  # JPEGInterchangeFormat
+    length = thumbnail_ifd.get(0x0202)  # JPEGInterchangeFormatLength
+    if not offset or not length:
+        return None
+    
+    if exif_data.startswith(b"Exif\x00\x00"):
+        offset += 6
+    thumbnail = Image.open(io.BytesIO(exif_data[offset:offset + length]))
+    thumbnail.load()
+    return thumbnail
+
+
+# Photoshop image resource holding a JPEG thumbnail, after a 28-byte header
+PSD_THUMBNAIL_RESOURCE = 1036
+
+
+def load_psd_thumbnail(image):
+    """Return the thumbnail stored in the image resources of an opened PSD, or None"""
+    for resource_id, _, data in getattr(image, "resources", ()):
+        if resource_id == PSD_THUMBNAIL_RESOURCE and len(data) > 28:
+            thumbnail = Image.open(io.BytesIO(data[28:]))
+            thumbnail.load()
+            return thumbnail
+    return None
+
+
+def svg_length(value):
+    """Return an SVG width or height attribute in pixels, or None when it is missing or relative"""
+    match = re.fullmatch(r"\s*([0-9.]+)\s*(px)?\s*", value or "")
+    return float(match.group(1)) if match else None
+
+
+def svg_size(image_path):
+    """Return the intrinsic (width, height) of an SVG from its root element, or None"""
+    for _, element in ElementTree.iterparse(image_path, events=("start",)):
+        width, height = svg_length(element.get("width")), svg_length(element.get("height"))
+        view_box = element.get("viewBox")
+        if (not width or not height) and view_box:
+            _, _, width, height = (float(value) for value in view_box.replace(",", " ").split())
+        return (width, height) if width and height else None
+    return None
+
+
+def load_svg_preview(image_path, box, rotation=0):
+    """Rasterize an SVG directly at the size it has in box. Needs cairosvg; returns None without it"""
+    try:
+        import cairosvg
+    except ImportError:
+        return None
+    
+    try:
+        size = svg_size(image_path)
+        if size is None:
+            return None
+        width, height = rotated_target_size(size, box, rotation)
+        image = Image.open(io.BytesIO(cairosvg.svg2png(url=image_path, output_width=width, output_height=height)))
+        image.load()
+        if rotation % 360 in ROTATIONS:
+            image = image.transpose(ROTATIONS[rotation % 360])
+        return image
+    except Exception:
+        return None
+
+
+# Preview loaders replacing Pillow's for some formats, by format as sniffed from the first bytes of a file
+DECODERS = {}
+
+
+def register_decoder(format_name, load):
+    """Decode the previews of a format with load(image_path, box, rotation), returning a preview or None.
+    
+    Registered in the process using load_preview, which is every worker of the
+    decode pool on platforms that fork.
+    """
+    DECODERS[format_name] = load
+
+
+register_decoder("SVG", load_svg_preview)
+
+
+def placeholder_preview(image_path, box):
+    """Return a plain card naming the format of a file, shown when it can't be previewed"""
+    format_name = format_cache.classify(image_path) or os.path.splitext(image_path)[1].lstrip(".").upper() or "this"
+    width, height = fit_size(4, 3, *box)
+    card = Image.new("RGB", (width, height), (40, 40, 40))
+    draw = ImageDraw.Draw(card)
+    text = f"No preview for {format_name} file"
+    try:
+        font = ImageFont.load_default(size=max(12, height // 20))
+    except TypeError:
+        # Pillow before 10.1 only has the small bitmap font
+        font = ImageFont.load_default()
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    draw.text(((width - right - left) / 2, (height - bottom - top) / 2), text, fill=(170, 170, 170), font=font)
+    return card
+
+
+def load_quick_preview(image_path, box, rotation=0):
+    """Return a fast, low-quality preview to paint while load_preview runs, or None.
+    
+    The EXIF thumbnail, or the thumbnail of a PSD, is used when the file has one. Formats
+    with a registered decoder have no quick preview. Otherwise JPEGs are decoded
+    at 1/8 scale, and files of other formats are decoded whole only when they are
+    small. In every case the final resize is BILINEAR.
+    """
+    if format_cache.classify(image_path) in DECODERS:
+        return None
+    
+    try:
+        image = Image.open(image_path)
+        rotation %= 360
+        target_size = rotated_target_size(image.size, box, rotation)
+        
+        source = None
+        try:
+            source = load_psd_thumbnail(image) if image.format == "PSD" else load_embedded_thumbnail(image)
+        except Exception:
+            source = None
+        
+        if source is None:
+            if image.format == "JPEG":
+                # Requesting a tiny size selects the smallest DCT scale
+                image.draft(image.mode, (1, 1))
+            elif os.path.getsize(image_path) > QUICK_PREVIEW_MAX_BYTES:
+                return None
+            source = image
+        
+        preview = source.resize(target_size, Image.Resampling.BILINEAR)
+        if rotation in ROTATIONS:
+            preview = preview.transpose(ROTATIONS[rotation])
+        return preview
+    except Exception:
+        return None
+
+
+def load_preview(image_path, box, rotation=0):
+    """Load an image at a reduced resolution, resize it to fit the box and apply the rotation.
+    
+    The full-resolution bitmap is never decoded when it can be avoided: JPEGs are
+    decoded directly at a smaller DCT scale with Image.draft, and other formats are
+    shrunk by an integer factor with reduce() (through reducing_gap) before the
+    final LANCZOS step, which then only works on an image at most a few times
+    larger than the preview. Formats with a registered decoder, recognized from the
+    first bytes of the file rather than its extension, use that decoder instead.
+    
+    Args:
+        image_path (str): Path of the image file
+        box (tuple): (max_width, max_height) the preview must fit in
+        rotation (int): Clockwise rotation in degrees (0, 90, 180, 270)
+        
+    Returns:
+        PIL.Image.Image: The resized preview, or None if the image can't be loaded
+    """
+    load = DECODERS.get(format_cache.classify(image_path))
+    if load is not None:
+        return load(image_path, box, rotation)
+    
+    try:
+        image = Image.open(image_path)
+        rotation %= 360
+        
+        # Fit the rotated image into the box, then work out the size before rotating
+        target_size = rotated_target_size(image.size, box, rotation)
+        
+        # JPEG: let the decoder scale by 1/2, 1/4 or 1/8 while decoding
+        if image.format == "JPEG":
+            image.draft(image.mode, target_size)
+        
+        image = image.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        
+        if rotation in ROTATIONS:
+            image = image.transpose(ROTATIONS[rotation])
+        return image
+    except Exception:
+        return None
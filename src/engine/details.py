@@ -0,0 +1,46 @@
+import os
+from datetime import datetime
+
+from .metadata import read_metadata
+from .scanner import is_image_file
+
+
+def format_size(size_bytes):
+    """Return a human readable file size"""
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    elif size_bytes < 1024 * 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.1f} MB"
+    else:
+        return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
+
+
+def format_details(metadata):
+    """Return the one-line description of an image from its ImageMetadata"""
+    filename = os.path.basename(metadata.path)
+    name_without_ext, ext = os.path.splitext(filename)
+    format_type = ext.upper().lstrip('.')
+    
+    size_str = format_size(metadata.size)
+    
+    resolution_str = "N/A"
+    if metadata.width is not None and is_image_file(metadata.path):
+        resolution_str = f"{metadata.width}×{metadata.height}"
+    
+    creation_str = datetime.fromtimestamp(metadata.ctime).strftime("%Y-%m-%d %H:%M")
+    modification_str = datetime.fromtimestamp(metadata.mtime_ns / 1e9).strftime("%Y-%m-%d %H:%M")
+    
+    return f"{name_without_ext} • {format_type} • {size_str} • {resolution_str} • Created: {creation_str} • Modified: {modification_str}"
+
+
+def get_file_details(file_path):
+    """Get file details including format, size, resolution, creation and modification dates.
+    
+    Reads the file header; Engine.details() looks the same data up in the metadata index instead.
+    """
+    metadata = read_metadata(file_path)
+    if metadata is None:
+        return "Error retrieving file details"
+    return format_details(metadata)
@@ -0,0 +1,40 @@
+import queue
+import threading
+
+
+class CallQueue:
+    """Calls posted from any thread and run in order by the one thread that drains the queue.
+    
+    Background threads (decode callbacks, scans, deletions) must never touch Tk.
+    Instead they post a call here with plain data, such as a decoded PIL image, and
+    the viewer drains the queue from its event loop with after(), so every widget
+    update and every ImageTk.PhotoImage is created on the Tk thread.
+    
+    Args:
+        owner (threading.Thread): Thread allowed to drain, by default the one creating the queue
+    """
+    def __init__(self, owner=None):
+        self.owner = owner or threading.current_thread()
+        self._calls = queue.SimpleQueue()
+    
+    def post(self, function, *args):
+        """Queue function(*args) to run on the owner thread. Safe from any thread"""
+        self._calls.put((function, args))
+    
+    def drain(self, limit=None):
+        """Run the queued calls in order, at most limit of them. Returns how many ran.
+        
+        Raises:
+            RuntimeError: When called from a thread other than the owner
+        """
+        if threading.current_thread() is not self.owner:
+            raise RuntimeError("CallQueue drained outside its owner thread")
+        count = 0
+        while limit is None or count < limit:
+            try:
+                function, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+            function(*args)
+        return count
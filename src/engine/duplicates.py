@@ -0,0 +1,236 @@
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+
+from .batch import FileResultStore, process_files
+from .store import file_key
+
+
+# 64-bit average, difference and DCT perceptual hashes of an image
+ImageHashes = namedtuple("ImageHashes", ["ahash", "dhash", "phash"])
+
+
+# Orthonormal DCT-II basis for the 32x32 pHash input: coefficients = C @ pixels @ C.T
+_DCT_SIZE = 32
+_DCT_MATRIX = np.sqrt(2 / _DCT_SIZE) * np.cos(
+    np.pi * np.outer(np.arange(_DCT_SIZE), 2 * np.arange(_DCT_SIZE) + 1) / (2 * _DCT_SIZE)
+)
+_DCT_MATRIX[0] /= np.sqrt(2)
+
+
+def _pack_bits(bits):
+    """Pack 64 booleans into an int, first bit most significant"""
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def compute_hashes(image):
+    """Return the ImageHashes of an opened image.
+    
+    Everything is computed from one 32x32 grayscale thumbnail: aHash compares 4x4 block
+    means with their average, dHash compares horizontally adjacent pixels of a 9x8
+    shrink, and pHash compares the 8x8 lowest DCT frequencies with their median.
+    """
+    if image.format == "JPEG":
+        # Decode straight to a grayscale bitmap at the smallest DCT scale that still covers 32x32
+        image.draft("L", (_DCT_SIZE * 2, _DCT_SIZE * 2))
+    gray = image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(gray, dtype=np.float64)
+    
+    blocks = pixels.reshape(8, 4, 8, 4).mean(axis=(1, 3))
+    ahash = _pack_bits(blocks > blocks.mean())
+    
+    shrunk = np.asarray(gray.resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+    dhash = _pack_bits(shrunk[:, 1:] > shrunk[:, :-1])
+    
+    low = (_DCT_MATRIX @ pixels @ _DCT_MATRIX.T)[:8, :8]
+    # The DC term is the overall brightness and would dominate the median
+    phash = _pack_bits(low > np.median(low.ravel()[1:]))
+    
+    return ImageHashes(ahash, dhash, phash)
+
+
+def hash_files(image_paths):
+    """Hash a chunk of files in a worker process.
+    
+    Returns:
+        list: (file key, ImageHashes) for every file that could be read, None for the others
+    """
+    results = []
+    for image_path in image_paths:
+        key = file_key(image_path)
+        try:
+            with Image.open(image_path) as image:
+                results.append((key, compute_hashes(image)) if key is not None else None)
+        except Exception:
+            results.append(None)
+    return results
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class HashStore(FileResultStore):
+    """Persistent store of perceptual hashes in a SQLite database.
+    
+    Hashes are keyed by absolute path and are only returned while the file's size
+    and mtime match the ones it was hashed at.
+    
+    Args:
+        path (str): Database file, by default hashes.sqlite3 in the user cache directory
+    """
+    TABLE = "hashes"
+    COLUMNS = ("ahash INTEGER NOT NULL", "dhash INTEGER NOT NULL", "phash INTEGER NOT NULL")
+    DEFAULT_FILENAME = "hashes.sqlite3"
+    
+    def encode(self, result):
+        return tuple(map(_to_signed, result))
+    
+    def decode(self, values):
+        return ImageHashes(*map(_to_unsigned, values))
+
+
+def hash_images(image_paths, store=None, workers=None, progress=None):
+    """Compute the perceptual hashes of many images on a process pool.
+    
+    Hashes already in the store for the file's current size and mtime are reused, and
+    new ones are written back as they arrive, so an interrupted run resumes.
+    
+    Args:
+        image_paths (iterable): Images to hash
+        store (HashStore): Optional persistent store
+        workers (int): Number of hashing processes (default: one per core)
+        progress (callable): Called as progress(done, total) as results arrive
+    
+    Returns:
+        dict: {absolute path: ImageHashes} for every image that could be read
+    """
+    return process_files(image_paths, hash_files, store, workers, progress)
+
+
+def popcount64(values):
+    """Number of set bits of each element of a uint64 array"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _flip_masks(bits, radius):
+    """Every mask of `bits` bits with at most radius bits set"""
+    masks = [0]
+    for count in range(1, radius + 1):
+        for positions in combinations(range(bits), count):
+            masks.append(sum(1 << position for position in positions))
+    return np.array(masks, dtype=np.uint64)
+
+
+def iter_similar_pairs(values, threshold, chunks=4, max_rows=1 << 22):
+    """Yield (left, right) index arrays, left < right, of hashes at most threshold bits apart.
+    
+    Multi-index hashing: the 64-bit hashes are split into `chunks` substrings, and two
+    hashes within threshold bits must be within threshold // chunks bits of each other
+    on at least one substring (pigeonhole). Each substring is bucketed, and only hashes
+    in buckets at most that many flips away are compared, instead of all n^2 pairs.
+    
+    The hashes are compared a slice at a time, each expanded into at most max_rows
+    candidate rows (more only for a single hash whose bucket is larger), so memory
+    stays bounded however many hashes there are. A pair close on several substrings
+    is yielded once for each of them.
+    
+    Args:
+        values (numpy.ndarray): uint64 hashes
+        threshold (int): Maximum Hamming distance
+        chunks (int): Number of substrings; 64 must be a multiple of it
+        max_rows (int): Candidate pairs compared at once
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    count = len(values)
+    bits = 64 // chunks
+    masks = _flip_masks(bits, threshold // chunks)
+    
+    for chunk in range(chunks):
+        keys = ((values >> np.uint64(chunk * bits)) & np.uint64((1 << bits) - 1)).astype(np.int64)
+        order = np.argsort(keys, kind="stable")
+        sizes = np.bincount(keys, minlength=1 << bits)
+        starts = np.cumsum(sizes) - sizes
+        
+        for mask in masks:
+            neighbours = keys ^ int(mask)
+            cumulative = np.cumsum(sizes[neighbours])
+            if cumulative[-1] == 0:
+                continue
+            first = 0
+            while first < count:
+                done = int(cumulative[first - 1]) if first else 0
+                last = max(first + 1, int(np.searchsorted(cumulative, done + max_rows, side="right")))
+                lengths = sizes[neighbours[first:last]]
+                total = int(cumulative[last - 1]) - done
+                if total:
+                    # Expand every hash of the slice into one row per hash in the neighbouring bucket
+                    left = np.repeat(np.arange(first, last), lengths)
+                    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+                    right = order[np.repeat(starts[neighbours[first:last]], lengths) + offsets]
+                    
+                    keep = left < right
+                    left, right = left[keep], right[keep]
+                    keep = popcount64(values[left] ^ values[right]) <= threshold
+                    if keep.any():
+                        yield left[keep], right[keep]
+                first = last
+
+
+def similar_pairs(values, threshold, chunks=4):
+    """Return the (i, j) index pairs, i < j, of hashes at most threshold bits apart.
+    
+    See iter_similar_pairs(); every pair is returned once, so memory grows with their number.
+    
+    Returns:
+        numpy.ndarray: (m, 2) array of index pairs
+    """
+    count = len(values)
+    found = [left * count + right for left, right in iter_similar_pairs(values, threshold, chunks)]
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.unique(np.concatenate(found))
+    return np.stack([pairs // count, pairs % count], axis=1)
+
+
+def find_duplicates(hashes, threshold=8, kind="phash"):
+    """Group near-duplicate images.
+    
+    Args:
+        hashes (dict): {path: ImageHashes}, in the order groups should list their images
+        threshold (int): Maximum Hamming distance between two images of a group
+        kind (str): Hash compared: "ahash", "dhash" or "phash"
+    
+    Returns:
+        list: Groups of two or more paths, each linked by a chain of similar pairs
+    """
+    image_paths = list(hashes)
+    values = np.array([getattr(hashes[image_path], kind) for image_path in image_paths], dtype=np.uint64)
+    
+    # Union-find over the similar pairs
+    parents = list(range(len(image_paths)))
+    
+    def root(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+    
+    for left, right in similar_pairs(values, threshold).tolist():
+        left, right = root(left), root(right)
+        if left != right:
+            parents[max(left, right)] = min(left, right)
+    
+    groups = {}
+    for index, image_path in enumerate(image_paths):
+        groups.setdefault(root(index), []).append(image_path)
+    return [group for group in groups.values() if len(group) > 1]
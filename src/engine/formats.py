@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# Bytes read from the start of a file to recognize its format
+SNIFF_BYTES = 256
+
+# Leading bytes of each format, checked in order
+SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+    (b"8BPS", "PSD"),
+    (b"BM", "BMP"),
+    (b"\x00\x00\x01\x00", "ICO"),
+)
+
+# Extensions files of each format are found under
+FORMAT_EXTENSIONS = {
+    "JPEG": (".jpg", ".jpeg", ".jpe", ".jfif"),
+    "PNG": (".png",),
+    "GIF": (".gif",),
+    "BMP": (".bmp", ".dib"),
+    "TIFF": (".tif", ".tiff"),
+    "WEBP": (".webp",),
+    "ICO": (".ico",),
+    "TGA": (".tga",),
+    "PSD": (".psd",),
+    "SVG": (".svg",),
+}
+
+
+def sniff_format(header):
+    """Return the format the first bytes of a file belong to, or None if they match none"""
+    for signature, format_name in SIGNATURES:
+        if header.startswith(signature):
+            return format_name
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    # SVG is text: an XML declaration, a comment or the root element, then <svg somewhere in the header
+    text = header.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if text.startswith(b"<") and b"<svg" in header:
+        return "SVG"
+    return None
+
+
+def read_format(image_path):
+    """Return the format of a file from its first bytes, or None if it is unknown or can't be read"""
+    try:
+        with open(image_path, "rb") as file:
+            return sniff_format(file.read(SNIFF_BYTES))
+    except OSError:
+        return None
+
+
+class FormatCache:
+    """Formats of files recognized from their first bytes, remembered by path, size and mtime.
+    
+    A file is read at most once while it is unchanged, so rescans and repeated decodes
+    skip the sniffing. The least recently classified files are forgotten beyond
+    max_entries.
+    
+    Args:
+        max_entries (int): Number of files remembered
+    """
+    DEFAULT_MAX_ENTRIES = 100_000
+    
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    
+    def classify(self, image_path):
+        """Return the format of a file, sniffing it unless it is cached and unchanged, or None"""
+        try:
+            stats = os.stat(image_path)
+        except OSError:
+            return None
+        identity = (stats.st_size, stats.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(image_path)
+            if entry is not None and entry[0] == identity:
+                self._entries.move_to_end(image_path)
+                return entry[1]
+        
+        format_name = read_format(image_path)
+        with self._lock:
+            self._entries[image_path] = (identity, format_name)
+            self._entries.move_to_end(image_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return format_name
+    
+    def clear(self):
+        """Forget every file"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Process-wide cache the scanner and the decoders classify files with
+format_cache = FormatCache()
@@ -0,0 +1,218 @@
+import os
+import sqlite3
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+from PIL import ExifTags, Image
+
+from .paths import user_cache_dir
+
+
+# What the index knows about one file; width, height, format and captured are None when unreadable
+ImageMetadata = namedtuple(
+    "ImageMetadata",
+    ["path", "size", "mtime_ns", "ctime", "width", "height", "format", "captured"]
+)
+
+
+def read_capture_time(image):
+    """Return the EXIF capture time of an opened image as a timestamp, or None"""
+    exif = image.getexif()
+    value = exif.get_ifd(ExifTags.IFD.Exif).get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip("\x00 "), "%Y:%m:%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+
+def read_metadata(image_path, stats=None):
+    """Read the metadata of an image from its header, without decoding any pixels.
+    
+    Returns:
+        ImageMetadata: The metadata, or None if the file can't be read at all
+    """
+    try:
+        stats = stats or os.stat(image_path)
+    except OSError:
+        return None
+    
+    width = height = image_format = captured = None
+    try:
+        # Image.open only parses the header; the pixels are decoded on first access
+        with Image.open(image_path) as image:
+            width, height = image.size
+            image_format = image.format
+            try:
+                captured = read_capture_time(image)
+            except Exception:
+                captured = None
+    except Exception:
+        pass
+    
+    return ImageMetadata(
+        os.path.abspath(image_path), stats.st_size, stats.st_mtime_ns, stats.st_ctime,
+        width, height, image_format, captured
+    )
+
+
+class MetadataIndex:
+    """Persistent index of image metadata in a SQLite database, filled in the background.
+    
+    Lookups never touch the file: they return whatever the index holds, which update()
+    keeps current by re-reading the header of every file whose size or mtime changed.
+    update() runs on one background thread so header parsing does not compete with the
+    viewer for the interpreter more than necessary.
+    
+    Args:
+        path (str): Database file, by default metadata.sqlite3 in the user cache directory
+    """
+    BATCH_SIZE = 256
+    
+    def __init__(self, path=None):
+        self.path = path or os.path.join(user_cache_dir(), "metadata.sqlite3")
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, ctime REAL NOT NULL, "
+            "width INTEGER, height INTEGER, format TEXT, captured REAL)"
+        )
+        self._connection.commit()
+        
+        # Batches waiting for the background thread, and whether it is working on one
+        self._pending = deque()
+        self._busy = False
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+    
+    def get(self, image_path):
+        """Return the indexed ImageMetadata of a file, or None if it has not been indexed yet"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM metadata WHERE path=?", (os.path.abspath(image_path),)
+            ).fetchone()
+        return ImageMetadata(*row) if row else None
+    
+    def get_many(self, image_paths):
+        """Return {path: ImageMetadata} for the indexed files among image_paths"""
+        found = {}
+        image_paths = [os.path.abspath(image_path) for image_path in image_paths]
+        with self._lock:
+            # Stay under SQLite's default limit of bound parameters
+            for start in range(0, len(image_paths), 500):
+                chunk = image_paths[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT * FROM metadata WHERE path IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((row[0], ImageMetadata(*row)) for row in rows)
+        return found
+    
+    def query(self, where="1", parameters=()):
+        """Return the ImageMetadata of the indexed files matching an SQL condition on the columns"""
+        with self._lock:
+            rows = self._connection.execute(f"SELECT * FROM metadata WHERE {where}", parameters).fetchall()
+        return [ImageMetadata(*row) for row in rows]
+    
+    def put(self, metadata):
+        """Store the metadata of a file"""
+        self.put_many([metadata])
+    
+    def put_many(self, entries):
+        """Store several ImageMetadata in one transaction"""
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?)", entries)
+            self._connection.commit()
+    
+    def discard(self, image_path):
+        """Forget a file"""
+        with self._lock:
+            self._connection.execute("DELETE FROM metadata WHERE path=?", (os.path.abspath(image_path),))
+            self._connection.commit()
+    
+    def update(self, image_paths):
+        """Index the files that are new or changed since they were indexed. Returns how many were read
+        
+        Each file is stat'ed and its header is only read again when its size or mtime
+        differs from the indexed entry. Files that no longer exist are forgotten.
+        """
+        image_paths = list(image_paths)
+        indexed = self.get_many(image_paths)
+        entries = []
+        missing = []
+        for image_path in image_paths:
+            image_path = os.path.abspath(image_path)
+            try:
+                stats = os.stat(image_path)
+            except OSError:
+                if image_path in indexed:
+                    missing.append((image_path,))
+                continue
+            
+            known = indexed.get(image_path)
+            if known is not None and (known.size, known.mtime_ns) == (stats.st_size, stats.st_mtime_ns):
+                continue
+            entries.append(read_metadata(image_path, stats))
+        
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?)", entries)
+            self._connection.executemany("DELETE FROM metadata WHERE path=?", missing)
+            self._connection.commit()
+        return len(entries)
+    
+    def submit(self, image_paths):
+        """Queue files for update() on the background thread"""
+        image_paths = list(image_paths)
+        if not image_paths:
+            return
+        with self._condition:
+            if self._closed:
+                return
+            for start in range(0, len(image_paths), self.BATCH_SIZE):
+                self._pending.append(image_paths[start:start + self.BATCH_SIZE])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metadata-index", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+    
+    def cancel(self):
+        """Drop the queued files that have not been indexed yet"""
+        with self._condition:
+            self._pending.clear()
+    
+    def wait(self, timeout=None):
+        """Block until the queue is empty. Returns False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+    
+    def close(self):
+        """Stop the background thread and close the database"""
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            self._connection.close()
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                batch = self._pending.popleft()
+                self._busy = True
+            
+            try:
+                self.update(batch)
+            except Exception:
+                pass
@@ -0,0 +1,43 @@
+import os
+import sys
+
+
+APP_NAME = "GalleryCleaner"
+
+
+def user_cache_dir():
+    """Return the per-user cache directory, creating it if needed.
+    
+    Follows the platform convention: %LOCALAPPDATA% on Windows, ~/Library/Caches on macOS
+    and $XDG_CACHE_HOME (default ~/.cache) elsewhere.
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+        path = os.path.join(base, APP_NAME, "Cache")
+    elif sys.platform == "darwin":
+        path = os.path.join(os.path.expanduser("~"), "Library", "Caches", APP_NAME)
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, APP_NAME.lower())
+    
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def user_state_dir():
+    """Return the per-user directory for persistent application state, creating it if needed.
+    
+    %LOCALAPPDATA% on Windows, ~/Library/Application Support on macOS and
+    $XDG_STATE_HOME (default ~/.local/state) elsewhere.
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+        path = os.path.join(base, APP_NAME, "State")
+    elif sys.platform == "darwin":
+        path = os.path.join(os.path.expanduser("~"), "Library", "Application Support", APP_NAME)
+    else:
+        base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+        path = os.path.join(base, APP_NAME.lower())
+    
+    os.makedirs(path, exist_ok=True)
+    return path
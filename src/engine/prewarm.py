@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .decoder import DEFAULT_PREVIEW_BOX, level_box
+from .scanner import DirectoryScanner
+from .store import file_key, render_encoded
+
+
+def prewarm(store, root, recursive=True, box=DEFAULT_PREVIEW_BOX, workers=None, progress=None):
+    """Fill the preview store for every image under root using all cores.
+    
+    Images already stored for their current size and mtime are skipped, so an
+    interrupted run resumes where it stopped. Results are written in small
+    transactions, keeping memory bounded on very large trees.
+    
+    Args:
+        store (PreviewStore): Store to fill
+        root (str): Directory to scan
+        recursive (bool): Whether to descend into subdirectories
+        box (tuple): (max_width, max_height) of the previews, stored for its pyramid level like the viewer's
+        workers (int): Number of decoding processes (default: one per core)
+        progress (callable): Called as progress(stored, skipped, failed) after each commit
+        
+    Returns:
+        tuple: (stored, skipped, failed) counts
+    """
+    box = level_box(box)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    stored = skipped = failed = 0
+    pending_rows = []
+    in_flight = set()
+    
+    def collect(done):
+        nonlocal failed
+        for future in done:
+            try:
+                result = future.result()
+            except Exception:
+                result = None
+            if result is None:
+                failed += 1
+            else:
+                key, data = result
+                pending_rows.append((key, box, data))
+    
+    def flush():
+        nonlocal stored
+        if pending_rows:
+            store.put_many(pending_rows)
+            stored += len(pending_rows)
+            pending_rows.clear()
+            if progress:
+                progress(stored, skipped, failed)
+    
+    scanner = DirectoryScanner(root, recursive).start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch in scanner:
+                for image_path in batch:
+                    key = file_key(image_path)
+                    if key is None:
+                        failed += 1
+                        continue
+                    if store.contains(key, box):
+                        skipped += 1
+                        continue
+                    
+                    # Keep a bounded number of decodes queued so memory stays flat
+                    if len(in_flight) >= max_in_flight:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                        if len(pending_rows) >= 64:
+                            flush()
+                    in_flight.add(executor.submit(render_encoded, image_path, box))
+            
+            done, in_flight = wait(in_flight)
+            collect(done)
+            flush()
+    finally:
+        scanner.cancel()
+        # Keep whatever was decoded before an interrupt
+        flush()
+    
+    if scanner.error is not None:
+        raise scanner.error
+    return stored, skipped, failed
@@ -0,0 +1,113 @@
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from .batch import FileResultStore, process_files
+from .store import file_key
+
+
+# sharpness: variance of the Laplacian; clipped: share of crushed or blown pixels;
+# entropy: bits per pixel of the luminance histogram; flatness: share of pixels equal to their neighbour
+QualityScores = namedtuple("QualityScores", ["sharpness", "clipped", "entropy", "flatness"])
+
+
+# Longest side of the bitmap the metrics are computed on
+SCORE_SIZE = 256
+
+# Laplacian variance from which an image counts as sharp at SCORE_SIZE
+SHARP_VARIANCE = 400.0
+
+# Histogram entropy below which an image is close to blank (a uniform 8-bit histogram has 8 bits)
+BLANK_ENTROPY = 4.0
+
+
+def compute_scores(image):
+    """Return the QualityScores of an opened image, computed on a small decode"""
+    if image.format == "JPEG":
+        image.draft("RGB", (SCORE_SIZE, SCORE_SIZE))
+    image = image.convert("RGB")
+    image.thumbnail((SCORE_SIZE, SCORE_SIZE), Image.Resampling.BOX, reducing_gap=2.0)
+    rgb = np.asarray(image, dtype=np.int16)
+    gray = np.asarray(image.convert("L"), dtype=np.float32)
+    
+    # 4-neighbour Laplacian on the interior pixels
+    laplacian = (
+        4 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1] - gray[1:-1, :-2] - gray[1:-1, 2:]
+    )
+    sharpness = float(laplacian.var()) if laplacian.size else 0.0
+    
+    histogram = np.bincount(gray.astype(np.uint8).ravel(), minlength=256)
+    clipped = float((histogram[:5].sum() + histogram[251:].sum()) / gray.size)
+    
+    probabilities = histogram[histogram > 0] / gray.size
+    entropy = float(-(probabilities * np.log2(probabilities)).sum())
+    
+    # Rendered graphics repeat exact colours; photographs almost never do, even in the sky
+    same = (rgb[:, 1:] == rgb[:, :-1]).all(axis=2)
+    flatness = float(same.mean()) if same.size else 1.0
+    
+    return QualityScores(sharpness, clipped, entropy, flatness)
+
+
+def badness(scores):
+    """Return how likely an image is a reject, from 0 (fine) to 1, as its worst problem"""
+    blur = 1 - min(np.log1p(scores.sharpness) / np.log1p(SHARP_VARIANCE), 1.0)
+    exposure = min(scores.clipped / 0.5, 1.0)
+    blank = max(1 - scores.entropy / BLANK_ENTROPY, 0.0)
+    flat = max((scores.flatness - 0.5) / 0.5, 0.0)
+    return float(max(blur, exposure, blank, flat))
+
+
+def score_files(image_paths):
+    """Score a chunk of files in a worker process.
+    
+    Returns:
+        list: (file key, QualityScores) for every file that could be read, None for the others
+    """
+    results = []
+    for image_path in image_paths:
+        key = file_key(image_path)
+        try:
+            with Image.open(image_path) as image:
+                results.append((key, compute_scores(image)) if key is not None else None)
+        except Exception:
+            results.append(None)
+    return results
+
+
+class QualityStore(FileResultStore):
+    """Persistent store of quality scores, valid while the file's size and mtime are unchanged.
+    
+    Args:
+        path (str): Database file, by default quality.sqlite3 in the user cache directory
+    """
+    TABLE = "quality"
+    COLUMNS = ("sharpness REAL NOT NULL", "clipped REAL NOT NULL", "entropy REAL NOT NULL", "flatness REAL NOT NULL")
+    DEFAULT_FILENAME = "quality.sqlite3"
+    
+    def decode(self, values):
+        return QualityScores(*values)
+
+
+def score_images(image_paths, store=None, workers=None, progress=None):
+    """Compute the quality scores of many images on a process pool.
+    
+    Args:
+        image_paths (iterable): Images to score
+        store (QualityStore): Optional persistent store; stored scores of unchanged files are reused
+        workers (int): Number of scoring processes (default: one per core)
+        progress (callable): Called as progress(done, total) as results arrive
+    
+    Returns:
+        dict: {absolute path: QualityScores} for every image that could be read
+    """
+    return process_files(image_paths, score_files, store, workers, progress)
+
+
+def worst_first(image_paths, scores):
+    """Order images from the likeliest reject to the best, unscored images last, ties in list order"""
+    ranked = [(-badness(scores[image_path]) if image_path in scores else 1.0, index, image_path)
+              for index, image_path in enumerate(image_paths)]
+    ranked.sort()
+    return [image_path for _, _, image_path in ranked]
@@ -0,0 +1,222 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .formats import FORMAT_EXTENSIONS, format_cache
+from .snapshot import DirectoryState, TreeSnapshot
+from .tracing import tracer
+
+
+# Extensions the viewer knows how to preview
+IMAGE_EXTENSIONS = frozenset(extension for extensions in FORMAT_EXTENSIONS.values() for extension in extensions)
+
+
+def is_image_file(file_path):
+    """Check if a file is an image based on its extension, or on its first bytes when it has none"""
+    _, ext = os.path.splitext(file_path.lower())
+    if ext:
+        return ext in IMAGE_EXTENSIONS
+    return format_cache.classify(file_path) is not None
+
+
+class DirectoryScanner:
+    """Walk a directory tree with os.scandir and stream the images it finds in batches.
+    
+    Subdirectories are walked concurrently on a thread pool and every batch is handed
+    over through a queue, so a consumer can show the first image while the rest of
+    the tree is still being scanned. What was seen is recorded in `snapshot`.
+    
+    Given the snapshot of an earlier scan, directories whose mtime has not changed
+    are not listed again; their recorded images are reused. When the set of changed
+    directories is known (from a filesystem watcher), every other directory of the
+    previous snapshot is reused without even a stat.
+    
+    Args:
+        root (str): Directory to scan
+        recursive (bool): Whether to descend into subdirectories
+        workers (int): Number of directories listed concurrently
+        batch_size (int): Maximum number of paths per batch
+        previous (TreeSnapshot): Snapshot of an earlier scan of the same tree
+        changed (set): Directories known to have changed since `previous`
+        record (bool): Whether to record the snapshot; turn off to keep memory flat on huge trees
+        max_batches (int): Bound on the batches waiting to be consumed, so listing pauses
+            instead of buffering a whole tree when the consumer is slower (default: unbounded)
+    """
+    def __init__(self, root, recursive=False, workers=None, batch_size=256, previous=None, changed=None,
+                 record=True, max_batches=0):
+        self.root = root
+        self.recursive = recursive
+        self.previous = previous
+        self.changed = changed
+        self.snapshot = TreeSnapshot(root, recursive) if record else None
+        # Listing is I/O bound, so use more threads than cores (network shares benefit most)
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        self.batch_size = batch_size
+        self.error = None
+        self.done = False
+        
+        self._batches = queue.Queue(max_batches)
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = None
+        self._started = 0
+    
+    def start(self):
+        """Start walking the tree in the background. Returns the scanner"""
+        self._started = tracer.now()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scanner")
+        self._submit(self.root)
+        return self
+    
+    def cancel(self):
+        """Stop the walk; directories already being listed finish without reporting"""
+        self._cancelled.set()
+    
+    def poll(self):
+        """Return the paths found since the last call without blocking"""
+        image_paths = []
+        while True:
+            try:
+                batch = self._batches.get_nowait()
+            except queue.Empty:
+                return image_paths
+            if batch is None:
+                self.done = True
+                return image_paths
+            image_paths.extend(batch)
+    
+    def raise_for_error(self):
+        """Raise the error that stopped the scan of the root, if any"""
+        if isinstance(self.error, PermissionError):
+            raise PermissionError("Permission denied accessing directory")
+        elif self.error is not None:
+            raise Exception(f"Error accessing directory: {str(self.error)}")
+    
+    def __iter__(self):
+        """Yield batches of paths until the walk is finished"""
+        while not self.done:
+            batch = self._batches.get()
+            if batch is None:
+                self.done = True
+            else:
+                yield batch
+    
+    def _submit(self, directory):
+        with self._lock:
+            self._pending += 1
+        try:
+            self._executor.submit(self._scan_directory, directory)
+        except RuntimeError:
+            # The pool is already shutting down after a cancel
+            self._directory_done()
+    
+    def _directory_done(self):
+        with self._lock:
+            self._pending -= 1
+            finished = self._pending == 0
+        if finished:
+            tracer.interval("scan", self._started, tracer.now(), "scan", {"root": self.root})
+            self._executor.shutdown(wait=False)
+            self._put(None)
+    
+    def _scan_directory(self, directory):
+        previous = self.previous.directories.get(directory) if self.previous is not None else None
+        try:
+            if self._cancelled.is_set():
+                return
+            
+            if previous is not None and self.changed is not None and directory not in self.changed:
+                # The watcher saw nothing happen here
+                state = previous
+            else:
+                # Stat before listing so a change made during the listing shows up next time
+                mtime_ns = os.stat(directory).st_mtime_ns
+                if previous is not None and previous.mtime_ns == mtime_ns and self.changed is None:
+                    state = previous
+                else:
+                    with tracer.span("list directory", "scan", directory=directory):
+                        state = self._list_directory(directory, mtime_ns)
+                    if state is None:
+                        return
+            
+            if state is previous:
+                self._emit(directory, state.images)
+                for subdirectory in state.subdirectories:
+                    self._submit(subdirectory)
+            if self.snapshot is not None:
+                self.snapshot.record(directory, state)
+        except OSError as e:
+            if directory == self.root:
+                # Only a failure on the root is reported
+                self.error = e
+            elif previous is not None:
+                # Keep what was known rather than dropping a subdirectory that is briefly unreachable
+                self._emit(directory, previous.images)
+                if self.snapshot is not None:
+                    self.snapshot.record(directory, previous)
+        finally:
+            self._directory_done()
+    
+    def _list_directory(self, directory, mtime_ns):
+        """List a directory, streaming its images and submitting its subdirectories. Returns its state"""
+        batch = []
+        images = []
+        subdirectories = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if self._cancelled.is_set():
+                    return None
+                try:
+                    # DirEntry type checks use the directory listing itself, no extra stat call
+                    if entry.is_file():
+                        # Skip files that contain "desktop.ini" in their name
+                        if "desktop.ini" not in entry.name.lower() and is_image_file(entry.path):
+                            if self.snapshot is not None:
+                                images.append(entry.name)
+                            batch.append(entry.path)
+                            if len(batch) >= self.batch_size:
+                                self._put(batch)
+                                batch = []
+                    elif self.recursive and entry.is_dir():
+                        subdirectories.append(entry.path)
+                        self._submit(entry.path)
+                except OSError:
+                    continue
+        if batch and not self._cancelled.is_set():
+            self._put(batch)
+        return DirectoryState(mtime_ns, tuple(images), tuple(subdirectories))
+    
+    def _emit(self, directory, names):
+        """Stream images reused from the previous snapshot in batches"""
+        for start in range(0, len(names), self.batch_size):
+            if self._cancelled.is_set():
+                return
+            self._put([os.path.join(directory, name) for name in names[start:start + self.batch_size]])
+    
+    def _put(self, batch):
+        """Queue a batch, waiting for room when the queue is bounded unless the scan is cancelled"""
+        while True:
+            try:
+                self._batches.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                if self._cancelled.is_set():
+                    return
+
+
+def list_images(directory_path, recursive=False):
+    """List viewable image files in the specified directory.
+    
+    Args:
+        directory_path (str): Path to the directory to list files from
+        recursive (bool): Whether to list files recursively in subdirectories
+    
+    Returns:
+        list: List of viewable image file paths (absolute paths)
+    """
+    scanner = DirectoryScanner(directory_path, recursive).start()
+    images = [image_path for batch in scanner for image_path in batch]
+    scanner.raise_for_error()
+    return images
@@ -0,0 +1,172 @@
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from PIL import Image
+
+from .decoder import load_preview
+from .store import decode_preview, encode_preview, file_key, read_stored
+from .tracing import tracer
+
+
+def decode_to_shared_memory(image_path, box, rotation=0, store_path=None):
+    """Decode a preview in a worker process and hand its pixels back through shared memory.
+    
+    The persistent store is read first when store_path is given. Only a small
+    descriptor travels through the pool's pipe; the bitmap itself is copied once
+    into a shared memory block that the parent process unlinks.
+    
+    Returns:
+        tuple: (shared memory name, mode, size, file key, encoded preview to store or None),
+        or None if the image can't be loaded. On Windows the pixels themselves replace the name.
+    """
+    key = file_key(image_path)
+    if key is None:
+        return None
+    
+    image = None
+    encoded = None
+    if store_path is not None and rotation == 0:
+        stored = read_stored(store_path, key, box)
+        if stored is not None:
+            image = decode_preview(stored)
+    
+    if image is None:
+        image = load_preview(image_path, box, rotation)
+        if image is None:
+            return None
+        if store_path is not None and rotation == 0:
+            encoded = encode_preview(image)
+    
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+    
+    data = image.tobytes()
+    if os.name != "posix":
+        # A Windows mapping disappears with its last handle, so the worker can't leave it
+        # behind for the parent; fall back to sending the pixels through the pipe
+        return data, image.mode, image.size, key, encoded
+    
+    block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    try:
+        block.buf[:len(data)] = data
+    finally:
+        block.close()
+    # Ownership moves to the parent, which unlinks the block once it has copied it
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block.name, image.mode, image.size, key, encoded
+
+
+def take_shared_image(name, mode, size):
+    """Copy a bitmap out of a shared memory block created by a worker and free the block"""
+    if isinstance(name, bytes):
+        return Image.frombytes(mode, size, name)
+    
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        nbytes = size[0] * size[1] * len(mode)
+        with block.buf[:nbytes] as view:
+            return Image.frombytes(mode, size, view)
+    finally:
+        block.close()
+        block.unlink()
+
+
+class DecodeScheduler:
+    """Long-lived process pool that decodes previews in priority order.
+    
+    Jobs wait in a priority queue in this process and only as many as there are
+    workers are handed to the pool at a time, so the queue can be reordered or
+    cancelled whenever the cursor moves. Decodes already running finish and are
+    still reported.
+    
+    Args:
+        on_result (callable): Called as on_result(image_path, box, rotation, image, key, encoded)
+            from a pool thread for every finished job; image is None when the decode failed
+        workers (int): Number of decoding processes (default: one less than the cores)
+        store_path (str): Preview store database the workers read before decoding
+    """
+    def __init__(self, on_result, workers=None, store_path=None):
+        self.on_result = on_result
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.store_path = store_path
+        
+        self._executor = None
+        # Reentrant: a future that is already done runs its callback inside _dispatch
+        self._lock = threading.RLock()
+        self._queue = []
+        self._queued = {}
+        self._running = set()
+        self._counter = itertools.count()
+    
+    def schedule(self, jobs):
+        """Replace the queue with new jobs.
+        
+        Args:
+            jobs (iterable): (priority, image_path, box, rotation) tuples; lower priority runs first
+        """
+        with self._lock:
+            self._queue = []
+            self._queued = {}
+            for priority, image_path, box, rotation in jobs:
+                key = (image_path, tuple(box), rotation)
+                if key in self._running or self._queued.get(key, priority + 1) <= priority:
+                    continue
+                self._queued[key] = priority
+                self._queue.append((priority, next(self._counter), key))
+            heapq.heapify(self._queue)
+            self._dispatch()
+    
+    def cancel(self):
+        """Drop every queued job"""
+        with self._lock:
+            self._queue = []
+            self._queued = {}
+    
+    def shutdown(self):
+        """Drop the queue and stop the worker processes"""
+        self.cancel()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _dispatch(self):
+        """Hand the highest priority jobs to idle workers. Must hold the lock"""
+        while self._queue and len(self._running) < self.workers:
+            priority, _, key = heapq.heappop(self._queue)
+            if self._queued.get(key) != priority:
+                continue
+            del self._queued[key]
+            
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            image_path, box, rotation = key
+            future = self._executor.submit(decode_to_shared_memory, image_path, box, rotation, self.store_path)
+            self._running.add(key)
+            started = tracer.now()
+            future.add_done_callback(lambda future, key=key, started=started: self._finished(key, future, started))
+    
+    def _finished(self, key, future, started):
+        tracer.interval("decode", started, tracer.now(), "decode", {"path": key[0], "box": key[1], "rotation": key[2]})
+        image = file_identity = encoded = None
+        try:
+            result = None if future.cancelled() else future.result()
+            if result is not None:
+                name, mode, size, file_identity, encoded = result
+                with tracer.span("take shared image", "decode"):
+                    image = take_shared_image(name, mode, size)
+        except Exception:
+            image = None
+        
+        try:
+            self.on_result(*key, image, file_identity, encoded)
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._running.discard(key)
+                if self._executor is not None:
+                    self._dispatch()
@@ -0,0 +1,206 @@
+class ImageSequence:
+    """Ordered list of unique image paths with O(1) membership and O(log n) positions.
+    
+    Paths live in an append-only array of slots. Removing a path only marks its
+    slot dead (a tombstone), and a Fenwick tree over the live flags turns a slot
+    into its position and a position into its slot in O(log n). A removed path
+    keeps its slot, so putting it back (undo) revives it at its original place
+    without moving anything. The array is compacted once more than half of it is
+    tombstones.
+    
+    Args:
+        image_paths (iterable): Initial paths, in order
+    """
+    def __init__(self, image_paths=()):
+        self._build(list(image_paths))
+    
+    def __len__(self):
+        return self._live
+    
+    def __bool__(self):
+        return self._live > 0
+    
+    def __contains__(self, image_path):
+        slot = self._slot_of.get(image_path)
+        return slot is not None and self._alive[slot]
+    
+    def __iter__(self):
+        for slot, image_path in enumerate(self._slots):
+            if self._alive[slot]:
+                yield image_path
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._live)
+            if step != 1:
+                return list(self)[index]
+            return list(self.iter_from(start, stop - start))
+        
+        if index < 0:
+            index += self._live
+        if not 0 <= index < self._live:
+            raise IndexError("image index out of range")
+        return self._slots[self._select(index)]
+    
+    def __eq__(self, other):
+        if isinstance(other, ImageSequence):
+            other = list(other)
+        return list(self) == other
+    
+    def __repr__(self):
+        return f"ImageSequence({len(self)} images)"
+    
+    def iter_from(self, index, count=None):
+        """Yield up to count paths starting at position index, without building a list"""
+        if index >= self._live or count == 0:
+            return
+        slot = self._select(max(index, 0))
+        remaining = count
+        while slot < len(self._slots):
+            if self._alive[slot]:
+                yield self._slots[slot]
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining == 0:
+                        return
+            slot += 1
+    
+    def index(self, image_path):
+        """Return the position of image_path. Raises ValueError if it is not in the sequence"""
+        slot = self._slot_of.get(image_path)
+        if slot is None or not self._alive[slot]:
+            raise ValueError(f"{image_path!r} is not in the sequence")
+        return self._prefix(slot)
+    
+    def position(self, image_path):
+        """Return the position image_path has, or would have again if it was put back.
+        
+        For a removed path this is the position of the image that followed it. Raises
+        ValueError for a path the sequence has never held (or forgot on compaction).
+        """
+        slot = self._slot_of.get(image_path)
+        if slot is None:
+            raise ValueError(f"{image_path!r} is not in the sequence")
+        return self._prefix(slot)
+    
+    def append(self, image_path):
+        """Add a path at the end, or revive it at its original place if it was removed"""
+        slot = self._slot_of.get(image_path)
+        if slot is not None:
+            if not self._alive[slot]:
+                self._revive(slot)
+            return
+        
+        self._slots.append(image_path)
+        self._alive.append(1)
+        self._slot_of[image_path] = len(self._slots) - 1
+        self._tree_append(1)
+        self._live += 1
+    
+    def extend(self, image_paths):
+        for image_path in image_paths:
+            self.append(image_path)
+    
+    def insert(self, index, image_path):
+        """Insert a path at position index (clamped) and return where it landed.
+        
+        A removed path comes back in its original slot, which is where it was unless
+        the images around it changed since. Inserting a new path anywhere but at the
+        end rebuilds the array.
+        """
+        if image_path in self:
+            return self.index(image_path)
+        
+        index = max(0, min(index, self._live))
+        if image_path in self._slot_of:
+            self._revive(self._slot_of[image_path])
+            return self.index(image_path)
+        if index == self._live:
+            self.append(image_path)
+            return index
+        
+        image_paths = list(self)
+        image_paths.insert(index, image_path)
+        self._build(image_paths)
+        return index
+    
+    def pop(self, index):
+        """Remove the path at position index and return it"""
+        image_path = self[index]
+        self.remove(image_path)
+        return image_path
+    
+    def remove(self, image_path):
+        """Remove a path. Raises ValueError if it is not in the sequence"""
+        slot = self._slot_of.get(image_path)
+        if slot is None or not self._alive[slot]:
+            raise ValueError(f"{image_path!r} is not in the sequence")
+        
+        self._alive[slot] = 0
+        self._tree_add(slot, -1)
+        self._live -= 1
+        if len(self._slots) > 64 and self._live < len(self._slots) // 2:
+            self._build(list(self))
+    
+    def discard(self, image_path):
+        """Remove a path if it is in the sequence"""
+        if image_path in self:
+            self.remove(image_path)
+    
+    def _build(self, image_paths):
+        self._slot_of = dict(zip(image_paths, range(len(image_paths))))
+        if len(self._slot_of) != len(image_paths):
+            # Keep the first occurrence of each path
+            image_paths = list(dict.fromkeys(image_paths))
+            self._slot_of = dict(zip(image_paths, range(len(image_paths))))
+        self._slots = image_paths
+        self._alive = bytearray(b"\x01") * len(image_paths)
+        self._live = len(image_paths)
+        # With every slot live, each Fenwick node counts exactly the slots it covers
+        self._tree = [node & -node for node in range(len(image_paths) + 1)]
+    
+    def _revive(self, slot):
+        self._alive[slot] = 1
+        self._tree_add(slot, 1)
+        self._live += 1
+    
+    def _tree_add(self, slot, delta):
+        node = slot + 1
+        tree = self._tree
+        while node < len(tree):
+            tree[node] += delta
+            node += node & -node
+    
+    def _tree_append(self, value):
+        # The new node covers (node - lowbit, node]: itself plus the nodes node - 1, node - 2, node - 4...
+        tree = self._tree
+        node = len(tree)
+        step = 1
+        lowest = node & -node
+        while step < lowest:
+            value += tree[node - step]
+            step <<= 1
+        tree.append(value)
+    
+    def _prefix(self, slot):
+        """Number of live slots before slot"""
+        total = 0
+        node = slot
+        tree = self._tree
+        while node > 0:
+            total += tree[node]
+            node -= node & -node
+        return total
+    
+    def _select(self, index):
+        """Slot of the live path at position index"""
+        tree = self._tree
+        node = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            following = node + step
+            if following < len(tree) and tree[following] <= index:
+                node = following
+                index -= tree[following]
+            step >>= 1
+        return node
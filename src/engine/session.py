@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from .paths import user_state_dir
+from .snapshot import DirectoryState, TreeSnapshot
+
+
+# Where a session on a root stood: the image shown, its index in the list and the rotations the user applied
+SessionState = namedtuple("SessionState", ["root", "recursive", "current_path", "index", "rotations"])
+
+
+# Names can't contain NUL on any platform, so it separates the names of a directory
+_SEPARATOR = "\0"
+
+
+class SessionStore:
+    """Persistent per-root sessions in a SQLite database: the position and the last scan snapshot.
+    
+    The snapshot is stored one row per directory, in the order the directories first
+    appear in the list, so a restored list keeps the order the user was going through.
+    Only the most recently saved sessions are kept.
+    
+    Args:
+        path (str): Database file, by default sessions.sqlite3 in the user state directory
+        max_sessions (int): Number of roots remembered
+    """
+    DEFAULT_MAX_SESSIONS = 50
+    
+    def __init__(self, path=None, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.path = path or os.path.join(user_state_dir(), "sessions.sqlite3")
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "root TEXT PRIMARY KEY, recursive INTEGER NOT NULL, current_path TEXT, "
+            "current_index INTEGER NOT NULL, rotations TEXT NOT NULL, saved REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS directories ("
+            "root TEXT NOT NULL, seq INTEGER NOT NULL, directory TEXT NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "images TEXT NOT NULL, subdirectories TEXT NOT NULL, PRIMARY KEY (root, seq))"
+        )
+        self._connection.commit()
+    
+    def load(self, root):
+        """Return the SessionState saved for a root, or None"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT recursive, current_path, current_index, rotations FROM sessions WHERE root=?", (root,)
+            ).fetchone()
+        if row is None:
+            return None
+        recursive, current_path, index, rotations = row
+        return SessionState(root, bool(recursive), current_path, index, json.loads(rotations))
+    
+    def load_snapshot(self, root, recursive):
+        """Return the TreeSnapshot saved with a root's session, or None if there is none for this recursive flag"""
+        with self._lock:
+            row = self._connection.execute("SELECT recursive FROM sessions WHERE root=?", (root,)).fetchone()
+            if row is None or bool(row[0]) != recursive:
+                return None
+            rows = self._connection.execute(
+                "SELECT directory, mtime_ns, images, subdirectories FROM directories WHERE root=? ORDER BY seq", (root,)
+            ).fetchall()
+        if not rows:
+            return None
+        
+        snapshot = TreeSnapshot(root, recursive)
+        for directory, mtime_ns, images, subdirectories in rows:
+            snapshot.directories[directory] = DirectoryState(
+                mtime_ns,
+                tuple(images.split(_SEPARATOR)) if images else (),
+                tuple(subdirectories.split(_SEPARATOR)) if subdirectories else ()
+            )
+        return snapshot
+    
+    def save(self, state, snapshot=None, image_paths=None):
+        """Store the position of a session, and its snapshot when given.
+        
+        Args:
+            state (SessionState): Position to store
+            snapshot (TreeSnapshot): Snapshot replacing the stored one; None keeps the stored one
+            image_paths (iterable): The list in display order, used to order the snapshot's directories
+        """
+        rows = None
+        if snapshot is not None:
+            rows = list(self._directory_rows(state.root, snapshot, image_paths or ()))
+        
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                    (state.root, int(state.recursive), state.current_path, state.index,
+                     json.dumps(state.rotations), time.time())
+                )
+                if rows is not None:
+                    self._connection.execute("DELETE FROM directories WHERE root=?", (state.root,))
+                    self._connection.executemany("INSERT INTO directories VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._prune()
+    
+    def discard(self, root):
+        """Forget the session of a root"""
+        with self._lock:
+            with self._connection:
+                self._connection.execute("DELETE FROM sessions WHERE root=?", (root,))
+                self._connection.execute("DELETE FROM directories WHERE root=?", (root,))
+    
+    def close(self):
+        """Close the database"""
+        with self._lock:
+            self._connection.close()
+    
+    @staticmethod
+    def _directory_rows(root, snapshot, image_paths):
+        # Directories in the order their first image appears in the list, then the ones without images
+        order = {}
+        previous_directory = None
+        for image_path in image_paths:
+            directory = os.path.dirname(image_path)
+            if directory != previous_directory:
+                order.setdefault(directory, len(order))
+                previous_directory = directory
+        directories = sorted(snapshot.directories.items(), key=lambda item: order.get(item[0], len(order)))
+        for seq, (directory, state) in enumerate(directories):
+            yield (root, seq, directory, state.mtime_ns,
+                   _SEPARATOR.join(state.images), _SEPARATOR.join(state.subdirectories))
+    
+    def _prune(self):
+        """Drop the sessions beyond max_sessions, oldest first. Must hold the lock, in a transaction"""
+        stale = [root for root, in self._connection.execute(
+            "SELECT root FROM sessions ORDER BY saved DESC LIMIT -1 OFFSET ?", (self.max_sessions,)
+        )]
+        for root in stale:
+            self._connection.execute("DELETE FROM sessions WHERE root=?", (root,))
+            self._connection.execute("DELETE FROM directories WHERE root=?", (root,))
@@ -0,0 +1,58 @@
+import os
+import threading
+from collections import namedtuple
+
+
+# What a scan saw in one directory: its mtime, the names of its images and the paths of its subdirectories
+DirectoryState = namedtuple("DirectoryState", ["mtime_ns", "images", "subdirectories"])
+
+# Result of bringing a session up to date with its directory tree
+TreeChanges = namedtuple("TreeChanges", ["added", "removed", "modified"])
+
+
+class TreeSnapshot:
+    """The images of a scanned tree, recorded per directory with the directory mtime.
+    
+    A later scan given this snapshot as `previous` skips listing every directory whose
+    mtime has not changed, and diff() turns two snapshots into added and removed paths.
+    """
+    def __init__(self, root, recursive):
+        self.root = root
+        self.recursive = recursive
+        self.directories = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return sum(len(state.images) for state in self.directories.values())
+    
+    def record(self, directory, state):
+        """Store the state of a directory. Called from scanner threads"""
+        with self._lock:
+            self.directories[directory] = state
+    
+    def image_paths(self):
+        """Yield the path of every image in the snapshot"""
+        for directory, state in self.directories.items():
+            for name in state.images:
+                yield os.path.join(directory, name)
+    
+    def diff(self, newer):
+        """Return the (added, removed) image paths between this snapshot and a newer one"""
+        added = []
+        removed = []
+        
+        for directory, state in newer.directories.items():
+            previous = self.directories.get(directory)
+            if previous is state:
+                # Reused as is by the newer scan
+                continue
+            previous_names = set(previous.images) if previous is not None else set()
+            names = set(state.images)
+            added.extend(os.path.join(directory, name) for name in state.images if name not in previous_names)
+            removed.extend(os.path.join(directory, name) for name in previous_names - names)
+        
+        for directory, previous in self.directories.items():
+            if directory not in newer.directories:
+                removed.extend(os.path.join(directory, name) for name in previous.images)
+        
+        return added, removed
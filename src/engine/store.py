@@ -0,0 +1,218 @@
+import io
+import os
+import sqlite3
+import threading
+import time
+from PIL import Image
+
+from .decoder import load_preview
+from .paths import user_cache_dir
+
+
+def file_key(image_path):
+    """Return the (absolute path, size, mtime_ns) identity of a file, or None if it can't be read"""
+    try:
+        stats = os.stat(image_path)
+    except OSError:
+        return None
+    return os.path.abspath(image_path), stats.st_size, stats.st_mtime_ns
+
+
+def encode_preview(image):
+    """Encode a preview for storage: PNG when it has transparency, JPEG otherwise"""
+    buffer = io.BytesIO()
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image.convert("RGBA").save(buffer, "PNG", compress_level=1)
+    else:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def decode_preview(data):
+    """Decode a preview produced by encode_preview"""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def render_encoded(image_path, box):
+    """Decode a preview and encode it for storage. Runs in prewarm worker processes.
+    
+    Returns:
+        tuple: (file key, encoded bytes), or None if the image can't be loaded
+    """
+    key = file_key(image_path)
+    if key is None:
+        return None
+    
+    image = load_preview(image_path, box)
+    if image is None:
+        return None
+    return key, encode_preview(image)
+
+
+# Read-only connections opened by worker processes, one per database file
+_reader_connections = {}
+
+
+def read_stored(store_path, key, box):
+    """Return the encoded preview stored for a file key and box, or None.
+    
+    Used by decode worker processes, which only read; the owning PreviewStore does
+    every write and access-time update.
+    """
+    connection = _reader_connections.get(store_path)
+    if connection is None:
+        try:
+            connection = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True)
+        except sqlite3.Error:
+            return None
+        _reader_connections[store_path] = connection
+    
+    try:
+        row = connection.execute(
+            "SELECT data FROM previews WHERE path=? AND size=? AND mtime_ns=? AND box_width=? AND box_height=?",
+            (*key, *box)
+        ).fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+class PreviewStore:
+    """Persistent store of encoded previews in a SQLite database.
+    
+    Entries are keyed by absolute path, file size, mtime and preview box, so an edited
+    file or a different box never returns a stale preview. The total size of the stored
+    previews is capped; the least recently used ones are evicted first.
+    
+    Args:
+        path (str): Database file, by default previews.sqlite3 in the user cache directory
+        capacity (int): Maximum total size of the stored previews in bytes
+    """
+    DEFAULT_CAPACITY = 1024 * 1024 * 1024
+    
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY):
+        self.path = path or os.path.join(user_cache_dir(), "previews.sqlite3")
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS previews ("
+            "path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "box_width INTEGER NOT NULL, box_height INTEGER NOT NULL, "
+            "data BLOB NOT NULL, nbytes INTEGER NOT NULL, accessed REAL NOT NULL, "
+            "PRIMARY KEY (path, size, mtime_ns, box_width, box_height))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS previews_accessed ON previews (accessed)")
+        self._connection.commit()
+        self._total = self._connection.execute("SELECT COALESCE(SUM(nbytes), 0) FROM previews").fetchone()[0]
+    
+    @property
+    def total_bytes(self):
+        """Total size of the stored previews"""
+        return self._total
+    
+    def get(self, image_path, box):
+        """Return the stored preview of an image for the box, or None"""
+        key = file_key(image_path)
+        if key is None:
+            return None
+        
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM previews WHERE path=? AND size=? AND mtime_ns=? AND box_width=? AND box_height=?",
+                (*key, *box)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE previews SET accessed=? WHERE path=? AND size=? AND mtime_ns=? AND box_width=? AND box_height=?",
+                (time.time(), *key, *box)
+            )
+            self._connection.commit()
+        
+        try:
+            return decode_preview(row[0])
+        except Exception:
+            return None
+    
+    def contains(self, key, box):
+        """Whether a preview is stored for a file key and box"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM previews WHERE path=? AND size=? AND mtime_ns=? AND box_width=? AND box_height=?",
+                (*key, *box)
+            ).fetchone()
+        return row is not None
+    
+    def put(self, image_path, box, image):
+        """Store the preview of an image for the box"""
+        key = file_key(image_path)
+        if key is not None:
+            self.put_many([(key, box, encode_preview(image))])
+    
+    def touch(self, key, box):
+        """Mark a preview as recently used"""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE previews SET accessed=? WHERE path=? AND size=? AND mtime_ns=? AND box_width=? AND box_height=?",
+                (time.time(), *key, *box)
+            )
+            self._connection.commit()
+    
+    def put_many(self, entries):
+        """Store already encoded previews given as (file key, box, data) tuples in one transaction"""
+        now = time.time()
+        with self._lock:
+            for (path, size, mtime_ns), (box_width, box_height), data in entries:
+                # Previews of an older version of the file can never be hit again
+                self._total -= self._delete("path=? AND (size!=? OR mtime_ns!=?)", (path, size, mtime_ns))
+                self._total -= self._delete(
+                    "path=? AND size=? AND mtime_ns=? AND box_width=? AND box_height=?",
+                    (path, size, mtime_ns, box_width, box_height)
+                )
+                self._connection.execute(
+                    "INSERT INTO previews VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, box_width, box_height, data, len(data), now)
+                )
+                self._total += len(data)
+            self._evict()
+            self._connection.commit()
+    
+    def discard(self, image_path):
+        """Drop every stored preview of an image"""
+        with self._lock:
+            self._total -= self._delete("path=?", (os.path.abspath(image_path),))
+            self._connection.commit()
+    
+    def close(self):
+        """Close the database"""
+        with self._lock:
+            self._connection.close()
+    
+    def _delete(self, where, parameters):
+        """Delete the matching rows and return how many bytes were freed"""
+        freed = self._connection.execute(f"SELECT COALESCE(SUM(nbytes), 0) FROM previews WHERE {where}", parameters).fetchone()[0]
+        if freed:
+            self._connection.execute(f"DELETE FROM previews WHERE {where}", parameters)
+        return freed
+    
+    def _evict(self):
+        """Drop the least recently used previews until the store is back under 90% of its capacity"""
+        if self._total <= self.capacity:
+            return
+        
+        target = self.capacity * 0.9
+        cursor = self._connection.execute("SELECT rowid, nbytes FROM previews ORDER BY accessed")
+        evicted = []
+        for rowid, nbytes in cursor:
+            if self._total <= target:
+                break
+            evicted.append((rowid,))
+            self._total -= nbytes
+        self._connection.executemany("DELETE FROM previews WHERE rowid=?", evicted)
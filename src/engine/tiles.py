@@ -0,0 +1,239 @@
+import mmap
+import threading
+from PIL import Image
+
+from .decoder import ROTATIONS
+from .store import file_key
+
+
+# Side of a zoom tile in displayed pixels
+TILE_SIZE = 256
+
+# Largest band of source rows read from a mapped file in one pass
+BAND_BYTES = 32 * 1024 * 1024
+
+
+def display_mode(mode):
+    """Return the mode the regions of an image in mode are shown in"""
+    if mode in ("RGBA", "LA", "P", "PA"):
+        return "RGBA"
+    if mode in ("1", "L"):
+        return "L"
+    return "RGB"
+
+
+def source_box(box, rotation, size):
+    """Map a box of an image turned clockwise by rotation back to the unturned source of the given size"""
+    left, top, right, bottom = box
+    width, height = size
+    if rotation == 90:
+        return top, height - right, bottom, height - left
+    if rotation == 180:
+        return width - right, height - bottom, width - left, height - top
+    if rotation == 270:
+        return width - bottom, left, width - top, right
+    return box
+
+
+class RegionReader:
+    """Decodes rectangular regions of one image file, reading as little of it as the format allows.
+    
+    Files whose pixels are stored uncompressed (raw TIFF strips or tiles, BMP, PPM)
+    are memory-mapped: a region only touches the rows it covers, in bands of at most
+    BAND_BYTES, so memory stays flat however large the file is. Pillow decodes other
+    formats as a whole, so they are decoded once per reduction factor, JPEGs at a
+    reduced DCT scale, and only the latest decoded level is kept.
+    
+    Args:
+        image_path (str): Path of the image file
+        rotation (int): Clockwise rotation the regions are asked and returned in (0, 90, 180, 270)
+    """
+    def __init__(self, image_path, rotation=0):
+        self.path = image_path
+        self.rotation = rotation % 360
+        self._lock = threading.Lock()
+        self._map = None
+        self._level = None
+        with Image.open(image_path) as image:
+            self.source_size = image.size
+            self.mode = image.mode
+            self._palette = image.palette if image.mode == "P" else None
+            self._entries = self._raw_entries(image)
+        if self._entries is not None:
+            with open(image_path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        width, height = self.source_size
+        self.size = (height, width) if self.rotation in (90, 270) else (width, height)
+    
+    @property
+    def mapped(self):
+        """Whether regions are read from the memory-mapped file rather than from a decoded level"""
+        return self._map is not None
+    
+    def region(self, box, factor=1):
+        """Return the pixels of a box, shrunk by an integer factor with a box filter.
+        
+        Args:
+            box (tuple): (left, top, right, bottom) in pixels of the turned image
+            factor (int): Reduction factor; the result is ceil(width / factor) x ceil(height / factor)
+        """
+        left, top, right, bottom = box
+        if self._map is None:
+            level = self._decoded_level(factor)
+            return level.crop((left // factor, top // factor, -(-right // factor), -(-bottom // factor)))
+        
+        left, top, right, bottom = source_box(box, self.rotation, self.source_size)
+        output = Image.new(display_mode(self.mode), (-(-(box[2] - box[0]) // factor), -(-(box[3] - box[1]) // factor)))
+        # Bands are a multiple of factor rows counted from the shown top left corner, so each one reduces on its own
+        row_bytes = max(stride for _, _, _, stride, _ in self._entries)
+        band_rows = factor * max(1, BAND_BYTES // (factor * row_bytes))
+        if self.rotation in (90, 180):
+            bands = [(max(top, end - band_rows), end) for end in range(bottom, top, -band_rows)]
+        else:
+            bands = [(start, min(start + band_rows, bottom)) for start in range(top, bottom, band_rows)]
+        for band_top, band_bottom in bands:
+            band = self._read_rows(left, band_top, right, band_bottom)
+            if self.rotation in ROTATIONS:
+                band = band.transpose(ROTATIONS[self.rotation])
+            if factor > 1:
+                band = band.reduce(factor)
+            shown_left, shown_top, _, _ = source_box((left, band_top, right, band_bottom), -self.rotation % 360, self.size)
+            output.paste(band, ((shown_left - box[0]) // factor, (shown_top - box[1]) // factor))
+        return output
+    
+    def close(self):
+        """Release the mapping and the decoded level"""
+        with self._lock:
+            self._level = None
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+    
+    def _raw_entries(self, image):
+        """Return the (extents, offset, rawmode, stride, orientation) of every stored block, or None if any is compressed"""
+        if self.mode not in ("1", "L", "LA", "P", "RGB", "RGBA", "CMYK") or not image.tile:
+            return None
+        
+        entries = []
+        for codec, extents, offset, args in image.tile:
+            if codec != "raw":
+                return None
+            rawmode, stride, orientation = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+            if not stride:
+                # Rows are packed: one row of rawmode gives their length
+                try:
+                    stride = len(Image.new(self.mode, (extents[2] - extents[0], 1)).tobytes("raw", rawmode))
+                except (ValueError, OSError):
+                    return None
+            entries.append((extents, offset, rawmode, stride, orientation or 1))
+        return entries
+    
+    def _read_rows(self, left, top, right, bottom):
+        """Return a box of the unturned source read from the mapped file, in the display mode"""
+        band = Image.new(self.mode, (right - left, bottom - top))
+        for (x0, y0, x1, y1), offset, rawmode, stride, orientation in self._entries:
+            column0, row0, column1, row1 = max(x0, left), max(y0, top), min(x1, right), min(y1, bottom)
+            if column0 >= column1 or row0 >= row1:
+                continue
+            # Bottom-up blocks (BMP) store their last row first
+            first_row = row0 - y0 if orientation > 0 else y1 - row1
+            start = offset + first_row * stride
+            data = self._map[start:start + (row1 - row0) * stride]
+            rows = Image.frombuffer(self.mode, (x1 - x0, row1 - row0), data, "raw", rawmode, stride, orientation)
+            band.paste(rows.crop((column0 - x0, 0, column1 - x0, row1 - row0)), (column0 - left, row0 - top))
+        
+        if self._palette is not None:
+            band.putpalette(self._palette)
+        mode = display_mode(self.mode)
+        return band if band.mode == mode else band.convert(mode)
+    
+    def _decoded_level(self, factor):
+        """Return the whole turned image decoded and shrunk by factor"""
+        with self._lock:
+            if self._level is None or self._level[0] != factor:
+                # Drop the previous level before decoding the next one
+                self._level = None
+                target_size = (-(-self.size[0] // factor), -(-self.size[1] // factor))
+                with Image.open(self.path) as image:
+                    if image.format == "JPEG":
+                        image.draft(image.mode, (-(-self.source_size[0] // factor), -(-self.source_size[1] // factor)))
+                    level = image.convert(display_mode(image.mode))
+                if self.rotation in ROTATIONS:
+                    level = level.transpose(ROTATIONS[self.rotation])
+                # What the JPEG draft left to shrink
+                remaining = max(1, round(factor * level.size[0] / self.size[0]))
+                if remaining > 1:
+                    level = level.reduce(remaining)
+                if level.size != target_size:
+                    level = level.resize(target_size, Image.Resampling.BOX)
+                self._level = (factor, level)
+            return self._level[1]
+
+
+class TiledImage:
+    """An image viewed zoomed in: tiles of TILE_SIZE displayed pixels decoded on demand.
+    
+    The zoom is a power-of-two reduction factor, 1 being 1:1. Tile (column, row) at
+    a factor covers TILE_SIZE * factor pixels each way of the image as it is shown,
+    turned by its rotation, and only that region of the file is decoded. Tiles are
+    kept in a TileCache under the file's size and mtime, so an edited file never
+    shows stale tiles.
+    
+    Args:
+        image_path (str): Path of the image file
+        rotation (int): Clockwise rotation the image is shown with (0, 90, 180, 270)
+        cache (TileCache): Cache of decoded tiles, optional
+    """
+    def __init__(self, image_path, rotation=0, cache=None):
+        self.path = image_path
+        self.rotation = rotation % 360
+        self.cache = cache
+        self.reader = RegionReader(image_path, self.rotation)
+        self.size = self.reader.size
+        self.identity = file_key(image_path)
+    
+    def scaled_size(self, factor):
+        """Return the size of the whole image at a reduction factor"""
+        return -(-self.size[0] // factor), -(-self.size[1] // factor)
+    
+    def grid(self, factor):
+        """Return the (columns, rows) of tiles at a reduction factor"""
+        width, height = self.scaled_size(factor)
+        return -(-width // TILE_SIZE), -(-height // TILE_SIZE)
+    
+    def factors(self, box):
+        """Return the zoom factors worth showing in box, from the first one larger than fitting the image down to 1:1"""
+        scale = min(box[0] / self.size[0], box[1] / self.size[1])
+        factor = 1
+        while 1 / (factor * 2) > scale:
+            factor *= 2
+        factors = [factor]
+        while factor > 1:
+            factor //= 2
+            factors.append(factor)
+        return factors
+    
+    def cached_tile(self, factor, column, row):
+        """Return the tile at (column, row) from the cache without decoding, or None"""
+        if self.cache is None:
+            return None
+        return self.cache.get((self.identity, self.rotation, factor, column, row))
+    
+    def tile(self, factor, column, row):
+        """Return the tile at (column, row) for a reduction factor, decoding its region on a cache miss"""
+        image = self.cached_tile(factor, column, row)
+        return image if image is not None else self.decode_tile(factor, column, row)
+    
+    def decode_tile(self, factor, column, row):
+        """Decode the tile at (column, row) for a reduction factor from the file and cache it"""
+        span = TILE_SIZE * factor
+        box = (column * span, row * span, min((column + 1) * span, self.size[0]), min((row + 1) * span, self.size[1]))
+        image = self.reader.region(box, factor)
+        if self.cache is not None:
+            self.cache.put((self.identity, self.rotation, factor, column, row), image)
+        return image
+    
+    def close(self):
+        """Release the file mapping and the decoded level"""
+        self.reader.close()
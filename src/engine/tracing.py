@@ -0,0 +1,135 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NullSpan:
+    """Span handed out while tracing is disabled; entering and leaving it does nothing"""
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "category", "args", "start")
+    
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+    
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.tracer.complete(self.name, self.start, time.perf_counter_ns(), self.category, self.args)
+        return False
+
+
+class Tracer:
+    """Records timed spans in memory and exports them in the Chrome trace event format.
+    
+    Tracing is off until enable() is called. While it is off, span() returns a
+    shared no-op context manager and the other recording methods return at once, so
+    instrumented code pays one attribute check per span. Recorded events go to a
+    bounded buffer; the oldest are dropped once it is full. The exported file opens
+    in chrome://tracing and in Perfetto (ui.perfetto.dev).
+    
+    Args:
+        max_events (int): Number of events kept in memory
+    """
+    DEFAULT_MAX_EVENTS = 1_000_000
+    
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        self.enabled = False
+        self._events = deque(maxlen=max_events)
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+        self._thread_names = {}
+        self._ids = itertools.count(1)
+    
+    def enable(self):
+        """Start recording"""
+        self.enabled = True
+    
+    def disable(self):
+        """Stop recording; events already recorded are kept"""
+        self.enabled = False
+    
+    def clear(self):
+        """Drop the recorded events"""
+        self._events.clear()
+        self._thread_names.clear()
+    
+    @staticmethod
+    def now():
+        """Timestamp in the tracer's clock, for complete() and interval()"""
+        return time.perf_counter_ns()
+    
+    def span(self, name, category="engine", **args):
+        """Return a context manager recording the time spent in its block as a span"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+    
+    def complete(self, name, start, end, category="engine", args=None):
+        """Record a span of the calling thread from two now() timestamps"""
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        self._thread_names[thread.ident] = thread.name
+        self._events.append({
+            "name": name, "cat": category, "ph": "X", "pid": self._pid, "tid": thread.ident,
+            "ts": (start - self._origin) / 1000, "dur": (end - start) / 1000, "args": args or {},
+        })
+    
+    def interval(self, name, start, end, category="engine", args=None):
+        """Record a span that may overlap others on the same thread, such as a job on a worker pool"""
+        if not self.enabled:
+            return
+        event_id = next(self._ids)
+        thread = threading.current_thread()
+        self._thread_names[thread.ident] = thread.name
+        common = {"name": name, "cat": category, "pid": self._pid, "tid": thread.ident, "id": event_id}
+        self._events.append({**common, "ph": "b", "ts": (start - self._origin) / 1000, "args": args or {}})
+        self._events.append({**common, "ph": "e", "ts": (end - self._origin) / 1000})
+    
+    def counter(self, name, category="engine", **values):
+        """Record the current values of a counter track, such as cache hits"""
+        if not self.enabled:
+            return
+        self._events.append({
+            "name": name, "cat": category, "ph": "C", "pid": self._pid, "tid": threading.get_ident(),
+            "ts": (time.perf_counter_ns() - self._origin) / 1000, "args": values,
+        })
+    
+    def events(self):
+        """Return a copy of the recorded events"""
+        return list(self._events)
+    
+    def export(self, path):
+        """Write the recorded events to a Chrome trace JSON file"""
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": thread_id, "args": {"name": thread_name}}
+            for thread_id, thread_name in list(self._thread_names.items())
+        ]
+        metadata.append({"name": "process_name", "ph": "M", "pid": self._pid, "args": {"name": "GalleryCleaner"}})
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": metadata + self.events(), "displayTimeUnit": "ms"}, file)
+
+
+# Process-wide tracer the engine and the viewer record into
+tracer = Tracer()
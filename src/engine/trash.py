@@ -0,0 +1,450 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import unquote
+
+from .paths import user_state_dir
+
+
+class RestoreError(OSError):
+    """Raised when a trashed file can't be found in or moved back from the trash"""
+
+
+def move_to_trash(file_path):
+    """Move a file to the system trash"""
+    # Imported on first deletion; on Windows and macOS it loads the platform bindings
+    import send2trash
+    send2trash.send2trash(file_path)
+
+
+def move_many_to_trash(file_paths):
+    """Move several files to the system trash in one call"""
+    import send2trash
+    send2trash.send2trash(list(file_paths))
+
+
+def file_identity(file_path):
+    """Return the (size, mtime_ns) of a file, or None if it can't be read"""
+    try:
+        stats = os.stat(file_path)
+    except OSError:
+        return None
+    return stats.st_size, stats.st_mtime_ns
+
+
+def restore_from_trash(original_path, identity=None):
+    """Move the most recently trashed file that came from original_path back to it.
+    
+    Supports the freedesktop.org trash (Linux and BSD), the macOS user trash and the
+    Windows Recycle Bin. Raises RestoreError if the file can't be restored.
+    
+    The macOS trash keeps no record of where a file came from and renames a file whose
+    name is taken ("name 2.jpg"), so there the file is recognized by identity, the
+    (size, mtime_ns) it had when it was trashed; without one nothing is restored.
+    """
+    original_path = os.path.abspath(original_path)
+    if os.path.lexists(original_path):
+        raise RestoreError(f"{original_path} already exists")
+    
+    if sys.platform == "win32":
+        trashed_path, metadata_path = _find_in_recycle_bin(original_path)
+    elif sys.platform == "darwin":
+        trashed_path = _find_in_macos_trash(original_path, identity)
+        metadata_path = None
+    else:
+        trashed_path, metadata_path = _find_in_freedesktop_trash(original_path)
+    
+    try:
+        shutil.move(trashed_path, original_path)
+    except OSError as e:
+        raise RestoreError(f"Could not restore {original_path}: {e}")
+    if metadata_path is not None:
+        try:
+            os.remove(metadata_path)
+        except OSError:
+            pass
+
+
+def _find_in_freedesktop_trash(original_path):
+    """Return (trashed file, .trashinfo file) of the latest trashing of original_path"""
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    trash_dirs = [(os.path.join(data_home, "Trash"), None)]
+    
+    # Files on other volumes go to a trash at the top of that volume
+    topdir = os.path.dirname(original_path)
+    while not os.path.ismount(topdir):
+        topdir = os.path.dirname(topdir)
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    trash_dirs.append((os.path.join(topdir, ".Trash", str(uid)), topdir))
+    trash_dirs.append((os.path.join(topdir, f".Trash-{uid}"), topdir))
+    
+    latest = None
+    for trash_dir, volume_root in trash_dirs:
+        info_dir = os.path.join(trash_dir, "info")
+        try:
+            entries = list(os.scandir(info_dir))
+        except OSError:
+            continue
+        
+        for entry in entries:
+            if not entry.name.endswith(".trashinfo"):
+                continue
+            fields = {}
+            try:
+                with open(entry.path, encoding="utf-8") as info:
+                    for line in info:
+                        name, _, value = line.strip().partition("=")
+                        fields[name] = value
+            except (OSError, UnicodeDecodeError):
+                continue
+            
+            # Paths in a volume trash are relative to the volume root
+            trashed_from = unquote(fields.get("Path", ""))
+            if volume_root is not None and not os.path.isabs(trashed_from):
+                trashed_from = os.path.join(volume_root, trashed_from)
+            if trashed_from != original_path:
+                continue
+            
+            deleted_at = fields.get("DeletionDate", "")
+            if latest is None or deleted_at > latest[0]:
+                trashed_path = os.path.join(trash_dir, "files", entry.name[:-len(".trashinfo")])
+                latest = (deleted_at, trashed_path, entry.path)
+    
+    if latest is None:
+        raise RestoreError(f"{os.path.basename(original_path)} is not in the trash")
+    return latest[1], latest[2]
+
+
+def _find_in_macos_trash(original_path, identity):
+    """Return the file in ~/.Trash named after original_path, possibly renamed, whose size and mtime match identity"""
+    name = os.path.basename(original_path)
+    if identity is None:
+        raise RestoreError(f"Can't tell which file in the trash is {name}")
+    
+    stem, extension = os.path.splitext(name)
+    trash_dir = os.path.join(os.path.expanduser("~"), ".Trash")
+    try:
+        entries = list(os.scandir(trash_dir))
+    except OSError:
+        entries = []
+    for entry in entries:
+        # Renamed files keep the stem and the extension: "name 2.jpg", "name 10.23.45.jpg"
+        if entry.name != name and not (entry.name.startswith(stem + " ") and entry.name.endswith(extension)):
+            continue
+        if file_identity(entry.path) == tuple(identity):
+            return entry.path
+    raise RestoreError(f"{name} is not in the trash")
+
+
+def _find_in_recycle_bin(original_path):
+    """Return ($R data file, $I metadata file) of the latest recycling of original_path"""
+    drive = os.path.splitdrive(original_path)[0]
+    recycle_bin = os.path.join(drive + os.sep, "$Recycle.Bin")
+    target = os.path.normcase(original_path)
+    
+    latest = None
+    try:
+        user_bins = [entry.path for entry in os.scandir(recycle_bin) if entry.is_dir()]
+    except OSError:
+        user_bins = []
+    
+    for user_bin in user_bins:
+        try:
+            entries = list(os.scandir(user_bin))
+        except OSError:
+            continue
+        
+        for entry in entries:
+            if not entry.name.startswith("$I"):
+                continue
+            try:
+                with open(entry.path, "rb") as info:
+                    data = info.read()
+            except OSError:
+                continue
+            
+            # $I layout: version, original size, deletion FILETIME, then the original path
+            version = int.from_bytes(data[0:8], "little")
+            deleted_at = int.from_bytes(data[16:24], "little")
+            if version == 1:
+                trashed_from = data[24:24 + 520].decode("utf-16-le", "ignore").split("\x00", 1)[0]
+            else:
+                length = int.from_bytes(data[24:28], "little")
+                trashed_from = data[28:28 + length * 2].decode("utf-16-le", "ignore").rstrip("\x00")
+            
+            if os.path.normcase(trashed_from) == target and (latest is None or deleted_at > latest[0]):
+                latest = (deleted_at, os.path.join(user_bin, "$R" + entry.name[2:]), entry.path)
+    
+    if latest is None:
+        raise RestoreError(f"{os.path.basename(original_path)} is not in the Recycle Bin")
+    return latest[1], latest[2]
+
+
+class TrashOperation:
+    """One file sent to the trash, with the list position it was removed from"""
+    __slots__ = ("id", "path", "index", "identity", "status", "error", "done", "restore")
+    
+    # Status values
+    QUEUED = "queued"
+    TRASHED = "trashed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    RESTORED = "restored"
+    
+    def __init__(self, operation_id, path, index):
+        self.id = operation_id
+        self.path = path
+        self.index = index
+        # (size, mtime_ns) of the file just before it was moved, to recognize it in the trash
+        self.identity = None
+        self.status = self.QUEUED
+        self.error = None
+        self.done = threading.Event()
+        # Future of the undo, set by TrashQueue.undo()
+        self.restore = None
+
+
+class TrashJournal:
+    """Append-only JSON Lines record of trash operations, fsynced on every write.
+    
+    Each line is {"id", "event", "path", "index", "time"} with event one of the
+    TrashOperation statuses. An operation whose last event is "queued" was never
+    carried out, for example because the application crashed.
+    
+    Args:
+        path (str): Journal file, by default trash-journal.jsonl in the user state directory
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(user_state_dir(), "trash-journal.jsonl")
+        self._lock = threading.Lock()
+        self._file = None
+    
+    def unfinished(self):
+        """Return the (id, path, index) of every operation queued but never completed"""
+        pending = {}
+        try:
+            with open(self.path, encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    if record.get("event") == TrashOperation.QUEUED:
+                        pending[record["id"]] = (record["id"], record["path"], record.get("index"))
+                    else:
+                        pending.pop(record.get("id"), None)
+        except OSError:
+            pass
+        return list(pending.values())
+    
+    def open(self, carried_over=()):
+        """Start a fresh journal, rewriting the queued records of operations carried over"""
+        with self._lock:
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as journal:
+                for operation in carried_over:
+                    journal.write(self._line(operation.id, TrashOperation.QUEUED, operation.path, operation.index))
+                journal.flush()
+                os.fsync(journal.fileno())
+            os.replace(temporary_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+    
+    def record(self, operation, event):
+        """Append an event for an operation and force it to disk"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(self._line(operation.id, event, operation.path, operation.index))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    
+    @staticmethod
+    def _line(operation_id, event, path, index):
+        return json.dumps({"id": operation_id, "event": event, "path": path, "index": index, "time": time.time()}) + "\n"
+
+
+class TrashQueue:
+    """Moves files to the trash on a background thread, with a multi-level undo.
+    
+    enqueue() returns immediately. The worker collects everything queued so far and
+    sends it to the trash grouped by directory, one call per directory. Every
+    operation is journaled, and operations left unfinished by a crash are carried
+    out again when the next queue opens the journal.
+    
+    Args:
+        journal (TrashJournal): Journal to record operations in, or None to skip journaling
+    """
+    def __init__(self, journal=None):
+        self.journal = journal
+        self._condition = threading.Condition()
+        self._pending = []
+        self._restores = []
+        self._undo_stack = []
+        self._failures = []
+        self._busy = False
+        self._closed = False
+        self._next_id = int(time.time() * 1000)
+        
+        recovered = []
+        if journal is not None:
+            for operation_id, path, index in journal.unfinished():
+                if os.path.lexists(path):
+                    recovered.append(TrashOperation(operation_id, path, index))
+            journal.open(recovered)
+        # Carried out again like new deletions, so they can be undone the same way
+        self._pending.extend(recovered)
+        self._undo_stack.extend(recovered)
+        
+        self._worker = threading.Thread(target=self._run, name="trash", daemon=True)
+        self._worker.start()
+    
+    @property
+    def can_undo(self):
+        with self._condition:
+            return bool(self._undo_stack)
+    
+    def enqueue(self, path, index=None):
+        """Queue a file for trashing and return its TrashOperation"""
+        with self._condition:
+            self._next_id += 1
+            operation = TrashOperation(self._next_id, path, index)
+            if self.journal is not None:
+                self.journal.record(operation, TrashOperation.QUEUED)
+            self._pending.append(operation)
+            self._undo_stack.append(operation)
+            self._condition.notify()
+        return operation
+    
+    def undo(self):
+        """Undo the latest operation still on the undo stack and return it, or None.
+        
+        A queued operation is simply cancelled; a file already handed to the worker
+        is moved back from the trash on the worker, after its move. Either way the
+        operation's restore Future is resolved once the file is back in place, or
+        with RestoreError if it can't be, leaving the operation on the stack.
+        """
+        with self._condition:
+            if not self._undo_stack:
+                return None
+            operation = self._undo_stack.pop()
+            operation.restore = Future()
+            if operation in self._pending:
+                self._pending.remove(operation)
+                self._finish(operation, TrashOperation.CANCELLED)
+                operation.restore.set_result(operation.path)
+            else:
+                self._restores.append(operation)
+                self._condition.notify()
+        return operation
+    
+    def take_failures(self):
+        """Return the operations that failed since the last call"""
+        with self._condition:
+            failures, self._failures = self._failures, []
+        return failures
+    
+    def flush(self, timeout=None):
+        """Wait until every queued operation has been carried out. Returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._restores or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+    
+    def close(self, timeout=10):
+        """Finish the queued operations (up to timeout seconds) and stop the worker.
+        
+        Anything still queued afterwards stays in the journal and is carried out next time.
+        """
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self.journal is not None:
+            self.journal.close()
+    
+    def _finish(self, operation, status, error=None):
+        operation.status = status
+        operation.error = error
+        if self.journal is not None:
+            self.journal.record(operation, status)
+        operation.done.set()
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._restores and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                batch, self._pending = self._pending, []
+                restores, self._restores = self._restores, []
+                self._busy = True
+            
+            try:
+                # Undone before anything queued after them, which may be the same file again
+                for operation in restores:
+                    self._restore(operation)
+                by_directory = {}
+                for operation in batch:
+                    by_directory.setdefault(os.path.dirname(operation.path), []).append(operation)
+                for operations in by_directory.values():
+                    self._trash_group(operations)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+    
+    def _restore(self, operation):
+        if operation.status != TrashOperation.TRASHED:
+            # Never moved; a failed one is already reported by take_failures()
+            operation.restore.set_result(operation.path)
+            return
+        try:
+            restore_from_trash(operation.path, operation.identity)
+        except RestoreError as e:
+            with self._condition:
+                self._undo_stack.append(operation)
+            operation.restore.set_exception(e)
+            return
+        self._finish(operation, TrashOperation.RESTORED)
+        operation.restore.set_result(operation.path)
+    
+    def _trash_group(self, operations):
+        for operation in operations:
+            operation.identity = file_identity(operation.path)
+        try:
+            move_many_to_trash(operation.path for operation in operations)
+        except Exception:
+            # Retry one by one so a single bad file doesn't fail the whole group
+            for operation in operations:
+                if not os.path.lexists(operation.path):
+                    self._finish(operation, TrashOperation.TRASHED)
+                    continue
+                try:
+                    move_to_trash(operation.path)
+                except Exception as e:
+                    self._finish(operation, TrashOperation.FAILED, str(e))
+                    with self._condition:
+                        self._failures.append(operation)
+                        if operation in self._undo_stack:
+                            self._undo_stack.remove(operation)
+                else:
+                    self._finish(operation, TrashOperation.TRASHED)
+        else:
+            for operation in operations:
+                self._finish(operation, TrashOperation.TRASHED)
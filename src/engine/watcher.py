@@ -0,0 +1,77 @@
+import os
+import threading
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class TreeWatcher(FileSystemEventHandler):
+    """Collects the directories and files changed under a root from native filesystem events.
+    
+    Uses watchdog (inotify on Linux, FSEvents on macOS, ReadDirectoryChangesW on
+    Windows) when it is installed; otherwise `available` is False and callers fall
+    back to mtime-pruned rescans.
+    """
+    available = Observer is not None
+    
+    # Events changing the listing of the parent directory, and events changing a file's contents;
+    # others, such as opened and closed_no_write on inotify, come from mere reads and are ignored
+    LISTING_EVENTS = frozenset(("created", "deleted", "moved"))
+    CONTENT_EVENTS = frozenset(("modified", "closed"))
+    
+    def __init__(self, root, recursive=False):
+        self.root = root
+        self.recursive = recursive
+        self._lock = threading.Lock()
+        self._changed_directories = set()
+        self._changed_files = set()
+        self._observer = None
+    
+    def start(self):
+        """Start watching. Returns False when watching is not available"""
+        if not self.available:
+            return False
+        try:
+            self._observer = Observer()
+            self._observer.schedule(self, self.root, recursive=self.recursive)
+            self._observer.daemon = True
+            self._observer.start()
+        except Exception:
+            self._observer = None
+            return False
+        return True
+    
+    def stop(self):
+        """Stop watching"""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+    
+    def take_changes(self):
+        """Return and reset the (directories, files) changed since the last call"""
+        with self._lock:
+            changes = (self._changed_directories, self._changed_files)
+            self._changed_directories = set()
+            self._changed_files = set()
+        return changes
+    
+    def on_any_event(self, event):
+        if event.event_type not in self.LISTING_EVENTS and event.event_type not in self.CONTENT_EVENTS:
+            return
+        paths = [event.src_path]
+        if getattr(event, "dest_path", None):
+            paths.append(event.dest_path)
+        
+        with self._lock:
+            for path in paths:
+                path = os.fsdecode(path)
+                if event.event_type in self.LISTING_EVENTS:
+                    self._changed_directories.add(os.path.dirname(path))
+                    if event.is_directory:
+                        self._changed_directories.add(path)
+                elif not event.is_directory:
+                    self._changed_files.add(path)
@@ -1,13 +1,19 @@
+import time
+
+# Taken before the other imports, so the startup report includes them
+IMPORT_STARTED = time.perf_counter_ns()
+
 import customtkinter as ctk
 import sys
 import threading
-import time
 import os
-from datetime import datetime
+from collections import OrderedDict
 from PIL import Image, ImageTk
-import send2trash
 import tkinter as tk
 
+# Light on purpose: the engine's decoder and stores, numpy and send2trash are imported once the prompt is painted
+from engine import TILE_SIZE, CallQueue, is_image_file, tracer
+
 
 class ToolTip:
     """Custom tooltip class for customtkinter widgets"""
@@ -48,8 +54,459 @@ class ToolTip:
             tw.destroy()
 
 
+class IconCache:
+    """Button icons decoded once from resources/images and shared by every widget using them.
+    
+    The directory is resolved from this file, not the working directory, so the icons
+    load wherever the application is started from. Each file is decoded a single time;
+    the CTkImage built for a (name, size, mirror) is cached too, with the same image
+    for the light and the dark theme. An icon that can't be loaded is cached as None
+    and the caller falls back to text.
+    
+    Args:
+        directory (str): Directory of the .ico files
+    """
+    DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "resources", "images")
+    
+    def __init__(self, directory=DIRECTORY):
+        self.directory = directory
+        self._images = {}
+        self._icons = {}
+    
+    def get(self, name, size, mirror=False):
+        """Return the CTkImage of an icon at size, flipped left to right if mirror is set, or None"""
+        key = (name, size, mirror)
+        if key not in self._icons:
+            image = self.load(name)
+            if image is not None and mirror:
+                image = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+            self._icons[key] = None if image is None else ctk.CTkImage(light_image=image, dark_image=image, size=size)
+        return self._icons[key]
+    
+    def load(self, name):
+        """Return the decoded RGBA image of an icon file, or None if it can't be read"""
+        if name not in self._images:
+            try:
+                with Image.open(os.path.join(self.directory, name)) as image:
+                    self._images[name] = image.convert("RGBA")
+            except OSError:
+                self._images[name] = None
+        return self._images[name]
+
+
+class ThumbnailGrid(ctk.CTkFrame):
+    """Contact sheet of the engine's image list that only draws the rows in view.
+    
+    The canvas holds a pool of cells covering the view and one more row. Scrolling
+    moves the pool over other images instead of creating items, so a list of any
+    length costs the same to scroll. Thumbnails come from the engine's preview cache
+    or its worker pool, the cells in view first, then a page ahead and a page behind,
+    and at most PHOTO_PAGES pages of PhotoImages are kept.
+    
+    The focused cell is the engine's cursor. The selection is a set of paths: Space
+    toggles the focused image, Shift with the arrow keys or a click selects a range
+    and Ctrl+A selects every image.
+    
+    Args:
+        parent (widget): Widget the grid is placed in
+        engine (Engine): Engine owning the image list
+        post (callable): Runs a call on the UI thread, for thumbnails decoded in the background
+        on_open (callable): Called to show the focused image in the single view
+        on_delete (callable): Called with the paths to move to the trash
+    """
+    # Side of a cell in pixels, and the box its thumbnail fits in
+    CELL_SIZE = 180
+    THUMBNAIL_BOX = (160, 160)
+    
+    # Pages of thumbnails kept as PhotoImages, counting the one in view
+    PHOTO_PAGES = 3
+    
+    # Pixels scrolled by one notch of the mouse wheel
+    WHEEL_STEP = CELL_SIZE // 2
+    
+    def __init__(self, parent, engine, post, on_open, on_delete):
+        super().__init__(parent)
+        self.engine = engine
+        self.post = post
+        self.on_open = on_open
+        self.on_delete = on_delete
+        
+        # Selected paths, and the index a Shift selection extends from
+        self.selection = set()
+        self.anchor = None
+        
+        # Scroll offset in pixels, columns of the last layout and whether the next one scrolls to the cursor
+        self.offset = 0
+        self.columns = 1
+        self.follow = True
+        
+        # Recycled cells, PhotoImages by (path, rotation) in LRU order, and the pending thumbnails by path
+        self.cells = []
+        self.photos = OrderedDict()
+        self.pending = {}
+        self.requested = None
+        
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        
+        self.canvas = tk.Canvas(self, background="#1a1a1a", highlightthickness=0, takefocus=1)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.status_label = ctk.CTkLabel(self, text="", font=("Arial", 12, "bold"), text_color="lightgray")
+        self.status_label.grid(row=1, column=0, columnspan=2, pady=(4, 4))
+        
+        self.canvas.bind("<Configure>", lambda event: self.render())
+        
+        # Keys bound here return "break", so the viewer's own bindings for them don't run
+        moves = {
+            "Left": lambda: -1,
+            "Right": lambda: 1,
+            "Up": lambda: -self.columns,
+            "Down": lambda: self.columns,
+            "Prior": lambda: -self.page_size(),
+            "Next": lambda: self.page_size(),
+            "Home": lambda: -len(self.engine.cursor),
+            "End": lambda: len(self.engine.cursor),
+        }
+        for keysym, step in moves.items():
+            self.canvas.bind(f"<{keysym}>", lambda event, step=step: self.move_focus(step()))
+            self.canvas.bind(f"<Shift-{keysym}>", lambda event, step=step: self.move_focus(step(), extend=True))
+        self.canvas.bind("<space>", self.on_key_toggle)
+        self.canvas.bind("<Control-a>", self.on_key_select_all)
+        self.canvas.bind("<Control-A>", self.on_key_select_all)
+        for sequence in ("<Delete>", "<Key-s>", "<Key-S>"):
+            self.canvas.bind(sequence, self.on_key_delete)
+        self.canvas.bind("<Return>", self.on_key_open)
+        self.canvas.bind("<KP_Enter>", self.on_key_open)
+        self.canvas.bind("<Escape>", self.on_key_escape)
+        
+        self.canvas.bind("<ButtonPress-1>", self.on_click)
+        self.canvas.bind("<Control-ButtonPress-1>", lambda event: self.on_click(event, toggle=True))
+        self.canvas.bind("<Shift-ButtonPress-1>", lambda event: self.on_click(event, extend=True))
+        self.canvas.bind("<Double-Button-1>", self.on_key_open)
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", self.on_wheel)
+        self.canvas.bind("<Button-5>", self.on_wheel)
+    
+    def open(self):
+        """Take the keyboard focus and show the rows around the cursor"""
+        # The selection is kept while the single view is shown, less what left the list meanwhile
+        images = self.engine.cursor.images
+        self.selection = {image_path for image_path in self.selection if image_path in images}
+        self.canvas.focus_set()
+        self.show_cursor()
+    
+    def close(self):
+        """Cancel the pending thumbnails and release the PhotoImages"""
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.requested = None
+        self.engine.request_thumbnails([], self.THUMBNAIL_BOX)
+        for cell in self.cells:
+            self.canvas.itemconfigure(cell["image"], image="")
+            cell["key"] = None
+            cell["photo"] = None
+        self.photos.clear()
+    
+    def show_cursor(self):
+        """Render the grid scrolled so the cursor's cell is in view"""
+        self.follow = True
+        self.render()
+    
+    def marked(self):
+        """Return the selected paths in list order, or the focused path when nothing is selected"""
+        images = self.engine.cursor.images
+        selected = [image_path for image_path in self.selection if image_path in images]
+        if not selected:
+            current_image_path = self.engine.cursor.current
+            return [] if current_image_path is None else [current_image_path]
+        return sorted(selected, key=images.index)
+    
+    def page_size(self):
+        """Return the number of images in a page of full rows"""
+        return max(1, self.canvas.winfo_height() // self.CELL_SIZE) * self.columns
+    
+    def on_scrollbar(self, action, value, units=None):
+        """Scroll from the scrollbar: dragged to a fraction, or stepped by rows or pages"""
+        total_height = -(-len(self.engine.cursor) // self.columns) * self.CELL_SIZE
+        if action == "moveto":
+            self.offset = round(float(value) * total_height)
+        elif units == "pages":
+            self.offset += int(value) * self.canvas.winfo_height()
+        else:
+            self.offset += int(value) * self.CELL_SIZE
+        self.render()
+    
+    def on_wheel(self, event):
+        """Scroll with the mouse wheel"""
+        # X11 reports the wheel as buttons 4 and 5, Windows and macOS as a signed delta
+        direction = -1 if event.num == 4 or getattr(event, 'delta', 0) > 0 else 1
+        self.offset += direction * self.WHEEL_STEP
+        self.render()
+        return "break"
+    
+    def on_click(self, event, toggle=False, extend=False):
+        """Focus the clicked cell, toggling it with Ctrl or selecting the range to it with Shift"""
+        self.canvas.focus_set()
+        index = self.index_at(event.x, event.y)
+        if index is None:
+            return "break"
+        if toggle:
+            self.engine.cursor.move_to(index)
+            self.anchor = index
+            self.on_key_toggle()
+            return "break"
+        return self.move_focus(index - self.engine.cursor.index, extend)
+    
+    def on_key_toggle(self, event=None):
+        """Select the focused image, or unselect it"""
+        image_path = self.engine.cursor.current
+        if image_path is not None:
+            self.selection.symmetric_difference_update((image_path,))
+            self.render()
+        return "break"
+    
+    def on_key_select_all(self, event=None):
+        """Select every image in the list"""
+        self.selection = set(self.engine.cursor.images)
+        self.render()
+        return "break"
+    
+    def on_key_delete(self, event=None):
+        """Move the selected images, or the focused one, to the trash in one go"""
+        image_paths = self.marked()
+        if image_paths:
+            self.selection.clear()
+            self.anchor = None
+            self.on_delete(image_paths)
+        return "break"
+    
+    def on_key_open(self, event=None):
+        """Show the focused image in the single view"""
+        if self.engine.cursor:
+            self.on_open()
+        return "break"
+    
+    def on_key_escape(self, event=None):
+        """Clear the selection, or go back to the single view when nothing is selected"""
+        if self.selection:
+            self.selection.clear()
+            self.render()
+            return "break"
+        return self.on_key_open()
+    
+    def move_focus(self, step, extend=False):
+        """Move the cursor by step cells, selecting the range from the anchor to it when extend is set"""
+        cursor = self.engine.cursor
+        if not cursor:
+            return "break"
+        start_index = cursor.index
+        cursor.move_to(cursor.index + step)
+        if extend:
+            if self.anchor is None:
+                self.anchor = start_index
+            first_index = min(self.anchor, cursor.index)
+            self.selection = set(cursor.images.iter_from(first_index, abs(cursor.index - self.anchor) + 1))
+        else:
+            self.anchor = cursor.index
+        self.show_cursor()
+        return "break"
+    
+    def index_at(self, x, y):
+        """Return the index of the image under a point of the canvas, or None"""
+        column = (x - self.margin()) // self.CELL_SIZE
+        if not 0 <= column < self.columns:
+            return None
+        index = (y + self.offset) // self.CELL_SIZE * self.columns + column
+        return index if index < len(self.engine.cursor) else None
+    
+    def margin(self):
+        """Return the left margin centering the columns in the canvas"""
+        return (self.canvas.winfo_width() - self.columns * self.CELL_SIZE) // 2
+    
+    def ensure_cells(self, count):
+        """Grow or shrink the cell pool to count cells"""
+        while len(self.cells) < count:
+            self.cells.append({
+                "frame": self.canvas.create_rectangle(0, 0, 0, 0, width=0, state="hidden"),
+                "image": self.canvas.create_image(0, 0, state="hidden"),
+                "key": None,
+                "photo": None,
+            })
+        while len(self.cells) > count:
+            cell = self.cells.pop()
+            self.canvas.delete(cell["frame"], cell["image"])
+    
+    def render(self):
+        """Lay the cell pool over the rows in view and request the thumbnails it is missing"""
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        # Not laid out yet: <Configure> renders once it is
+        if width <= 1 or height <= 1:
+            return
+        
+        cursor = self.engine.cursor
+        cell_size = self.CELL_SIZE
+        self.columns = max(1, width // cell_size)
+        total_height = -(-len(cursor) // self.columns) * cell_size
+        if self.follow and cursor:
+            # Scroll just enough for the cursor's row to be in view
+            top = cursor.index // self.columns * cell_size
+            self.offset = min(self.offset, top)
+            self.offset = max(self.offset, top + cell_size - height)
+            self.follow = False
+        self.offset = min(max(self.offset, 0), max(0, total_height - height))
+        
+        with tracer.span("render grid", "ui"):
+            self.ensure_cells((height // cell_size + 2) * self.columns)
+            first_index = self.offset // cell_size * self.columns
+            image_paths = list(cursor.images.iter_from(first_index, len(self.cells)))
+            margin = self.margin()
+            missing = []
+            for slot, cell in enumerate(self.cells):
+                if slot >= len(image_paths):
+                    self.canvas.itemconfigure(cell["frame"], state="hidden")
+                    self.canvas.itemconfigure(cell["image"], state="hidden")
+                    continue
+                
+                index = first_index + slot
+                image_path = image_paths[slot]
+                row, column = divmod(index, self.columns)
+                x = margin + column * cell_size
+                y = row * cell_size - self.offset
+                self.canvas.coords(cell["frame"], x + 4, y + 4, x + cell_size - 4, y + cell_size - 4)
+                self.canvas.coords(cell["image"], x + cell_size // 2, y + cell_size // 2)
+                focused = index == cursor.index
+                self.canvas.itemconfigure(
+                    cell["frame"],
+                    state="normal",
+                    fill="#1F6AA5" if image_path in self.selection else "#2b2b2b",
+                    outline="white" if focused else "",
+                    width=3 if focused else 0
+                )
+                self.canvas.itemconfigure(cell["image"], state="normal")
+                
+                key = (image_path, self.engine.rotation(image_path))
+                if cell["key"] != key:
+                    cell["key"] = key
+                    cell["photo"] = self.photo(key)
+                    self.canvas.itemconfigure(cell["image"], image=cell["photo"] or "")
+                if cell["photo"] is None:
+                    missing.append(image_path)
+            
+            self.request_thumbnails(missing, first_index)
+        
+        if total_height > height:
+            self.scrollbar.set(self.offset / total_height, (self.offset + height) / total_height)
+        else:
+            self.scrollbar.set(0, 1)
+        self.update_status()
+    
+    def update_status(self):
+        """Show the cursor position, the number of selected images and the focused file name"""
+        cursor = self.engine.cursor
+        if not cursor:
+            self.status_label.configure(text="")
+            return
+        total_text = f"{len(cursor)}+" if self.engine.scanning else f"{len(cursor)}"
+        status_text = f"{cursor.index + 1} of {total_text}"
+        if self.selection:
+            status_text = f"{status_text} • {len(self.selection)} selected"
+        self.status_label.configure(text=f"{status_text} • {os.path.basename(cursor.current)}")
+    
+    def photo(self, key):
+        """Return the PhotoImage of a thumbnail from the kept ones or the preview cache, or None"""
+        photo = self.photos.get(key)
+        if photo is not None:
+            self.photos.move_to_end(key)
+            return photo
+        image = self.engine.cached_preview(key[0], self.THUMBNAIL_BOX, key[1])
+        return None if image is None else self.keep(key, image)
+    
+    def keep(self, key, image):
+        """Make a PhotoImage of a thumbnail and keep it, forgetting the least recently shown beyond PHOTO_PAGES pages"""
+        with tracer.span("PhotoImage", "ui", size=image.size):
+            photo = ImageTk.PhotoImage(image)
+        self.photos[key] = photo
+        # Cells hold their own reference, so a thumbnail in view stays drawn
+        while len(self.photos) > self.PHOTO_PAGES * max(1, len(self.cells)):
+            self.photos.popitem(last=False)
+        return photo
+    
+    def request_thumbnails(self, missing, first_index):
+        """Ask the engine for the thumbnails missing in view, then for the pages ahead and behind"""
+        images = self.engine.cursor.images
+        page = len(self.cells)
+        ahead = images.iter_from(first_index + page, page)
+        behind = images.iter_from(max(0, first_index - page), min(page, first_index))
+        image_paths = missing + [
+            image_path for image_path in (*ahead, *behind)
+            if (image_path, self.engine.rotation(image_path)) not in self.photos
+        ]
+        # Scrolling within the same rows asks for the same thumbnails
+        if image_paths == self.requested:
+            return
+        self.requested = image_paths
+        
+        futures = self.engine.request_thumbnails(image_paths, self.THUMBNAIL_BOX)
+        for image_path, future in futures.items():
+            if self.pending.get(image_path) is not future:
+                future.add_done_callback(
+                    lambda future, image_path=image_path: self.post(self.show_thumbnail, image_path, future)
+                )
+        self.pending = futures
+    
+    def show_thumbnail(self, image_path, future):
+        """Draw a thumbnail decoded by the worker pool in the cell showing it, if any. Runs on the UI thread"""
+        if self.pending.get(image_path) is not future:
+            return
+        del self.pending[image_path]
+        if future.cancelled():
+            return
+        
+        image = future.result()
+        if image is None:
+            # Undecodable: a card naming the format, kept like a thumbnail so it is not asked for again
+            image = self.engine.placeholder(image_path, self.THUMBNAIL_BOX)
+        key = (image_path, self.engine.rotation(image_path))
+        photo = self.keep(key, image)
+        for cell in self.cells:
+            if cell["key"] == key:
+                cell["photo"] = photo
+                self.canvas.itemconfigure(cell["image"], image=photo)
+
+
 class App(ctk.CTk):
+    # Milliseconds between two checks for newly scanned images
+    SCAN_POLL_INTERVAL = 50
+    
+    # Milliseconds between two runs of the calls posted to the UI thread by background work
+    UI_DRAIN_INTERVAL = 10
+    
+    # Milliseconds between two checks for failed background deletions
+    TRASH_POLL_INTERVAL = 500
+    
+    # Milliseconds between two checks for changes reported by the filesystem watcher
+    WATCH_POLL_INTERVAL = 1000
+    
+    # Milliseconds between two progress updates of a duplicate search or quality scoring
+    TASK_POLL_INTERVAL = 200
+    
+    # Milliseconds between two saves of the position in the open directory
+    SESSION_SAVE_INTERVAL = 5000
+    
+    # Milliseconds the window size must stay still before the shown image is refitted to it
+    RESIZE_DEBOUNCE_INTERVAL = 150
+    
+    # Environment variables: a file to write a Chrome trace to on exit, showing the latency HUD at start,
+    # and printing the startup timings
+    TRACE_ENV = "GALLERYCLEANER_TRACE"
+    HUD_ENV = "GALLERYCLEANER_HUD"
+    STARTUP_ENV = "GALLERYCLEANER_STARTUP"
+    
     def __init__(self):
+        self.init_started = tracer.now()
         super().__init__()
         
         # Configure window
@@ -102,6 +559,34 @@ class App(ctk.CTk):
         self.bind("<Control-b>", self.on_key_back)
         self.bind("<Control-B>", self.on_key_back)
         
+        # Bind Ctrl+Z for undoing the latest deletion
+        self.bind("<Control-z>", self.on_key_undo)
+        self.bind("<Control-Z>", self.on_key_undo)
+        
+        # Bind Ctrl+D for reviewing near-duplicate images
+        self.bind("<Control-d>", self.on_key_duplicates)
+        self.bind("<Control-D>", self.on_key_duplicates)
+        
+        # Bind Ctrl+W for reviewing the likeliest rejects first
+        self.bind("<Control-w>", self.on_key_worst_first)
+        self.bind("<Control-W>", self.on_key_worst_first)
+        
+        # Bind F3 for the latency HUD
+        self.bind("<F3>", self.on_key_hud)
+        
+        # Bind +/- to zoom in and out, 1 for actual size and 0 to fit the image again
+        self.bind("<Key-plus>", self.on_key_zoom_in)
+        self.bind("<Key-equal>", self.on_key_zoom_in)
+        self.bind("<KP_Add>", self.on_key_zoom_in)
+        self.bind("<Key-minus>", self.on_key_zoom_out)
+        self.bind("<KP_Subtract>", self.on_key_zoom_out)
+        self.bind("<Key-1>", self.on_key_actual_size)
+        self.bind("<Key-0>", self.on_key_fit)
+        
+        # Bind G for the thumbnail grid
+        self.bind("<Key-g>", self.on_key_grid)
+        self.bind("<Key-G>", self.on_key_grid)
+        
         # Make sure the window can receive focus for key events
         self.focus_set()
         
@@ -109,24 +594,119 @@ class App(ctk.CTk):
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(0, weight=1)
         
-        # Create display layers
+        # Icons of the viewer, decoded once when it is first built
+        self.icons = IconCache()
+        
+        # Create the directory prompt; the viewer layer is built on first use by show_layer2
         self.create_layers()
         
-        # Initialize current image index
-        self.current_image_index = 0
+        # Headless engine owning the image list, the cursor and the preview caches, started once the prompt is painted
+        self.engine = None
+        
+        # Duplicate search or quality scoring running in the background, if any
+        self.background_task = None
         
-        # Initialize image cache for preloading
-        self.image_cache = {}
+        # Background threads never touch Tk: they post calls here, run by drain_ui_calls on this thread
+        self.ui_calls = CallQueue()
+        self.after(self.UI_DRAIN_INTERVAL, self.drain_ui_calls)
         
-        # Initialize rotation tracking
+        # Pending after() ids of the messages shown by display_error, by label
+        self.error_timers = {}
+        
+        # Last window size seen, and the pending refit of the shown image after a resize
+        self.window_size = None
+        self.resize_timer = None
+        self.bind("<Configure>", self.on_window_configure, add="+")
+        
+        # Opt-in instrumentation: spans exported as a Chrome trace on exit, and the latency HUD
+        self.trace_path = os.environ.get(self.TRACE_ENV)
+        if self.trace_path:
+            tracer.enable()
+        self.hud_visible = False
+        if os.environ.get(self.HUD_ENV):
+            self.toggle_hud()
+        
+        # Initialize the displayed image and its rotation
+        self.current_image_path = None
         self.current_rotation = 0  # 0, 90, 180, 270 degrees
         
+        # Zoom: the reduction factor shown (None while the image is fitted), the pan offset in pixels
+        # at that factor, and the canvas items and pending decodes of the tiles around the view
+        self.zoom_factor = None
+        self.zoom_offset = (0, 0)
+        self.zoom_items = {}
+        self.zoom_requests = {}
+        self.pan_start = None
+        
+        # Animated GIF or WebP playing in the image label, and the after() id of its next frame
+        self.animation = None
+        self.animation_timer = None
+        
+        # Whether the thumbnail grid is shown in place of the single image
+        self.grid_shown = False
+        
         # Show the initial layer
         self.show_layer1()
+        
+        # Measure the cold start up to the first paint of the prompt, then start the engine
+        self.init_finished = tracer.now()
+        self.bind("<Map>", self.on_first_map, add="+")
+
+    # Startup Methods
+    def on_first_map(self, event):
+        """Wait for the first paint once the window is mapped"""
+        # Children's <Map> events reach the window's bindings too
+        if event.widget is not self:
+            return
+        self.unbind("<Map>")
+        # Idle callbacks run after Tk's pending redraws, so this runs once the prompt is painted
+        self.after_idle(self.end_startup)
+
+    def end_startup(self):
+        """Record the cold start, report it if asked to, and start the engine"""
+        painted = tracer.now()
+        self.start_engine()
+        started = tracer.now()
+        
+        tracer.complete("imports", IMPORT_STARTED, self.init_started, "startup")
+        tracer.complete("create window", self.init_started, self.init_finished, "startup")
+        tracer.complete("first paint", self.init_finished, painted, "startup")
+        tracer.complete("start engine", painted, started, "startup")
+        if os.environ.get(self.STARTUP_ENV):
+            print(
+                f"Startup: imports {(self.init_started - IMPORT_STARTED) / 1e6:.0f} ms, "
+                f"window {(self.init_finished - self.init_started) / 1e6:.0f} ms, "
+                f"first paint at {(painted - IMPORT_STARTED) / 1e6:.0f} ms, "
+                f"engine ready at {(started - IMPORT_STARTED) / 1e6:.0f} ms",
+                file=sys.stderr
+            )
+
+    def start_engine(self):
+        """Create the engine and start the polls using it, once"""
+        if self.engine is not None:
+            return
+        from engine import Engine
+        
+        # The duplicate and quality stores are opened by the first search that needs them
+        self.engine = Engine(
+            store=self.open_preview_store(),
+            trash=self.open_trash_queue(),
+            metadata=self.open_metadata_index(),
+            sessions=self.open_session_store()
+        )
+        
+        # Watch for deletions the background trash queue could not carry out
+        self.after(self.TRASH_POLL_INTERVAL, self.poll_trash_failures)
+        
+        # Follow changes made to the directory by other programs (needs watchdog)
+        self.after(self.WATCH_POLL_INTERVAL, self.poll_tree_changes)
+        
+        # Keep the session recoverable even if the application does not exit cleanly
+        self.after(self.SESSION_SAVE_INTERVAL, self.save_session)
 
     # UI Setup Methods
     def create_layers(self):
-        """Create the two display layers as frames."""
+        """Create the first display layer, the directory prompt, as a frame."""
         # Layer 1: Initial layer with input box and button
         self.layer1 = ctk.CTkFrame(self)
         self.layer1.grid(row=0, column=0, sticky="nsew")
@@ -188,7 +768,9 @@ class App(ctk.CTk):
             height=40
         )
         self.main_button.grid(row=4, column=0, pady=(10, 10), sticky="")
-        
+
+    def create_viewer_layer(self):
+        """Create the second display layer, the viewer, as a frame."""
         # Layer 2: Second layer with 4 sections
         self.layer2 = ctk.CTkFrame(self)
         self.layer2.grid(row=0, column=0, sticky="nsew")
@@ -210,14 +792,7 @@ class App(ctk.CTk):
         self.left_sidebar.grid_rowconfigure(0, weight=1)
         
         # Load left arrow icon
-        try:
-            left_arrow_icon = ctk.CTkImage(
-                light_image=Image.open("resources/images/arrow-92-64.ico"),
-                dark_image=Image.open("resources/images/arrow-92-64.ico"),
-                size=(24, 24)
-            )
-        except Exception:
-            left_arrow_icon = None
+        left_arrow_icon = self.icons.get("arrow-92-64.ico", (24, 24))
         
         # Left sidebar button (centered)
         self.left_button = self.create_button(
@@ -241,14 +816,7 @@ class App(ctk.CTk):
         self.right_sidebar.grid_rowconfigure(0, weight=1)
         
         # Load right arrow icon
-        try:
-            right_arrow_icon = ctk.CTkImage(
-                light_image=Image.open("resources/images/arrow-28-64.ico"),
-                dark_image=Image.open("resources/images/arrow-28-64.ico"),
-                size=(24, 24)
-            )
-        except Exception:
-            right_arrow_icon = None
+        right_arrow_icon = self.icons.get("arrow-28-64.ico", (24, 24))
         
         # Right sidebar button (centered)
         self.right_button = self.create_button(
@@ -282,6 +850,41 @@ class App(ctk.CTk):
         )
         self.image_label.grid(row=0, column=0, sticky="nsew", padx=10, pady=(10, 5))
         
+        # Canvas of the tiles of a zoomed image, in the label's place while zoomed in
+        self.zoom_canvas = tk.Canvas(
+            self.green_section,
+            width=1,
+            height=1,
+            background="#1a1a1a",
+            highlightthickness=0,
+            cursor="fleur"
+        )
+        self.zoom_canvas.grid(row=0, column=0, sticky="nsew", padx=10, pady=(10, 5))
+        self.zoom_canvas.grid_remove()
+        self.zoom_canvas.bind("<ButtonPress-1>", self.on_pan_start)
+        self.zoom_canvas.bind("<B1-Motion>", self.on_pan_drag)
+        
+        # Mouse wheel zooms around the pointer, on the fitted image and on the tiles
+        for widget in (self.image_label, self.zoom_canvas):
+            widget.bind("<MouseWheel>", self.on_zoom_wheel)
+            widget.bind("<Button-4>", self.on_zoom_wheel)
+            widget.bind("<Button-5>", self.on_zoom_wheel)
+        
+        # Thumbnail grid of the whole list, in the green section's place while shown with G
+        self.thumbnail_grid = ThumbnailGrid(self.layer2, self.engine, self.ui_calls.post, self.close_grid, self.delete_images)
+        self.thumbnail_grid.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
+        self.thumbnail_grid.grid_remove()
+        
+        # Latency HUD over the top right corner of the image, shown with F3
+        self.hud_label = ctk.CTkLabel(
+            self.green_section,
+            text="",
+            font=("Courier", 11),
+            text_color="white",
+            fg_color="#202020",
+            corner_radius=4
+        )
+        
         # Add combined frame for image index and progress bar
         self.index_progress_frame = ctk.CTkFrame(self.green_section, fg_color="transparent")
         self.index_progress_frame.grid(row=1, column=0, sticky="", padx=10, pady=(0, 8))
@@ -351,14 +954,7 @@ class App(ctk.CTk):
         self.bottom_middle.grid_rowconfigure(0, weight=1)
         
         # Add back button
-        try:
-            back_icon = ctk.CTkImage(
-                light_image=Image.open("resources/images/stop-64.ico"),
-                dark_image=Image.open("resources/images/stop-64.ico"),
-                size=(20, 20)
-            )
-        except Exception:
-            back_icon = None
+        back_icon = self.icons.get("stop-64.ico", (20, 20))
         
         self.back_button = self.create_button(
             self.bottom_middle,
@@ -373,43 +969,13 @@ class App(ctk.CTk):
 
         # Add delete button centered in the bottom section
         # Load icon images
-        try:
-            trash_icon = ctk.CTkImage(
-                light_image=Image.open("resources/images/trash-10-64.ico"),
-                dark_image=Image.open("resources/images/trash-10-64.ico"),
-                size=(20, 20)
-            )
-        except Exception:
-            trash_icon = None
-        
-        try:
-            rotate_left_icon = ctk.CTkImage(
-                light_image=Image.open("resources/images/rotate-64.ico"),
-                dark_image=Image.open("resources/images/rotate-64.ico"),
-                size=(20, 20)
-            )
-        except Exception:
-            rotate_left_icon = None
+        trash_icon = self.icons.get("trash-10-64.ico", (20, 20))
+        rotate_left_icon = self.icons.get("rotate-64.ico", (20, 20))
         
-        try:
-            # Mirror the rotate icon for right rotation
-            rotate_icon_image = Image.open("resources/images/rotate-64.ico")
-            rotate_right_icon = ctk.CTkImage(
-                light_image=rotate_icon_image.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
-                dark_image=rotate_icon_image.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
-                size=(20, 20)
-            )
-        except Exception:
-            rotate_right_icon = None
+        # Mirror the rotate icon for right rotation
+        rotate_right_icon = self.icons.get("rotate-64.ico", (20, 20), mirror=True)
         
-        try:
-            refresh_icon = ctk.CTkImage(
-                light_image=Image.open("resources/images/sinchronize-64.ico"),
-                dark_image=Image.open("resources/images/sinchronize-64.ico"),
-                size=(20, 20)
-            )
-        except Exception:
-            refresh_icon = None
+        refresh_icon = self.icons.get("sinchronize-64.ico", (20, 20))
         
         self.bottom_button1 = self.create_button(
             self.bottom_middle,
@@ -462,6 +1028,9 @@ class App(ctk.CTk):
         
         # Hide layer 2 initially
         self.layer2.grid_remove()
+        
+        # The HUD may have been turned on before the viewer existed
+        self.place_hud()
     
     def create_button(self, parent, text, command=None, tooltip=None, **kwargs):
         """Method for creating buttons with consistent styling"""
@@ -472,17 +1041,25 @@ class App(ctk.CTk):
     
     def show_layer1(self):
         """Show layer 1 and hide layer 2"""
-        self.layer2.grid_remove()
+        if hasattr(self, 'layer2'):
+            self.hide_grid()
+            self.layer2.grid_remove()
         self.layer1.grid(row=0, column=0, sticky="nsew")
     
     def show_layer2(self):
-        """Show layer 2 and hide layer 1"""
+        """Show layer 2, building it the first time, and hide layer 1"""
+        if not hasattr(self, 'layer2'):
+            with tracer.span("create_viewer_layer", "ui"):
+                self.create_viewer_layer()
         self.layer1.grid_remove()
         self.layer2.grid(row=0, column=0, sticky="nsew")
 
     # Event Handlers
     def handle_submit(self):
         """Handle the submit button click - validate directory and switch layers"""
+        # Submitted before the prompt finished its first paint
+        self.start_engine()
+        
         # Get the directory path from the input box
         directory_path = self.input_box.get().strip()
         
@@ -514,131 +1091,349 @@ class App(ctk.CTk):
             self.display_error(self.error_label, "Cannot execute in directory")
             return
         
-        # Try to list files in the directory
+        # Check if recursive operation is enabled
+        is_recursive = self.recursive_checkbox.get()
+        
+        # Reopen a saved session at once, on the image shown last; it is checked against the disk in the background
         try:
-            # Check if recursive operation is enabled
-            is_recursive = self.recursive_checkbox.get()
-            
-            # Get files using the dedicated function
-            images = self.list_images(directory_path, is_recursive)
-            
-            # Check if the files list is empty
-            if not images:
-                self.display_error(self.error_label, "The directory has no images. Activate the Recursive Option if the images are in sub-directories")
-                return
-            
-            self.directory_images = images
-            self.current_directory = directory_path
-            self.current_image_index = 0
-            self.current_image_path = images[0] if images else None
-            
-            # Clear the image cache when loading a new directory
+            resumed = self.engine.resume(directory_path, is_recursive)
+        except Exception:
+            resumed = False
+        if resumed:
+            self.error_label.configure(text="")
             self.clear_container_completely()
-            self.image_cache.clear()
-            
-            # If all checks pass, switch to second layer
             self.show_layer2()
-            
-            # Load and display the first image file
-            self.load_first_image_file()
-            
-        except PermissionError:
-            self.display_error(self.error_label, "Permission denied accessing directory")
+            self.display_file(self.engine.cursor.current)
+            self.after(self.SCAN_POLL_INTERVAL, self.poll_validation)
+            return
+        
+        # Scan the directory in the background; the viewer opens as soon as the first image is found
+        self.reset_ui_state()
+        self.error_label.configure(text="Scanning...")
+        scanner = self.engine.open_streaming(directory_path, is_recursive)
+        self.after(self.SCAN_POLL_INTERVAL, self.poll_scan, scanner)
+
+    def poll_scan(self, scanner):
+        """Move newly scanned images into the list, opening the viewer on the first one found"""
+        # A newer scan replaced this one (or the user went back), stop polling it
+        if scanner is not self.engine.scanner:
+            return
+        
+        added = self.engine.poll_scan()
+        
+        if self.current_image_path is None:
+            if self.engine.cursor:
+                # First image found: switch to second layer and display it while the scan continues
+                self.error_label.configure(text="")
+                self.clear_container_completely()
+                self.show_layer2()
+                self.load_first_image_file()
+        elif added or not self.engine.scanning:
+            # Grow the "N of M" label and the navigation state with the list
+            self.update_position_labels()
+            self.update_navigation_buttons()
+            if self.grid_shown:
+                self.thumbnail_grid.render()
+        
+        if self.engine.scanning:
+            self.after(self.SCAN_POLL_INTERVAL, self.poll_scan, scanner)
+        elif not self.engine.cursor:
+            # Check why the files list is empty
+            if isinstance(scanner.error, PermissionError):
+                self.display_error(self.error_label, "Permission denied accessing directory")
+            elif scanner.error is not None:
+                self.display_error(self.error_label, f"Error accessing directory: {str(scanner.error)}")
+            else:
+                self.display_error(self.error_label, "The directory has no images. Activate the Recursive Option if the images are in sub-directories")
+
+    def poll_validation(self):
+        """Apply what changed on disk since a resumed session was saved, once the background check is done"""
+        if not self.engine.validating:
+            return
+        
+        try:
+            changes = self.engine.poll_validation()
         except Exception as e:
+            self.input_box.delete(0, 'end')
             self.display_error(self.error_label, f"Error accessing directory: {str(e)}")
+            self.show_layer1()
+            return
+        
+        if self.engine.validating:
+            self.after(self.SCAN_POLL_INTERVAL, self.poll_validation)
+        elif changes is not None and any(changes) and hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            self.apply_tree_changes(changes)
+
+    def save_session(self):
+        """Save the position in the open directory, every few seconds"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            try:
+                self.engine.save_session()
+            except Exception:
+                pass
+        self.after(self.SESSION_SAVE_INTERVAL, self.save_session)
 
     def on_left_arrow_click(self):
         """Handle left arrow button click - navigate to previous image"""
-        if hasattr(self, 'directory_images') and self.directory_images and hasattr(self, 'current_image_path'):
-            if self.current_image_index > 0:
-                # Clear container before switching
-                self.clear_container_completely()
-                self.current_image_index -= 1
-                previous_image_path = self.directory_images[self.current_image_index]
-                self.display_file(previous_image_path)
+        if self.engine.cursor.has_previous:
+            # Clear container before switching
+            self.clear_container_completely()
+            previous_image_path = self.engine.cursor.move_previous()
+            self.display_file(previous_image_path)
 
     def on_right_arrow_click(self):
         """Handle right arrow button click - navigate to next image"""
-        if hasattr(self, 'directory_images') and self.directory_images and hasattr(self, 'current_image_path'):
-            if self.current_image_index < len(self.directory_images) - 1:
-                # Clear container before switching
-                self.clear_container_completely()
-                self.current_image_index += 1
-                next_image_path = self.directory_images[self.current_image_index]
-                self.display_file(next_image_path)
+        if self.engine.cursor.has_next:
+            # Clear container before switching
+            self.clear_container_completely()
+            next_image_path = self.engine.cursor.move_next()
+            self.display_file(next_image_path)
 
     def on_delete_click(self):
         """Handle delete button click - move current image to trash and navigate to next"""
-        if hasattr(self, 'directory_images') and self.directory_images and hasattr(self, 'current_image_path'):
-            try:
-                # Clear container before deleting
-                self.clear_container_completely()
-                
-                send2trash.send2trash(self.current_image_path)
-                self.directory_images.remove(self.current_image_path)
-                
-                if self.current_image_path in self.image_cache:
-                    del self.image_cache[self.current_image_path]
-                
-                if not self.directory_images:
-                    self.input_box.delete(0, 'end')
-                    self.display_error(self.error_label, "All images were cleared")
-                    self.show_layer1()
-                    return
-                
-                if self.current_image_index >= len(self.directory_images):
-                    self.current_image_index = len(self.directory_images) - 1
-                
-                next_image_path = self.directory_images[self.current_image_index]
-                self.display_file(next_image_path)
-            except Exception:
-                pass
+        # In the grid the button trashes the selection
+        if self.grid_shown:
+            self.thumbnail_grid.on_key_delete()
+            return
+        
+        if self.engine.cursor:
+            # Clear container before deleting
+            self.clear_container_completely()
+            
+            # The list advances immediately; the move to the trash happens in the background
+            self.engine.delete_current()
+            
+            if not self.engine.cursor:
+                self.engine.cancel_scan()
+                self.input_box.delete(0, 'end')
+                self.display_error(self.error_label, "All images were cleared (Ctrl+Z to undo)")
+                self.show_layer1()
+                return
+            
+            self.display_file(self.engine.cursor.current)
+
+    def delete_images(self, image_paths):
+        """Move the images selected in the grid to the trash in one go"""
+        self.engine.delete_images(image_paths)
+        
+        if not self.engine.cursor:
+            self.engine.cancel_scan()
+            self.input_box.delete(0, 'end')
+            self.display_error(self.error_label, "All images were cleared (Ctrl+Z to undo)")
+            self.show_layer1()
+            return
+        
+        self.display_file(self.engine.cursor.current)
+
+    def on_undo_click(self):
+        """Handle Ctrl+Z - restore the latest deleted image in the background"""
+        operation = self.engine.undo_delete()
+        if operation is not None:
+            operation.restore.add_done_callback(lambda future: self.ui_calls.post(self.show_undone, operation))
+
+    def show_undone(self, operation):
+        """Show a restored image at its original position, or why it couldn't be restored"""
+        from engine import RestoreError
+        try:
+            self.engine.finish_undo(operation)
+        except RestoreError as e:
+            self.display_error(self.image_details_label, f"Undo failed: {str(e)}", restore_text=self.image_details_label.cget("text"))
+            return
+        
+        if not (hasattr(self, 'layer2') and self.layer2.winfo_viewable()):
+            self.error_label.configure(text="")
+            self.show_layer2()
+        self.display_file(self.engine.cursor.current)
+
+    def poll_trash_failures(self):
+        """Put back the images the trash queue failed to move and report the error"""
+        failures = self.engine.take_trash_failures()
+        if failures:
+            message = f"Could not move {os.path.basename(failures[0].path)} to trash: {failures[0].error}"
+            if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+                self.display_file(self.engine.cursor.current)
+                self.display_error(self.image_details_label, message, restore_text=self.image_details_label.cget("text"))
+            else:
+                self.display_error(self.error_label, message)
+        
+        self.after(self.TRASH_POLL_INTERVAL, self.poll_trash_failures)
 
     def on_refresh_click(self):
-        """Handle refresh button click - reconstruct the files list and reload the second layer"""
-        if hasattr(self, 'current_directory') and self.current_directory:
+        """Handle refresh button click - bring the files list up to date and reload the second layer"""
+        if self.engine.directory:
             try:
-                # Clear container before refreshing
-                self.clear_container_completely()
-                
-                self.image_cache.clear()
-                is_recursive = self.recursive_checkbox.get()
-                images = self.list_images(self.current_directory, is_recursive)
-                
-                if not images:
-                    self.input_box.delete(0, 'end')
-                    self.display_error(self.error_label, "No images found after refresh")
-                    self.show_layer1()
-                    return
-                
-                current_image_path = getattr(self, 'current_image_path', None)
-                self.directory_images = images
-                
-                new_index = 0
-                if current_image_path and current_image_path in images:
-                    new_index = images.index(current_image_path)
-                
-                self.current_image_index = new_index
-                self.current_image_path = images[new_index]
-                self.display_file(self.current_image_path)
+                changes = self.engine.refresh()
+            except Exception as e:
+                self.display_error(self.image_details_label, f"Refresh failed: {str(e)}", restore_text=self.image_details_label.cget("text"))
+                return
+            
+            self.apply_tree_changes(changes, redisplay=True)
+    
+    def poll_tree_changes(self):
+        """Apply the changes the filesystem watcher saw while the second layer is shown"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable() and not self.engine.scanning:
+            try:
+                changes = self.engine.poll_changes()
             except Exception:
-                pass
+                changes = None
+            if changes is not None and any(changes):
+                self.apply_tree_changes(changes)
+        
+        self.after(self.WATCH_POLL_INTERVAL, self.poll_tree_changes)
+    
+    def apply_tree_changes(self, changes, redisplay=False):
+        """Update the second layer after the files list changed on disk.
+        
+        The image is only reloaded when it was removed or modified, or when redisplay
+        is set; otherwise only the position labels and buttons are updated.
+        """
+        if not self.engine.cursor:
+            self.input_box.delete(0, 'end')
+            self.display_error(self.error_label, "No images found after refresh")
+            self.show_layer1()
+            return
+        
+        current_image_path = self.engine.cursor.current
+        if redisplay or current_image_path != self.current_image_path or current_image_path in changes.modified:
+            self.display_file(current_image_path)
+        else:
+            self.update_position_labels()
+            self.update_navigation_buttons()
+            if self.grid_shown:
+                self.thumbnail_grid.render()
     
     def on_rotate_left_click(self):
         """Handle rotate left button click - rotate image 90 degrees counter-clockwise"""
-        if hasattr(self, 'current_image_path') and self.current_image_path and self.is_image_file(self.current_image_path):
+        if self.grid_shown:
+            self.rotate_focused(-90)
+        elif self.current_image_path and is_image_file(self.current_image_path):
             self.current_rotation = (self.current_rotation - 90) % 360
+            self.engine.set_rotation(self.current_image_path, self.current_rotation)
             self.display_image(self.current_image_path)
+            self.engine.preload(self.get_preview_box())
 
     def on_rotate_right_click(self):
         """Handle rotate right button click - rotate image 90 degrees clockwise"""
-        if hasattr(self, 'current_image_path') and self.current_image_path and self.is_image_file(self.current_image_path):
+        if self.grid_shown:
+            self.rotate_focused(90)
+        elif self.current_image_path and is_image_file(self.current_image_path):
             self.current_rotation = (self.current_rotation + 90) % 360
+            self.engine.set_rotation(self.current_image_path, self.current_rotation)
             self.display_image(self.current_image_path)
+            self.engine.preload(self.get_preview_box())
+
+    def rotate_focused(self, degrees):
+        """Rotate the image focused in the grid; its thumbnail is derived from the upright one"""
+        image_path = self.engine.cursor.current
+        if image_path is not None:
+            self.engine.set_rotation(image_path, (self.engine.rotation(image_path) + degrees) % 360)
+            self.thumbnail_grid.render()
+
+    def on_grid_click(self):
+        """Handle G - show the thumbnail grid of the list, or go back to the single image"""
+        if self.grid_shown:
+            self.close_grid()
+        elif self.engine.cursor:
+            self.clear_container_completely()
+            self.grid_shown = True
+            self.green_section.grid_remove()
+            self.thumbnail_grid.grid()
+            self.thumbnail_grid.open()
+
+    def close_grid(self):
+        """Leave the thumbnail grid for the single view, on the image focused in the grid"""
+        self.hide_grid()
+        self.display_file(self.engine.cursor.current)
+
+    def hide_grid(self):
+        """Put the single view back in the grid's place and release the thumbnails"""
+        if not self.grid_shown:
+            return
+        self.grid_shown = False
+        self.thumbnail_grid.close()
+        self.thumbnail_grid.grid_remove()
+        self.green_section.grid()
+        self.focus_set()
+
+    def on_duplicates_click(self):
+        """Handle Ctrl+D - find near-duplicate images and review them group by group, or stop reviewing"""
+        if self.engine.reviewing:
+            self.engine.end_review()
+            self.display_file(self.engine.cursor.current)
+            return
+        
+        if self.engine.hashes is None:
+            self.engine.hashes = self.open_hash_store()
+        self.start_background_task(self.engine.search_duplicates, "Finding duplicates... {} of {} images hashed", self.open_duplicate_review)
+
+    def open_duplicate_review(self, groups, details):
+        """Step through the duplicate groups found by a search"""
+        if not groups:
+            self.display_error(self.image_details_label, "No duplicates found", restore_text=details)
+            return
+        
+        self.engine.review_duplicates(groups)
+        self.display_file(self.engine.cursor.current)
+
+    def on_worst_first_click(self):
+        """Handle Ctrl+W - score image quality and review the likeliest rejects first, or go back to scan order"""
+        if self.engine.reviewing:
+            return
+        if self.engine.order == "worst":
+            self.engine.order_by_scan()
+            self.display_file(self.engine.cursor.current)
+            return
+        
+        if self.engine.quality is None:
+            self.engine.quality = self.open_quality_store()
+        self.start_background_task(self.engine.search_scores, "Scoring image quality... {} of {} images scored", self.open_worst_first)
+
+    def open_worst_first(self, scores, details):
+        """Reorder the list worst first once the quality scores are known"""
+        self.engine.order_worst_first(scores)
+        self.display_file(self.engine.cursor.current)
+
+    def start_background_task(self, start, progress_text, on_done):
+        """Start an engine task returning a Future and show its progress in the details line.
+        
+        on_done(result, details) is called once it succeeds, with the details text to restore.
+        """
+        if self.background_task is not None or self.engine.scanning:
+            return
+        
+        self.background_task = start()
+        self.after(self.TASK_POLL_INTERVAL, self.poll_background_task, self.background_task, progress_text, on_done)
+
+    def poll_background_task(self, future, progress_text, on_done):
+        """Update the progress of a background task and hand over its result once it is done"""
+        if future is not self.background_task:
+            return
+        
+        if not future.done():
+            self.image_details_label.configure(text=progress_text.format(*self.engine.task_progress))
+            self.after(self.TASK_POLL_INTERVAL, self.poll_background_task, future, progress_text, on_done)
+            return
+        
+        self.background_task = None
+        current_image_path = self.engine.cursor.current
+        details = self.engine.details(current_image_path) if current_image_path else ""
+        try:
+            result = future.result()
+        except Exception as e:
+            self.display_error(self.image_details_label, f"Failed: {str(e)}", restore_text=details)
+            return
+        on_done(result, details)
 
     def on_closing(self):
         """Handle window close event - shuts down the entire application"""
         # Clean up all resources before closing
+        if self.engine is not None:
+            self.engine.close()
+        if self.trace_path:
+            try:
+                tracer.export(self.trace_path)
+            except OSError:
+                pass
         self.clear_container_completely()
         self.quit()
         self.destroy()
@@ -646,7 +1441,18 @@ class App(ctk.CTk):
 
     def on_back_click(self):
         """Handle back button click - return to layer 1 and clear input box"""
-        # Clear container before going back
+        # Going back from a duplicate review returns to the full list first
+        if self.engine.reviewing:
+            self.on_duplicates_click()
+            return
+        
+        # Remember where the user stopped, then clear container before going back
+        try:
+            self.engine.save_session()
+        except Exception:
+            pass
+        self.background_task = None
+        self.engine.cancel_scan()
         self.clear_container_completely()
         
         self.input_box.delete(0, 'end')
@@ -695,87 +1501,488 @@ class App(ctk.CTk):
         if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
             self.on_rotate_right_click()
 
+    def on_key_undo(self, event=None):
+        """Handle Ctrl+Z key press - undo the latest deletion"""
+        # Also available right after the last image was deleted and the viewer closed
+        if self.engine is None:
+            return
+        if (hasattr(self, 'layer2') and self.layer2.winfo_viewable()) or (self.engine.directory and not self.engine.cursor):
+            self.on_undo_click()
+
+    def on_key_duplicates(self, event=None):
+        """Handle Ctrl+D key press - review near-duplicates"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            self.on_duplicates_click()
+
+    def on_key_worst_first(self, event=None):
+        """Handle Ctrl+W key press - toggle worst-first order"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            self.on_worst_first_click()
+
     def on_key_back(self, event=None):
         """Handle Escape or Ctrl+B key press - return to layer 1"""
         if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            # Escape leaves the zoom first
+            if self.zoom_factor is not None and event is not None and event.keysym == "Escape":
+                self.set_zoom(None)
+                return
             self.on_back_click()
 
+    def on_key_hud(self, event=None):
+        """Handle F3 key press - show or hide the latency HUD"""
+        self.toggle_hud()
+
+    def on_key_zoom_in(self, event=None):
+        """Handle + key press - zoom in around the center"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            self.step_zoom(1)
+
+    def on_key_zoom_out(self, event=None):
+        """Handle - key press - zoom out around the center"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            self.step_zoom(-1)
+
+    def on_key_actual_size(self, event=None):
+        """Handle 1 key press - show the image at actual size"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            self.set_zoom(1)
+
+    def on_key_fit(self, event=None):
+        """Handle 0 key press - fit the image to the window again"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            self.set_zoom(None)
+
+    def on_key_grid(self, event=None):
+        """Handle G key press - toggle the thumbnail grid"""
+        if hasattr(self, 'layer2') and self.layer2.winfo_viewable():
+            self.on_grid_click()
+    
     # Display Methods
     def display_file(self, file_path):
         """Display file"""
-        # Clear previous content before displaying new file - Enhanced container cleaning
-        self.clear_container_completely()
+        # Only timed when someone is looking: tracing or the HUD
+        started = tracer.now() if tracer.enabled or self.hud_visible else None
         
-        if file_path:
-            self.current_image_path = file_path
+        with tracer.span("display_file", "ui", path=file_path):
+            # Clear previous content before displaying new file - Enhanced container cleaning
+            self.clear_container_completely()
             
-            # Reset rotation when switching to a new file
-            self.current_rotation = 0
+            if file_path:
+                self.current_image_path = file_path
             
-            if hasattr(self, 'directory_images') and self.directory_images:
-                try:
-                    current_index = self.directory_images.index(file_path)
-                    self.current_image_index = current_index
-                    total_count = len(self.directory_images)
-                    self.image_index_label.configure(text=f"{current_index + 1} of {total_count}")
-                    
-                    if total_count > 1:
-                        progress_percentage = current_index / (total_count - 1)
-                        percentage_text = f"{int(progress_percentage * 100)}%"
-                    else:
-                        progress_percentage = 0
-                        percentage_text = "0%"
-                    
-                    self.progress_bar.set(progress_percentage)
-                    self.progress_label.configure(text=percentage_text)
-                except ValueError:
-                    self.image_index_label.configure(text="")
-                    self.progress_bar.set(0)
-                    self.progress_label.configure(text="0%")
-            else:
-                self.image_index_label.configure(text="")
-                self.progress_bar.set(0)
-                self.progress_label.configure(text="0%")
+                # Restore the rotation the user gave this file, if any
+                self.current_rotation = self.engine.rotation(file_path)
             
-            file_details = self.get_file_details(file_path)
-            self.image_details_label.configure(text=file_details)
+                self.update_position_labels()
             
-            self.display_image(file_path)
-            self.update_navigation_buttons(file_path)
-            
-            if hasattr(self, 'directory_images') and self.directory_images:
-                self.preload_images(self.current_image_index)
-        else:
-            self.reset_ui_state()
+                if self.grid_shown:
+                    # The grid shows the list around the cursor; the single view is painted once it is back
+                    self.thumbnail_grid.show_cursor()
+                    self.update_navigation_buttons()
+                else:
+                    file_details = self.engine.details(file_path)
+                    self.image_details_label.configure(text=file_details)
+                
+                    self.display_image(file_path)
+                    self.update_navigation_buttons()
+                    
+                    if self.engine.cursor:
+                        self.engine.preload(self.get_preview_box())
+            else:
+                self.reset_ui_state()
         
+        if started is not None:
+            # Idle callbacks run after Tk's pending redraws, so this closes the frame once it is painted
+            self.after_idle(self.end_frame, started, file_path)
+
+    def end_frame(self, started, file_path):
+        """Record the latency of a navigation from display_file to the repainted window"""
+        latency = tracer.now() - started
+        tracer.complete("frame", started, started + latency, "ui", {"path": file_path})
+        stats = self.engine.cache.stats()
+        tracer.counter("preview cache", "ui", hits=stats.hits, misses=stats.misses)
+        if self.hud_visible:
+            lookups = stats.hits + stats.misses
+            hit_rate = f"{stats.hits / lookups:.0%}" if lookups else "n/a"
+            self.hud_label.configure(
+                text=f" frame {latency / 1e6:.1f} ms | cache {hit_rate} ({stats.hits}/{lookups}) "
+            )
+
+    def toggle_hud(self):
+        """Show or hide the latency HUD"""
+        self.hud_visible = not self.hud_visible
+        self.place_hud()
+
+    def place_hud(self):
+        """Place or remove the HUD over the image as hud_visible says, once the viewer is built"""
+        if not hasattr(self, 'hud_label'):
+            return
+        if self.hud_visible:
+            self.hud_label.configure(text=" frame - | cache - ")
+            self.hud_label.place(relx=1.0, rely=0.0, x=-12, y=12, anchor="ne")
+            self.hud_label.lift()
+        else:
+            self.hud_label.place_forget()
+
     def display_image(self, image_path):
         """Display an image in the section, resized to fit"""
-        try:
-            # Clear previous content first
-            self.clear_container_completely()
+        with tracer.span("display_image", "ui", path=image_path):
+            try:
+                # Clear previous content first
+                self.clear_container_completely()
             
-            # Create cache key that includes rotation
-            cache_key = f"{image_path}_rot_{self.current_rotation}"
+                box = self.get_preview_box()
+                rotation = self.current_rotation
+                # Animations play over the still preview as soon as their first frames are decoded
+                self.start_animation(image_path, box, rotation)
+                image = self.engine.cached_preview(image_path, box, rotation)
             
-            if cache_key in self.image_cache:
-                photo = self.image_cache[cache_key]
-                self.image_label.configure(image=photo, text="")
-                self.image_label.image = photo
-                return
+                if image is None:
+                    # Cache miss: paint a quick frame now, from a smaller level in memory or a
+                    # low-quality decode, and let the worker pool produce the full preview; its
+                    # callback only posts it back to this thread
+                    future = self.engine.request_preview(image_path, box, rotation)
+                    image = self.engine.rerender_preview(image_path, box, rotation)
+                    if image is None:
+                        image = self.engine.quick_preview(image_path, box, rotation)
+                    future.add_done_callback(
+                        lambda future: self.ui_calls.post(self.show_refined_preview, future, image_path, rotation)
+                    )
+                    if image is None:
+                        self.image_label.configure(image=None, text="Loading...")
+                        self.image_label.image = None
+                        return
             
-            # Handle image files
-            photo = self.load_and_resize_image(image_path)
-            if photo:
-                self.image_label.configure(image=photo, text="")
-                self.image_label.image = photo
-                self.image_cache[cache_key] = photo
-            else:
-                self.image_label.configure(image=None, text="Error loading image")
-                self.image_label.image = None
+                self.show_preview(image)
                     
-        except Exception as e:
-            self.image_label.configure(image=None, text=f"Error loading image: {str(e)}")
-            self.image_label.image = None
+            except Exception as e:
+                self.image_label.configure(image=None, text=f"Error loading image: {str(e)}")
+                self.image_label.image = None
+
+    def on_window_configure(self, event):
+        """Refit the shown image once the window has stopped changing size"""
+        # Children's <Configure> events reach the window's bindings too, and moves fire it as well
+        if event.widget is not self or (event.width, event.height) == self.window_size:
+            return
+        self.window_size = (event.width, event.height)
+        if self.resize_timer is not None:
+            self.after_cancel(self.resize_timer)
+        self.resize_timer = self.after(self.RESIZE_DEBOUNCE_INTERVAL, self.refit_image)
+
+    def refit_image(self):
+        """Render the shown image again for the current display area, from memory only"""
+        self.resize_timer = None
+        if not (hasattr(self, 'layer2') and self.layer2.winfo_viewable()) or self.current_image_path is None:
+            return
+        # The grid lays itself out again on its own <Configure>
+        if self.grid_shown:
+            return
+        
+        # Zoomed in: keep the offset in bounds and fill the new view
+        if self.zoom_factor is not None:
+            x, y = self.zoom_offset
+            self.move_zoom(x, y)
+            self.update_tiles()
+            return
+        
+        with tracer.span("refit image", "ui", path=self.current_image_path):
+            box = self.get_preview_box()
+            image = self.engine.rerender_preview(self.current_image_path, box, self.current_rotation)
+            if image is not None:
+                self.show_preview(image)
+            self.start_animation(self.current_image_path, box, self.current_rotation)
+
+    # Zoom Methods
+    def on_zoom_wheel(self, event):
+        """Zoom in or out around the mouse pointer"""
+        # X11 reports the wheel as buttons 4 and 5, Windows and macOS as a signed delta
+        direction = 1 if event.num == 4 or getattr(event, 'delta', 0) > 0 else -1
+        view = self.zoom_canvas if self.zoom_factor is not None else self.image_label
+        self.step_zoom(direction, (event.x_root - view.winfo_rootx(), event.y_root - view.winfo_rooty()))
+
+    def on_pan_start(self, event):
+        """Remember where a drag on the zoomed image started"""
+        self.pan_start = (event.x, event.y)
+
+    def on_pan_drag(self, event):
+        """Pan the zoomed image with the mouse"""
+        if self.pan_start is None or self.zoom_factor is None:
+            return
+        x, y = self.zoom_offset
+        self.move_zoom(x - (event.x - self.pan_start[0]), y - (event.y - self.pan_start[1]))
+        self.pan_start = (event.x, event.y)
+
+    def zoom_view_size(self):
+        """Return the size of the area the image is shown in"""
+        view = self.zoom_canvas if self.zoom_factor is not None else self.image_label
+        return view.winfo_width(), view.winfo_height()
+
+    def step_zoom(self, direction, anchor=None):
+        """Zoom in (direction 1) or out (-1) by a power of two, between fitting the image and 1:1"""
+        zoomed = self.open_zoom()
+        if zoomed is None:
+            return
+        
+        factors = zoomed.factors(self.zoom_view_size())
+        if direction > 0:
+            if self.zoom_factor is None:
+                factor = factors[0]
+            elif self.zoom_factor > 1:
+                factor = self.zoom_factor // 2
+            else:
+                return
+        else:
+            if self.zoom_factor is None:
+                return
+            factor = self.zoom_factor * 2 if self.zoom_factor * 2 <= factors[0] else None
+        self.set_zoom(factor, anchor)
+
+    def open_zoom(self):
+        """Return the TiledImage of the shown image, opening it if needed, or None if it can't be read"""
+        if self.engine is None or self.current_image_path is None or self.grid_shown:
+            return None
+        
+        zoomed = self.engine.zoomed
+        if zoomed is None or zoomed.path != self.current_image_path or zoomed.rotation != self.current_rotation:
+            zoomed = self.engine.open_zoom(self.current_image_path, self.current_rotation)
+            if zoomed is None:
+                self.display_error(self.image_details_label, "Error: Can't zoom into this image",
+                                   restore_text=self.image_details_label.cget("text"))
+        return zoomed
+
+    def set_zoom(self, factor, anchor=None):
+        """Show the image at a reduction factor, 1 being 1:1, keeping the point under anchor still.
+        
+        Args:
+            factor (int): Power-of-two reduction factor, or None to fit the image again
+            anchor (tuple): (x, y) in the view that stays over the same image point, by default its center
+        """
+        if factor is None:
+            if self.zoom_factor is not None:
+                self.exit_zoom()
+                self.refit_image()
+            return
+        
+        zoomed = self.open_zoom()
+        if zoomed is None or factor == self.zoom_factor:
+            return
+        
+        width, height = self.zoom_view_size()
+        anchor_x, anchor_y = anchor if anchor is not None else (width / 2, height / 2)
+        if self.zoom_factor is not None:
+            scale = self.zoom_factor
+            x, y = self.zoom_offset
+        else:
+            # The fitted preview is centered in the label
+            photo = self.image_label.image
+            if photo is not None:
+                scale = zoomed.size[0] / photo.width()
+            else:
+                scale = max(zoomed.size[0] / width, zoomed.size[1] / height)
+            x = (zoomed.size[0] / scale - width) / 2
+            y = (zoomed.size[1] / scale - height) / 2
+            # Tiles show the first frame of an animation
+            self.stop_animation()
+            self.image_label.grid_remove()
+            self.zoom_canvas.grid()
+            self.zoom_canvas.update_idletasks()
+        
+        # Image point under the anchor, in full resolution pixels
+        image_x = (x + anchor_x) * scale
+        image_y = (y + anchor_y) * scale
+        
+        with tracer.span("zoom", "ui", factor=factor):
+            self.clear_tiles()
+            self.zoom_factor = factor
+            self.zoom_offset = self.clamp_zoom_offset(image_x / factor - anchor_x, image_y / factor - anchor_y)
+            self.update_tiles()
+
+    def move_zoom(self, x, y):
+        """Pan the zoomed image to a new offset, moving the tiles already drawn"""
+        x, y = self.clamp_zoom_offset(x, y)
+        old_x, old_y = self.zoom_offset
+        if (x, y) == (old_x, old_y):
+            return
+        self.zoom_canvas.move("tile", old_x - x, old_y - y)
+        self.zoom_offset = (x, y)
+        self.update_tiles()
+
+    def clamp_zoom_offset(self, x, y):
+        """Keep the view over the image, or the image centered when it is smaller than the view"""
+        width, height = self.zoom_view_size()
+        scaled_width, scaled_height = self.engine.zoomed.scaled_size(self.zoom_factor)
+        x = (scaled_width - width) / 2 if scaled_width <= width else min(max(x, 0), scaled_width - width)
+        y = (scaled_height - height) / 2 if scaled_height <= height else min(max(y, 0), scaled_height - height)
+        return round(x), round(y)
+
+    def update_tiles(self):
+        """Request the tiles around the view and drop the ones scrolled far away"""
+        zoomed = self.engine.zoomed
+        if zoomed is None or self.zoom_factor is None:
+            return
+        
+        factor = self.zoom_factor
+        x, y = self.zoom_offset
+        width, height = self.zoom_view_size()
+        columns, rows = zoomed.grid(factor)
+        # One tile of margin, so a short pan finds its tiles decoded
+        wanted = {
+            (factor, column, row)
+            for column in range(max(0, x // TILE_SIZE - 1), min(columns, (x + width) // TILE_SIZE + 2))
+            for row in range(max(0, y // TILE_SIZE - 1), min(rows, (y + height) // TILE_SIZE + 2))
+        }
+        
+        for key in [key for key in self.zoom_items if key not in wanted]:
+            self.zoom_canvas.delete(self.zoom_items.pop(key)[0])
+        for key in [key for key in self.zoom_requests if key not in wanted]:
+            self.zoom_requests.pop(key).cancel()
+        
+        for key in wanted:
+            if key in self.zoom_items or key in self.zoom_requests:
+                continue
+            future = self.engine.request_tile(*key)
+            self.zoom_requests[key] = future
+            if future.done():
+                self.show_tile(key, future)
+            else:
+                future.add_done_callback(lambda future, key=key: self.ui_calls.post(self.show_tile, key, future))
+
+    def show_tile(self, key, future):
+        """Draw a decoded tile on the zoom canvas. Runs on the UI thread"""
+        # Dropped meanwhile: panned away, zoomed to another factor or another image
+        if self.zoom_requests.get(key) is not future:
+            return
+        del self.zoom_requests[key]
+        image = None if future.cancelled() else future.result()
+        if image is None:
+            return
+        
+        with tracer.span("PhotoImage", "ui", size=image.size):
+            photo = ImageTk.PhotoImage(image)
+        _, column, row = key
+        x, y = self.zoom_offset
+        item = self.zoom_canvas.create_image(
+            column * TILE_SIZE - x, row * TILE_SIZE - y, image=photo, anchor="nw", tags="tile"
+        )
+        self.zoom_items[key] = (item, photo)
+
+    def clear_tiles(self):
+        """Remove the drawn tiles and cancel the pending ones"""
+        for future in self.zoom_requests.values():
+            future.cancel()
+        self.zoom_requests.clear()
+        self.zoom_canvas.delete("tile")
+        self.zoom_items.clear()
+
+    def exit_zoom(self):
+        """Go back from the tiles to the fitted image and release the zoomed file"""
+        if not hasattr(self, 'zoom_canvas'):
+            return
+        self.clear_tiles()
+        if self.zoom_factor is not None:
+            self.zoom_canvas.grid_remove()
+            self.image_label.grid()
+            self.zoom_factor = None
+            self.pan_start = None
+        if self.engine is not None:
+            self.engine.close_zoom()
+
+    # Animation Methods
+    def start_animation(self, image_path, box, rotation):
+        """Play the frames of an animated image in the image label; other images are left as they are"""
+        self.stop_animation()
+        self.animation = self.engine.play(image_path, box, rotation)
+        if self.animation is not None:
+            self.animation_timer = self.after(self.animation.WAIT_INTERVAL, self.play_next_frame)
+
+    def play_next_frame(self):
+        """Show the frame of the animation that is due and schedule the next one"""
+        self.animation_timer = None
+        animation = self.animation
+        if animation is None:
+            return
+        # Not animated after all, or unreadable: the still preview stays
+        if animation.animated is False:
+            self.stop_animation()
+            return
+        
+        frame, delay = animation.next_frame()
+        if frame is not None:
+            with tracer.span("animation frame", "ui", path=animation.path):
+                self.show_preview(frame)
+        if delay is not None:
+            self.animation_timer = self.after(delay, self.play_next_frame)
+
+    def stop_animation(self):
+        """Stop the animation playing in the image label, keeping its last frame on screen"""
+        if self.animation_timer is not None:
+            self.after_cancel(self.animation_timer)
+            self.animation_timer = None
+        self.animation = None
+        if self.engine is not None:
+            self.engine.stop_playback()
+
+    def drain_ui_calls(self):
+        """Run the calls background threads posted for the UI thread"""
+        # Reschedule first so a failing call does not stop the hand-off
+        self.after(self.UI_DRAIN_INTERVAL, self.drain_ui_calls)
+        self.ui_calls.drain()
+
+    def show_refined_preview(self, future, image_path, rotation):
+        """Swap in the full preview decoded by the worker pool. Runs on the UI thread"""
+        # The user has already moved on, or the animation's frames are already playing: drop the result
+        if image_path != self.current_image_path or rotation != self.current_rotation or future.cancelled():
+            return
+        if self.animation is not None and self.animation.playing:
+            return
+        
+        image = future.result()
+        if image is not None:
+            with tracer.span("refined preview", "ui", path=image_path):
+                self.show_preview(image)
+        elif self.image_label.image is None:
+            # Undecodable (or SVG without cairosvg): a card naming the format instead of a bare error
+            self.show_preview(self.engine.placeholder(image_path, self.get_preview_box()))
+
+    def show_preview(self, image):
+        """Show a decoded preview in the image label"""
+        # Tk images may only be created on the thread running the event loop
+        assert threading.current_thread() is threading.main_thread(), "show_preview called off the UI thread"
+        with tracer.span("PhotoImage", "ui", size=image.size):
+            photo = ImageTk.PhotoImage(image)
+        self.image_label.configure(image=photo, text="")
+        self.image_label.image = photo
+
+    def update_position_labels(self):
+        """Update the "N of M" label and the progress bar from the cursor position"""
+        cursor = self.engine.cursor
+        if cursor.current is None or cursor.current != self.current_image_path:
+            self.image_index_label.configure(text="")
+            self.progress_bar.set(0)
+            self.progress_label.configure(text="0%")
+            return
+        
+        current_index = cursor.index
+        total_count = len(cursor)
+        # The total keeps growing while the directory is still being scanned
+        total_text = f"{total_count}+" if self.engine.scanning else f"{total_count}"
+        position_text = f"{current_index + 1} of {total_text}"
+        group = self.engine.duplicate_group(cursor.current)
+        if group is not None:
+            position_text = f"Duplicates {group[0] + 1} of {group[1]} • {position_text}"
+        elif self.engine.order == "worst":
+            position_text = f"Worst first • {position_text}"
+        self.image_index_label.configure(text=position_text)
+        
+        if total_count > 1:
+            progress_percentage = current_index / (total_count - 1)
+            percentage_text = f"{int(progress_percentage * 100)}%"
+        else:
+            progress_percentage = 0
+            percentage_text = "0%"
+        
+        self.progress_bar.set(progress_percentage)
+        self.progress_label.configure(text=percentage_text)
 
     def clear_image(self):
         """Clear the image display"""
@@ -785,6 +1992,11 @@ class App(ctk.CTk):
     
     def clear_container_completely(self):
         """Clear all resources and reset display state"""
+        # Leave the zoom and stop any animation: a new image, or a rotated one, is shown fitted
+        self.exit_zoom()
+        if hasattr(self, 'animation'):
+            self.stop_animation()
+        
         # Clear image display
         if hasattr(self, 'image_label'):
             self.image_label.configure(image="", text="")
@@ -794,19 +2006,25 @@ class App(ctk.CTk):
         # Force garbage collection of image resources
         try:
             import gc
-            gc.collect()
+            with tracer.span("gc.collect", "ui"):
+                gc.collect()
         except:
             pass
     
     def reset_ui_state(self):
         """Reset the UI state when no image is available."""
         self.clear_container_completely()
+        self.current_image_path = None
+        self.current_rotation = 0
+        
+        # Nothing else to reset before the viewer is built
+        if not hasattr(self, 'layer2'):
+            return
+        
         self.image_index_label.configure(text="")
         self.progress_bar.set(0)
         self.progress_label.configure(text="0%")
         self.image_details_label.configure(text="")
-        self.current_image_path = None
-        self.current_rotation = 0
         
         if hasattr(self, 'left_button') and hasattr(self, 'right_button'):
             self.left_button.configure(fg_color="gray", hover_color="gray")
@@ -816,231 +2034,112 @@ class App(ctk.CTk):
             self.rotate_left_button.configure(fg_color="gray", hover_color="gray")
             self.rotate_right_button.configure(fg_color="gray", hover_color="gray")
 
-    def update_navigation_buttons(self, current_item_path):
-        """Update the state of navigation buttons based on current item position"""
-        if not hasattr(self, 'directory_images') or not self.directory_images:
-            self.left_button.configure(fg_color="gray", hover_color="gray")
-            self.right_button.configure(fg_color="gray", hover_color="gray")
-            return
+    def update_navigation_buttons(self):
+        """Update the state of navigation buttons based on the cursor position"""
+        cursor = self.engine.cursor
         
-        try:
-            current_index = self.directory_images.index(current_item_path)
-            self.current_image_index = current_index
-            
-            if current_index <= 0:
-                self.left_button.configure(fg_color="gray", hover_color="gray")
-            else:
-                self.left_button.configure(
-                    fg_color=("#3B8ED0", "#1F6AA5"),
-                    hover_color=("#36719F", "#144870")
-                )
-            
-            if current_index >= len(self.directory_images) - 1:
-                self.right_button.configure(fg_color="gray", hover_color="gray")
-            else:
-                self.right_button.configure(
-                    fg_color=("#3B8ED0", "#1F6AA5"),
-                    hover_color=("#36719F", "#144870")
-                )
-        except ValueError:
+        if not cursor.has_previous:
             self.left_button.configure(fg_color="gray", hover_color="gray")
+        else:
+            self.left_button.configure(
+                fg_color=("#3B8ED0", "#1F6AA5"),
+                hover_color=("#36719F", "#144870")
+            )
+        
+        if not cursor.has_next:
             self.right_button.configure(fg_color="gray", hover_color="gray")
+        else:
+            self.right_button.configure(
+                fg_color=("#3B8ED0", "#1F6AA5"),
+                hover_color=("#36719F", "#144870")
+            )
 
-    def display_error(self, label, message, duration=3):
+    def display_error(self, label, message, duration=3, restore_text=""):
         """Display an error message in the specified label for a given duration.
         
         Args:
             label (ctk.CTkLabel): The label widget to display the error in
             message (str): The error message to display
             duration (int): Time in seconds to display the error (default: 3)
+            restore_text (str): Text to put back in the label afterwards (default: empty)
         """
-        def clear_error():
-            time.sleep(duration)
-            label.configure(text="")
+        # A newer message replaces the one on screen, and its timer must not clear it early
+        pending = self.error_timers.pop(label, None)
+        if pending is not None:
+            self.after_cancel(pending)
         
         # Display the error message immediately
         label.configure(text=message)
         
-        # Start a thread to clear the error after the specified duration
-        threading.Thread(target=clear_error, daemon=True).start()
+        # Clear it from the event loop after the specified duration
+        self.error_timers[label] = self.after(int(duration * 1000), self.clear_error, label, restore_text)
+
+    def clear_error(self, label, restore_text):
+        """Put back the text a message shown by display_error replaced"""
+        self.error_timers.pop(label, None)
+        label.configure(text=restore_text)
 
-    def load_and_resize_image(self, image_path):
-        """Load and resize an image to fit the green section"""
+    def get_preview_box(self):
+        """Return the (max_width, max_height) box a preview must fit in the green section"""
+        from engine import preview_box
+        self.green_section.update_idletasks()
+        return preview_box(self.green_section.winfo_width(), self.green_section.winfo_height())
+
+    def open_preview_store(self):
+        """Open the persistent preview cache, or return None if it is unavailable"""
+        from engine import PreviewStore
         try:
-            image = Image.open(image_path)
-            
-            # Apply rotation if it's an image file
-            if self.is_image_file(image_path) and self.current_rotation != 0:
-                image = image.rotate(-self.current_rotation, expand=True)
-            
-            self.green_section.update_idletasks()
-            green_width = self.green_section.winfo_width()
-            green_height = self.green_section.winfo_height()
-            
-            max_width = max(green_width - 40, 300)
-            max_height = max(green_height - 130, 200)
-            
-            aspect_ratio = image.width / image.height
-            
-            if aspect_ratio > max_width / max_height:
-                new_width = max_width
-                new_height = int(max_width / aspect_ratio)
-            else:
-                new_height = max_height
-                new_width = int(max_height * aspect_ratio)
-            
-            new_width = max(new_width, 100)
-            new_height = max(new_height, 100)
-            
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            return ImageTk.PhotoImage(image)
+            return PreviewStore()
         except Exception:
             return None
 
-    def preload_images(self, center_index):
-        """Preload images around the center index to cache"""
-        if not hasattr(self, 'directory_images') or not self.directory_images:
-            return
-        
-        start_index = max(0, center_index - 19)
-        end_index = min(len(self.directory_images), center_index + 31)
-        
-        images_to_keep = set()
-        for i in range(start_index, end_index):
-            if i < len(self.directory_images):
-                image_path = self.directory_images[i]
-                images_to_keep.add(image_path)
-                # Also keep rotated versions for images
-                if self.is_image_file(image_path):
-                    for rot in [0, 90, 180, 270]:
-                        images_to_keep.add(f"{image_path}_rot_{rot}")
-        
-        keys_to_remove = [key for key in self.image_cache.keys() if key not in images_to_keep]
-        for key in keys_to_remove:
-            del self.image_cache[key]
-        
-        def preload_worker():
-            for i in range(start_index, end_index):
-                if i < len(self.directory_images):
-                    image_path = self.directory_images[i]
-                    # Only preload original orientation to avoid excessive memory usage
-                    cache_key = image_path
-                    if cache_key not in self.image_cache:
-                        try:
-                            # Temporarily set rotation to 0 for preloading
-                            original_rotation = self.current_rotation
-                            self.current_rotation = 0
-                            photo = self.load_and_resize_image(image_path)
-                            self.current_rotation = original_rotation
-                            if photo:
-                                self.image_cache[cache_key] = photo
-                        except Exception:
-                            pass
-        
-        threading.Thread(target=preload_worker, daemon=True).start()
-
-    # Utility Methods (No UI Interaction)
-    def list_images(self, directory_path, recursive=False):
-        """List viewable image files in the specified directory.
-        
-        Args:
-            directory_path (str): Path to the directory to list files from
-            recursive (bool): Whether to list files recursively in subdirectories
-            
-        Returns:
-            list: List of viewable image file paths (absolute paths)
-        """
+    def open_hash_store(self):
+        """Open the persistent perceptual hash store, or return None if it is unavailable"""
+        from engine import HashStore
         try:
-            # Get all items in the directory
-            all_items = os.listdir(directory_path)
-            
-            # Separate files and folders with absolute paths
-            files = []
-            folders = []
-            
-            for item in all_items:
-                item_path = os.path.join(directory_path, item)
-                if os.path.isfile(item_path):
-                    # Skip files that contain "desktop.ini" in their name
-                    if "desktop.ini" not in item.lower():
-                        files.append(item_path)  # Add absolute path
-                elif os.path.isdir(item_path):
-                    folders.append(item_path)  # Add absolute path
-            
-            if not recursive:
-                # If not recursive, filter to only viewable images
-                images = [f for f in files if self.is_image_file(f)]
-                return images
-            else:
-                # If recursive, process folders and add their contents
-                for folder in folders:
-                    # Recursively get files from each folder
-                    folder_files = self.list_images(folder, recursive=True)
-                    # Add all files from the folder to the original list
-                    files.extend(folder_files)
-                
-                # Filter to only viewable images
-                images = [f for f in files if self.is_image_file(f)]
-                return images
-                
-        except PermissionError:
-            raise PermissionError("Permission denied accessing directory")
-        except Exception as e:
-            raise Exception(f"Error accessing directory: {str(e)}")
-    def load_first_image_file(self):
-        """Load and display the first image file in the directory images list"""
-        if hasattr(self, 'directory_images') and self.directory_images:
-            self.current_image_index = 0
-            first_image_path = self.directory_images[0]
-            self.display_file(first_image_path)
-        else:
-            self.reset_ui_state()
+            return HashStore()
+        except Exception:
+            return None
 
-    def get_file_details(self, file_path):
-        """Get file details including format, size, resolution, creation and modification dates"""
+    def open_quality_store(self):
+        """Open the persistent quality score store, or return None if it is unavailable"""
+        from engine import QualityStore
         try:
-            file_stats = os.stat(file_path)
-            filename = os.path.basename(file_path)
-            name_without_ext = os.path.splitext(filename)[0]
-            
-            _, ext = os.path.splitext(file_path)
-            format_type = ext.upper().lstrip('.')
-            
-            size_bytes = file_stats.st_size
-            if size_bytes < 1024:
-                size_str = f"{size_bytes} B"
-            elif size_bytes < 1024 * 1024:
-                size_str = f"{size_bytes / 1024:.1f} KB"
-            elif size_bytes < 1024 * 1024 * 1024:
-                size_str = f"{size_bytes / (1024 * 1024):.1f} MB"
-            else:
-                size_str = f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
-            
-            resolution_str = "N/A"
-            if self.is_image_file(file_path):
-                try:
-                    with Image.open(file_path) as img:
-                        resolution_str = f"{img.width}×{img.height}"
-                except Exception:
-                    resolution_str = "N/A"
-            
-            creation_time = datetime.fromtimestamp(file_stats.st_ctime)
-            modification_time = datetime.fromtimestamp(file_stats.st_mtime)
-            
-            creation_str = creation_time.strftime("%Y-%m-%d %H:%M")
-            modification_str = modification_time.strftime("%Y-%m-%d %H:%M")
-            
-            details = f"{name_without_ext} • {format_type} • {size_str} • {resolution_str} • Created: {creation_str} • Modified: {modification_str}"
-            return details
+            return QualityStore()
         except Exception:
-            return "Error retrieving file details"
+            return None
 
+    def open_metadata_index(self):
+        """Open the persistent metadata index, or return None if it is unavailable"""
+        from engine import MetadataIndex
+        try:
+            return MetadataIndex()
+        except Exception:
+            return None
 
-    def is_image_file(self, file_path):
-        """Check if a file is an image based on its extension"""
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', '.svg', '.ico', '.tga', '.psd'}
-        _, ext = os.path.splitext(file_path.lower())
-        return ext in image_extensions
+    def open_session_store(self):
+        """Open the persistent session store, or return None if it is unavailable"""
+        from engine import SessionStore
+        try:
+            return SessionStore()
+        except Exception:
+            return None
+
+    def open_trash_queue(self):
+        """Open the background trash queue with its crash-safe journal, or without one if unavailable"""
+        from engine import TrashJournal, TrashQueue
+        try:
+            return TrashQueue(TrashJournal())
+        except Exception:
+            return TrashQueue()
+
+    def load_first_image_file(self):
+        """Load and display the first image file in the directory images list"""
+        if self.engine.cursor:
+            self.engine.cursor.index = 0
+            self.display_file(self.engine.cursor.current)
+        else:
+            self.reset_ui_state()
 
 
 def main():